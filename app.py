@@ -15,8 +15,8 @@ app = cdk.App()
 s3_stack = S3Stack(app, "S3Stack")
 dynamodb_stack = DynamoDBStack(app, "DynamoDBStack")
 secrets_stack = SecretsStack(app, "SecretsStack")
-lambda_stack = LambdaStack(app, "LambdaStack", image_bucket=s3_stack.image_bucket, api_secret=secrets_stack.api_key_secret)
-apigateway_stack = ApiGatewayStack(app, "ApiGatewayStack", upload_lambda=lambda_stack.upload_lambda, dashboard_lambda=lambda_stack.dashboard_lambda)
+lambda_stack = LambdaStack(app, "LambdaStack", image_bucket=s3_stack.image_bucket, api_secret=secrets_stack.api_key_secret, results_table=dynamodb_stack.results_table)
+apigateway_stack = ApiGatewayStack(app, "ApiGatewayStack", upload_lambda=lambda_stack.upload_alias, dashboard_lambda=lambda_stack.dashboard_lambda)
 dashboard_stack = DashboardStack(app, "DashboardStack", upload_lambda=lambda_stack.upload_lambda, api_gateway=apigateway_stack.api)
 frontend_stack = FrontendStack(app, "FrontendStack")
 
@@ -0,0 +1,236 @@
+"""
+In-memory stand-ins for the AWS clients used by the Lambda handlers, so
+benchmarks exercise real handler code without an AWS account. Each
+implements only the calls the handlers make.
+"""
+from typing import Dict, Optional, Tuple
+import bisect
+import io
+import re
+import threading
+import time
+
+
+class StubClientError(Exception):
+    """
+    Carries a botocore-style `response`, which is all the handlers inspect
+    """
+
+    def __init__(self, code: str, status: int):
+        super().__init__(code)
+        self.response = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}
+
+
+class InMemoryS3:
+
+    def __init__(self, put_latency: float = 0.0, get_latency: float = 0.0):
+        self.put_latency = put_latency
+        self.get_latency = get_latency
+        self.objects = {}
+        self.lock = threading.Lock()
+
+    def put_object(self, Bucket, Key, Body, ContentType=None, **kwargs):
+        if self.put_latency:
+            time.sleep(self.put_latency)
+        with self.lock:
+            if kwargs.get("IfNoneMatch") == "*" and (Bucket, Key) in self.objects:
+                raise StubClientError("PreconditionFailed", 412)
+            self.objects[(Bucket, Key)] = {"Body": bytes(Body), "ContentType": ContentType}
+        return {}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        stored = self.objects.get((Bucket, Key))
+        if stored is None:
+            raise StubClientError("404", 404)
+        return {"ContentLength": len(stored["Body"]), "ContentType": stored["ContentType"]}
+
+    def copy_object(self, Bucket, Key, CopySource, ContentType=None, MetadataDirective="COPY", **kwargs):
+        if self.put_latency:
+            time.sleep(self.put_latency)
+        with self.lock:
+            source = self.objects[(CopySource["Bucket"], CopySource["Key"])]
+            content_type = ContentType if MetadataDirective == "REPLACE" else source["ContentType"]
+            self.objects[(Bucket, Key)] = {"Body": source["Body"], "ContentType": content_type}
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, ContinuationToken=None, StartAfter=None, **kwargs):
+        with self.lock:
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket and key.startswith(Prefix))
+        # Like S3's, the token marks a key, so deletes during listing skip nothing
+        if ContinuationToken or StartAfter:
+            keys = [key for key in keys if key > (ContinuationToken or StartAfter)]
+        page = keys[:MaxKeys]
+        response = {
+            "Contents": [{"Key": key, "Size": len(self.objects[(Bucket, key)]["Body"])} for key in page],
+            "KeyCount": len(page),
+            "IsTruncated": len(keys) > MaxKeys
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = page[-1]
+        return response
+
+    def get_object(self, Bucket, Key, **kwargs):
+        if self.get_latency:
+            time.sleep(self.get_latency)
+        stored = self.objects[(Bucket, Key)]
+        return {"Body": io.BytesIO(stored["Body"]), "ContentLength": len(stored["Body"]),
+                "ContentType": stored["ContentType"]}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        with self.lock:
+            self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+        return f"https://{Params['Bucket']}.s3.local/{Params['Key']}?expires={ExpiresIn}"
+
+
+class InMemorySecrets:
+
+    def __init__(self, value: str = "stub-api-key", latency: float = 0.0):
+        self.value = value
+        self.latency = latency
+        self.calls = 0
+
+    def get_secret_value(self, SecretId):
+        self.calls += 1
+        if self.latency:
+            time.sleep(self.latency)
+        return {"SecretString": self.value}
+
+
+class InMemoryTransactions:
+    """
+    The `table.meta.client` of a table resource, for the TransactWriteItems
+    calls the handlers make on a single table
+    """
+
+    def __init__(self, table: "InMemoryTable"):
+        self.table = table
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        # One round trip, with every write applied under one hold of the lock
+        self.table._wait()
+        with self.table.lock:
+            for entry in TransactItems:
+                (action, request), = entry.items()
+                request = {key: value for key, value in request.items() if key != "TableName"}
+                if action == "Put":
+                    self.table._put(**request)
+                elif action == "Update":
+                    self.table._update(**request)
+                else:
+                    raise NotImplementedError(action)
+        return {}
+
+
+class InMemoryTable:
+    """
+    `indexes` maps a GSI name to its (partition, sort) attribute names.
+    Index partitions are kept sorted, so index queries cost a bisect plus
+    the page read, like DynamoDB's, instead of a pass over every item.
+    """
+
+    def __init__(self, latency: float = 0.0, indexes: Optional[Dict[str, Tuple[str, str]]] = None,
+                 name: str = "results"):
+        self.latency = latency
+        self.name = name
+        self.items = {}
+        # Reentrant, so a transaction applies its writes under one hold
+        self.lock = threading.RLock()
+        self.meta = type("Meta", (), {"client": InMemoryTransactions(self)})()
+        self.indexes = indexes or {}
+        self.index_partitions = {name: {} for name in self.indexes}
+
+    def _index(self, item):
+        for name, (partition_key, sort_key) in self.indexes.items():
+            if partition_key in item and sort_key in item:
+                entries = self.index_partitions[name].setdefault(item[partition_key], [])
+                bisect.insort(entries, (item[sort_key], item["pk"], item["sk"]))
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
+
+    def get_item(self, Key, **kwargs):
+        self._wait()
+        item = self.items.get((Key["pk"], Key["sk"]))
+        return {"Item": dict(item)} if item else {}
+
+    def put_item(self, Item, **kwargs):
+        self._wait()
+        self._put(Item)
+        return {}
+
+    def _put(self, Item):
+        with self.lock:
+            self.items[(Item["pk"], Item["sk"])] = dict(Item)
+            self._index(Item)
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames=None, ExpressionAttributeValues=None, **kwargs):
+        self._wait()
+        self._update(Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues)
+        return {}
+
+    def _update(self, Key, UpdateExpression, ExpressionAttributeNames=None, ExpressionAttributeValues=None):
+        # Supports the "SET a = :x, ..." and "ADD n :x, ..." clauses the handlers use
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+        clauses = re.split(r"\b(SET|ADD)\s+", UpdateExpression)[1:]
+        with self.lock:
+            item = self.items.setdefault((Key["pk"], Key["sk"]), dict(Key))
+            for action, body in zip(clauses[::2], clauses[1::2]):
+                for assignment in body.strip().split(", "):
+                    if action == "SET":
+                        name, value = assignment.split(" = ")
+                        item[names.get(name, name)] = values[value]
+                    else:
+                        name, value = assignment.split(" ")
+                        name = names.get(name, name)
+                        item[name] = item.get(name, 0) + values[value]
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, IndexName=None, **kwargs):
+        # Supports partition-key equality with an optional "sk BETWEEN" range
+        if IndexName is not None:
+            return self._query_index(IndexName, ExpressionAttributeValues, **kwargs)
+        self._wait()
+        pk = ExpressionAttributeValues[":pk"]
+        start, end = ExpressionAttributeValues.get(":start"), ExpressionAttributeValues.get(":end")
+        with self.lock:
+            items = [
+                dict(item) for (item_pk, item_sk), item in sorted(self.items.items())
+                if item_pk == pk and (start is None or start <= item_sk <= end)
+            ]
+        return {"Items": items, "Count": len(items)}
+
+    def _query_index(self, name, values, ExpressionAttributeNames=None, ProjectionExpression=None,
+                     ScanIndexForward=True, Limit=None, ExclusiveStartKey=None, **kwargs):
+        # Expects the "<pk> = :pk AND <sk> BETWEEN :lower AND :upper" condition /history uses
+        self._wait()
+        partition_key, sort_key = self.indexes[name]
+        with self.lock:
+            entries = self.index_partitions[name].get(values[":pk"], [])
+            lower = bisect.bisect_left(entries, (values[":lower"],))
+            upper = bisect.bisect_right(entries, (values[":upper"], chr(0x10FFFF)))
+            if ExclusiveStartKey is not None:
+                position = bisect.bisect_left(entries, (ExclusiveStartKey[sort_key], ExclusiveStartKey["pk"], ExclusiveStartKey["sk"]))
+                if ScanIndexForward:
+                    lower = position + 1
+                else:
+                    upper = position
+            available = max(upper - lower, 0)
+            count = min(Limit, available) if Limit else available
+            # Only the page itself is copied, as a real index read would
+            page = entries[lower:lower + count] if ScanIndexForward else entries[upper - count:upper][::-1]
+            items = [self.items[(pk, sk)] for _, pk, sk in page]
+
+        names = ExpressionAttributeNames or {}
+        projected = [names.get(field.strip(), field.strip()) for field in ProjectionExpression.split(",")] if ProjectionExpression else None
+        response = {
+            "Items": [{key: value for key, value in item.items() if projected is None or key in projected} for item in items],
+            "Count": len(items)
+        }
+        if Limit and available > Limit:
+            last = items[-1]
+            response["LastEvaluatedKey"] = {"pk": last["pk"], "sk": last["sk"], partition_key: last[partition_key], sort_key: last[sort_key]}
+        return response
@@ -0,0 +1,69 @@
+"""
+Compares per-request connections (the old module-level requests.post) with
+the pooled DetectionClient against the local detection stub.
+
+    python benchmarks/bench_detection_client.py --requests 200 --handshake-delay 0.03
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stub_detection_server import StubConfig, StubDetectionServer  # noqa: E402
+from detection_client import DetectionClient  # noqa: E402
+from secret_provider import SecretProvider  # noqa: E402
+
+PAYLOAD = {"input": ["data:image/png;base64," + "A" * 64 * 1024]}
+
+
+def summarize(name: str, samples, connections: int) -> None:
+    ordered = sorted(samples)
+    p95 = ordered[int(len(ordered) * 0.95) - 1]
+    print(f"{name:<28} mean={statistics.mean(samples) * 1000:7.2f}ms "
+          f"p50={statistics.median(samples) * 1000:7.2f}ms p95={p95 * 1000:7.2f}ms "
+          f"connections={connections}")
+
+
+def run_fresh_connections(url: str, count: int):
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        requests.post(url, headers={"Authorization": "Bearer stub"}, json=PAYLOAD, timeout=30).json()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run_pooled_client(url: str, count: int):
+    client = DetectionClient(SecretProvider(lambda: "stub"), invoke_url=url)
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        client.detect(PAYLOAD).json()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--latency", type=float, default=0.01, help="stub response latency in seconds")
+    parser.add_argument("--handshake-delay", type=float, default=0.03,
+                        help="stub cost per new connection, modelling TCP+TLS setup")
+    args = parser.parse_args()
+
+    for name, runner in (("requests.post per call", run_fresh_connections),
+                         ("pooled DetectionClient", run_pooled_client)):
+        config = StubConfig(latency=args.latency, handshake_delay=args.handshake_delay)
+        with StubDetectionServer(config) as server:
+            samples = runner(server.url, args.requests)
+        summarize(name, samples, config.connections)
+
+
+if __name__ == "__main__":
+    main()
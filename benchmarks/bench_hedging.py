@@ -0,0 +1,72 @@
+"""
+Compares tail latency with and without request hedging against two local
+detection stubs whose responses have a slow tail, e.g. 3% taking an
+extra second. The hedged run sends a duplicate to the alternate once the
+primary has been outstanding for its observed p95.
+
+    python benchmarks/bench_hedging.py --requests 400 --tail-rate 0.03 --tail-latency 1.0
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stub_detection_server import StubConfig, StubDetectionServer  # noqa: E402
+from detection_backends import DetectionBackend, HedgedDetector  # noqa: E402
+from detection_client import DetectionClient  # noqa: E402
+from secret_provider import SecretProvider  # noqa: E402
+
+PAYLOAD = {"input": ["data:image/png;base64," + "A" * 16 * 1024]}
+
+
+def percentile(ordered, q: float) -> float:
+    return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+def summarize(name: str, samples, detector: HedgedDetector, sent: int) -> None:
+    ordered = sorted(samples)
+    print(f"{name:<10} p50={statistics.median(ordered) * 1000:7.1f}ms "
+          f"p95={percentile(ordered, 0.95) * 1000:7.1f}ms p99={percentile(ordered, 0.99) * 1000:7.1f}ms "
+          f"max={ordered[-1] * 1000:7.1f}ms hedge rate={detector.hedge_rate():6.1%} "
+          f"win ratio={detector.hedge_win_ratio():6.1%} extra calls={sent - len(samples):+d}")
+
+
+def run(urls, count: int, hedging: bool, warmup: int):
+    backends = [DetectionBackend(f"stub{i}", DetectionClient(SecretProvider(lambda: "stub"), invoke_url=url, max_attempts=1))
+                for i, url in enumerate(urls)]
+    detector = HedgedDetector(backends, hedging=hedging, initial_hedge_delay=1.0)
+    # Warm-up calls seed the primary's latency window and the connection pools
+    for _ in range(warmup):
+        detector.detect(PAYLOAD)
+    detector.stats = {name: 0 for name in detector.stats}
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        detector.detect(PAYLOAD).json()
+        samples.append(time.perf_counter() - start)
+    return samples, detector
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--warmup", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.02, help="stub base latency in seconds")
+    parser.add_argument("--tail-rate", type=float, default=0.03, help="fraction of slow responses per stub")
+    parser.add_argument("--tail-latency", type=float, default=1.0, help="extra seconds for a slow response")
+    args = parser.parse_args()
+
+    for name, hedging in (("unhedged", False), ("hedged", True)):
+        configs = [StubConfig(latency=args.latency, tail_rate=args.tail_rate, tail_latency=args.tail_latency)
+                   for _ in range(2)]
+        with StubDetectionServer(configs[0]) as primary, StubDetectionServer(configs[1]) as secondary:
+            samples, detector = run([primary.url, secondary.url], args.requests, hedging, args.warmup)
+        summarize(name, samples, detector, sum(config.requests for config in configs) - args.warmup)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+Measures /history query latency and response size against a seeded table
+of analysis records, for the filters analysts use, including deep keyset
+pagination, and compares them with filtering every record (a table scan).
+
+By default the table is the in-memory stub with the HistoryIndex kept
+sorted like a DynamoDB index. Point --endpoint-url at DynamoDB Local to
+run the same queries over the wire (the table is created if missing):
+
+    python benchmarks/bench_history.py --rows 1000000
+    python benchmarks/bench_history.py --rows 100000 --endpoint-url http://localhost:8000
+"""
+import argparse
+import contextlib
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from analysis_records import AnalysisRecorder  # noqa: E402
+from aws_stubs import InMemoryTable  # noqa: E402
+from history import HISTORY_FIELDS, HISTORY_INDEX_NAME, AnalysisHistory  # noqa: E402
+
+DAY_MS = 24 * 3600 * 1000
+
+
+def detection(rng: random.Random):
+    # Roughly the production mix: mostly authentic, some fakes, a few without faces
+    roll = rng.random()
+    if roll < 0.05:
+        return {"data": [{"bounding_boxes": []}]}
+    score = rng.betavariate(0.6, 2.5) if roll < 0.8 else rng.betavariate(4, 1)
+    return {"data": [{"bounding_boxes": [{"is_deepfake": round(score, 4)}]}]}
+
+
+def local_table(endpoint_url: str, table_name: str):
+    import boto3
+    resource = boto3.resource("dynamodb", endpoint_url=endpoint_url, region_name="us-east-1",
+                              aws_access_key_id="local", aws_secret_access_key="local")
+    if table_name not in [table.name for table in resource.tables.all()]:
+        resource.create_table(
+            TableName=table_name,
+            BillingMode="PAY_PER_REQUEST",
+            KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}, {"AttributeName": "sk", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": name, "AttributeType": "S"}
+                                  for name in ("pk", "sk", "history_pk", "history_sk")],
+            GlobalSecondaryIndexes=[{
+                "IndexName": HISTORY_INDEX_NAME,
+                "KeySchema": [{"AttributeName": "history_pk", "KeyType": "HASH"},
+                              {"AttributeName": "history_sk", "KeyType": "RANGE"}],
+                "Projection": {"ProjectionType": "INCLUDE", "NonKeyAttributes": list(HISTORY_FIELDS)}
+            }]
+        ).wait_until_exists()
+    return resource.Table(table_name)
+
+
+def seed(table, rows: int, days: int, rng: random.Random, now_ms: int):
+    recorder = AnalysisRecorder(table)
+    start = time.perf_counter()
+    records = []
+    # DynamoDB Local is seeded 25 items per BatchWriteItem call
+    with (table.batch_writer() if hasattr(table, "batch_writer") else contextlib.nullcontext(table)) as writer:
+        for _ in range(rows):
+            analyzed_at = now_ms - rng.randrange(days * DAY_MS)
+            item = recorder.build_record(
+                f"{rng.getrandbits(256):064x}", detection(rng),
+                latency_ms=rng.lognormvariate(6.5, 0.4), size_bytes=rng.randrange(50_000, 8_000_000),
+                cache_hit=rng.random() < 0.2, now=analyzed_at / 1000
+            )
+            writer.put_item(Item=item)
+            records.append(item)
+    print(f"seeded {rows} records over {days} days in {time.perf_counter() - start:.1f}s")
+    return records
+
+
+def measure(history: AnalysisHistory, params: dict, repeats: int, pages: int = 1):
+    samples, sizes, returned = [], [], 0
+    for _ in range(repeats):
+        cursor = None
+        for _ in range(pages):
+            start = time.perf_counter()
+            page = history.query(cursor=cursor, **params)
+            samples.append(time.perf_counter() - start)
+            sizes.append(len(json.dumps(page)))
+            returned += page["count"]
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+    samples.sort()
+    return {
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p99_ms": samples[min(int(len(samples) * 0.99), len(samples) - 1)] * 1000,
+        "bytes": sum(sizes) / len(sizes),
+        "items": returned / len(samples)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--repeats", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--endpoint-url", help="DynamoDB Local endpoint; the in-memory stub is used otherwise")
+    parser.add_argument("--table-name", default="deepfake-history-bench")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    now_ms = int(time.time() * 1000)
+    if args.endpoint_url:
+        table = local_table(args.endpoint_url, args.table_name)
+    else:
+        table = InMemoryTable(indexes={HISTORY_INDEX_NAME: ("history_pk", "history_sk")})
+    records = seed(table, args.rows, args.days, rng, now_ms)
+    history = AnalysisHistory(table)
+
+    day_start = now_ms - 30 * DAY_MS
+    cases = [
+        ("latest, all verdicts", {}, 1),
+        ("verdict=deepfake", {"verdict": "deepfake"}, 1),
+        ("deepfake, confidence>=0.95", {"verdict": "deepfake", "min_confidence": 0.95}, 1),
+        ("authentic, one day", {"verdict": "authentic", "start_ms": day_start, "end_ms": day_start + DAY_MS}, 1),
+        ("fields=image_hash,verdict", {"fields": ["image_hash", "verdict"]}, 1),
+        ("20 pages deep, deepfake", {"verdict": "deepfake"}, 20),
+    ]
+    print(f"\n{'query':<30} {'p50':>9} {'p99':>9} {'items':>6} {'bytes':>8}")
+    for name, params, pages in cases:
+        result = measure(history, {"limit": args.limit, **params}, max(args.repeats // pages, 5), pages)
+        print(f"{name:<30} {result['p50_ms']:7.2f}ms {result['p99_ms']:7.2f}ms {result['items']:6.0f} {result['bytes']:8.0f}")
+
+    # What the same deepfake page costs without the index
+    start = time.perf_counter()
+    matches = sorted((r for r in records if r["verdict"] == "deepfake" and float(r["confidence"]) >= 0.95),
+                     key=lambda r: r["history_sk"], reverse=True)[:args.limit]
+    print(f"{'scan + filter (no index)':<30} {(time.perf_counter() - start) * 1000:7.2f}ms {'':>9} {len(matches):6d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Successful detection calls per second against the local stub, which
+rate-limits each API key, as the key pool grows. Client threads call
+through DetectionClient with an ApiKeyPool for a fixed time; each key's
+share of requests and 429s is reported. With --paced, calls also go
+through a token bucket scaled to the pool size, as in the upload Lambda.
+
+    python benchmarks/bench_key_pool.py --keys 1,2,4 --key-rate 5 --threads 16 --duration 10
+    python benchmarks/bench_key_pool.py --paced
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "lambda"))
+sys.path.insert(0, BENCH_DIR)
+
+from detection_client import DetectionClient  # noqa: E402
+from flow_control import DetectionGuard, DetectionUnavailableError, TokenBucket  # noqa: E402
+from key_pool import ApiKeyPool  # noqa: E402
+from secret_provider import SecretProvider  # noqa: E402
+from stub_detection_server import StubConfig, StubDetectionServer  # noqa: E402
+
+
+def run(key_count: int, args) -> dict:
+    config = StubConfig(latency=args.latency, key_rate=args.key_rate, key_burst=args.key_burst)
+    keys = [f"bench-key-{index}" for index in range(key_count)]
+    guard = DetectionGuard(rate_limiter=TokenBucket(rate=args.key_rate, burst=args.key_burst)) if args.paced else None
+    pool = ApiKeyPool(
+        SecretProvider(lambda: json.dumps(keys)),
+        on_resize=(lambda size: setattr(guard.rate_limiter, "rate", args.key_rate * size)) if guard else None
+    )
+    outcomes = {"ok": 0, "throttled": 0, "unavailable": 0}
+    lock = threading.Lock()
+
+    with StubDetectionServer(config) as server:
+        client = DetectionClient(SecretProvider(lambda: ""), invoke_url=server.url,
+                                 pool_maxsize=args.threads, guard=guard, key_pool=pool)
+        stop_at = time.monotonic() + args.duration
+
+        def worker():
+            while time.monotonic() < stop_at:
+                try:
+                    status = client.detect({"input": []}, deadline=time.monotonic() + args.deadline).status_code
+                    outcome = "ok" if status == 200 else "throttled"
+                except DetectionUnavailableError:
+                    outcome = "unavailable"
+                with lock:
+                    outcomes[outcome] += 1
+
+        threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.monotonic() - started
+
+    return {
+        "keys": key_count,
+        "ok_per_second": outcomes["ok"] / elapsed,
+        "failed": outcomes["throttled"] + outcomes["unavailable"],
+        "upstream_429": sum(config.throttled_by_key.values()),
+        "per_key": pool.key_stats()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--keys", default="1,2,4")
+    parser.add_argument("--key-rate", type=float, default=5.0, help="stub requests per second per key")
+    parser.add_argument("--key-burst", type=float, default=5.0)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub detection latency in seconds")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--deadline", type=float, default=5.0, help="per-call deadline in seconds")
+    parser.add_argument("--paced", action="store_true", help="pace calls to the per-key rate times the pool size")
+    args = parser.parse_args()
+
+    print(f"{'keys':>4} {'ok/s':>8} {'failed':>7} {'429s':>6}  per key (requests/throttles)")
+    for key_count in (int(count) for count in args.keys.split(",")):
+        r = run(key_count, args)
+        per_key = " ".join(f"{name}={stats['requests']}/{stats['throttles']}" for name, stats in r["per_key"].items())
+        print(f"{r['keys']:>4} {r['ok_per_second']:8.1f} {r['failed']:>7} {r['upstream_429']:>6}  {per_key}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Measures the perceptual-hash near-duplicate index on hashes of real photos:
+how skewed the band values are, in-memory lookup latency, DynamoDB items
+read per table-tier lookup with and without the per-band read cap, and
+recall for re-encoded and resized copies.
+
+Uniformly random hashes spread evenly over band values and hide the crowded
+partitions that real images produce, so the index is filled from a
+directory of photos. A held-out tenth of them are the lookups that should
+miss; copies of indexed photos re-encoded at quality 60 and halved in size
+are the lookups that should hit.
+
+    python benchmarks/bench_near_duplicates.py --images ~/photos --max-distance 3
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+
+from image_processing import difference_hash, pillow  # noqa: E402
+from near_duplicates import NearDuplicateIndex, split_bands  # noqa: E402
+
+
+class BandTable:
+    """
+    Results table stand-in keeping each partition in sort-key order and
+    counting the items every query returns, as DynamoDB bills reads
+    """
+
+    def __init__(self):
+        self.partitions = {}
+        self.items_read = 0
+
+    def put_item(self, Item):
+        self.partitions.setdefault(Item["pk"], {})[Item["sk"]] = Item
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, Limit=None, ExclusiveStartKey=None):
+        partition = self.partitions.get(ExpressionAttributeValues[":pk"], {})
+        keys = sorted(partition)
+        if ExclusiveStartKey is not None:
+            keys = [key for key in keys if key > ExclusiveStartKey["sk"]]
+        page = keys[:Limit] if Limit else keys
+        self.items_read += len(page)
+        response = {"Items": [partition[key] for key in page]}
+        if Limit and len(keys) > Limit:
+            response["LastEvaluatedKey"] = {"pk": ExpressionAttributeValues[":pk"], "sk": page[-1]}
+        return response
+
+
+def load_photos(directory: str):
+    photos = []
+    for root, _, names in os.walk(os.path.expanduser(directory)):
+        for name in sorted(names):
+            with open(os.path.join(root, name), "rb") as f:
+                data = f.read()
+            fingerprint = difference_hash(data)
+            if fingerprint is not None:
+                photos.append((name, data, fingerprint))
+    return photos
+
+
+def edited_copy(data: bytes):
+    # Re-encoded and halved, as images are re-shared
+    Image = pillow()
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        image = image.resize((max(image.width // 2, 1), max(image.height // 2, 1)))
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=60)
+    return difference_hash(output.getvalue())
+
+
+def percentile(samples, fraction):
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * fraction), len(samples) - 1)]
+
+
+def table_lookups(indexed, queries, max_distance, max_band_reads):
+    table = BandTable()
+    writer = NearDuplicateIndex(table=table, max_distance=max_distance)
+    for name, _, (value, size) in indexed:
+        writer.add(value, name, size)
+    # No memory tier, so every lookup goes to the table
+    reader = NearDuplicateIndex(table=table, max_distance=max_distance, max_entries=0, max_band_reads=max_band_reads)
+    reads, found = [], 0
+    for value in queries:
+        table.items_read = 0
+        found += reader.lookup(value) is not None
+        reads.append(table.items_read)
+    return reads, found, reader.stats["truncated_bands"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--images", required=True, help="directory of photos, searched recursively")
+    parser.add_argument("--max-distance", type=int, default=3)
+    parser.add_argument("--max-band-reads", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if pillow() is None:
+        sys.exit("Pillow is required to hash images")
+    photos = load_photos(args.images)
+    if len(photos) < 10:
+        sys.exit(f"Found {len(photos)} hashable images in {args.images}; need at least 10")
+    rng = random.Random(args.seed)
+    rng.shuffle(photos)
+    held_out = photos[:len(photos) // 10]
+    indexed = photos[len(held_out):]
+
+    index = NearDuplicateIndex(max_distance=args.max_distance, max_entries=len(indexed))
+    for name, _, (value, size) in indexed:
+        index.add(value, name, size)
+
+    print(f"{len(indexed)} indexed photos, {len(held_out)} held out, {index.max_distance + 1} bands")
+    print(f"{'band':>4} {'values':>7} {'largest':>8} {'share':>6}  most common value")
+    for band, width in enumerate(index.widths):
+        values = Counter(split_bands(value, index.widths)[band] for _, _, (value, _) in indexed)
+        common, largest = values.most_common(1)[0]
+        print(f"{band:>4} {len(values):>7} {largest:>8} {largest / len(indexed):6.1%}  {common:0{(width + 3) // 4}x}")
+
+    sample = [rng.choice(indexed) for _ in range(args.queries)]
+    near = [copy[0] for copy in (edited_copy(data) for _, data, _ in sample) if copy is not None]
+    misses = [value for _, _, (value, _) in held_out]
+
+    print(f"\n{'lookups':>13} {'p50':>8} {'p99':>8} {'found':>7}")
+    for label, queries in (("edited copies", near), ("unseen", misses)):
+        samples, found = [], 0
+        for value in queries:
+            start = time.perf_counter()
+            found += index.lookup(value) is not None
+            samples.append(time.perf_counter() - start)
+        print(f"{label:>13} {percentile(samples, 0.5) * 1e6:6.1f}us {percentile(samples, 0.99) * 1e6:6.1f}us "
+              f"{found / len(queries):7.1%}")
+
+    print(f"\n{'table tier':>13} {'cap':>6} {'reads p50':>10} {'p99':>6} {'max':>6} {'found':>7} {'truncated':>10}")
+    for label, queries in (("edited copies", near), ("unseen", misses)):
+        for cap in (args.max_band_reads, len(indexed)):
+            reads, found, truncated = table_lookups(indexed, queries, args.max_distance, cap)
+            print(f"{label:>13} {cap:>6} {percentile(reads, 0.5):>10} {percentile(reads, 0.99):>6} {max(reads):>6} "
+                  f"{found / len(queries):7.1%} {truncated:>10}")
+
+
+if __name__ == "__main__":
+    main()
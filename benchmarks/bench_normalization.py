@@ -0,0 +1,89 @@
+"""
+Measures detection payload size and round-trip latency with and without
+the normalization stage, for synthetic photos of several resolutions.
+
+    python benchmarks/bench_normalization.py --bandwidth-mbps 100
+
+Requires Pillow.
+"""
+import argparse
+import base64
+import io
+import os
+import random
+import statistics
+import sys
+import time
+
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.stub_detection_server import StubConfig, StubDetectionServer  # noqa: E402
+from detection_client import DetectionClient  # noqa: E402
+from image_processing import normalize_image, sniff_format, mime_type  # noqa: E402
+from secret_provider import SecretProvider  # noqa: E402
+
+RESOLUTIONS = [(1024, 768), (2048, 1536), (3024, 4032), (4000, 3000)]
+
+
+def synthetic_photo(width: int, height: int, seed: int = 0, quality: int = 95) -> bytes:
+    """
+    Colour shapes under sensor-like noise, which compresses roughly like a
+    phone photo at the same JPEG quality (several MB at 12 MP and quality 95)
+    """
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (128, 128, 128))
+    draw = ImageDraw.Draw(image)
+    for _ in range(60):
+        x, y = rng.randrange(width), rng.randrange(height)
+        radius = rng.randrange(20, max(width, height) // 4)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        draw.ellipse((x - radius, y - radius, x + radius, y + radius), fill=color)
+    noise = Image.merge("RGB", [Image.effect_noise((width, height), 64) for _ in range(3)])
+    image = Image.blend(image, noise, 0.35)
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=quality)
+    return output.getvalue()
+
+
+def run(client: DetectionClient, image_data: bytes, normalize: bool, max_edge: int, repeat: int):
+    samples, payload_bytes = [], 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        if normalize:
+            normalized = normalize_image(image_data, max_edge=max_edge)
+            data, mime = normalized.data, normalized.mime_type
+        else:
+            data, mime = image_data, mime_type(sniff_format(image_data))
+        encoded = base64.b64encode(data).decode()
+        client.detect({"input": [f"data:{mime};base64,{encoded}"]}).json()
+        samples.append(time.perf_counter() - start)
+        payload_bytes = len(encoded)
+    return statistics.median(samples), payload_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-edge", type=int, default=1536)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub inference latency in seconds")
+    parser.add_argument("--bandwidth-mbps", type=float, default=100.0, help="simulated upload bandwidth")
+    args = parser.parse_args()
+
+    config = StubConfig(latency=args.latency, bandwidth_mbps=args.bandwidth_mbps)
+    with StubDetectionServer(config) as server:
+        client = DetectionClient(SecretProvider(lambda: "stub"), invoke_url=server.url)
+        print(f"{'resolution':<12} {'original':>10} {'payload':>10} {'normalized':>11} "
+              f"{'p50 before':>11} {'p50 after':>10}")
+        for width, height in RESOLUTIONS:
+            image_data = synthetic_photo(width, height)
+            before, before_bytes = run(client, image_data, False, args.max_edge, args.repeat)
+            after, after_bytes = run(client, image_data, True, args.max_edge, args.repeat)
+            print(f"{width}x{height:<7} {len(image_data) / 1e6:9.2f}M {before_bytes / 1e6:9.2f}M "
+                  f"{after_bytes / 1e6:10.2f}M {before * 1000:9.0f}ms {after * 1000:8.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
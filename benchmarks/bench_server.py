@@ -0,0 +1,133 @@
+"""
+Throughput and latency of the standalone server (scripts/serve.py) at
+increasing client concurrency, with the detection API replaced by the
+local stub and S3, Secrets Manager and DynamoDB by in-memory stand-ins.
+
+The verdict cache is off, so repeated images only avoid the detection API
+when they are in flight together; the `upstream` column shows how many
+requests reached the stub after single-flight coalescing.
+
+    python benchmarks/bench_server.py --requests 400 --concurrency 1,8,32,64 --latency 0.5
+    python benchmarks/bench_server.py --duplicates 0.5 --processes 2
+
+Requires Pillow to generate the synthetic photos.
+"""
+import argparse
+import base64
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+sys.path.insert(0, os.path.join(BENCH_DIR, "..", "scripts"))
+
+from benchmarks.bench_normalization import synthetic_photo  # noqa: E402
+from benchmarks.bench_upload_handler import load_handler, percentile  # noqa: E402
+from benchmarks.stub_detection_server import StubConfig, StubDetectionServer  # noqa: E402
+
+
+def server_process(sock, invoke_url: str, max_concurrency: int) -> None:
+    os.environ.setdefault("DETECTION_MAX_CONCURRENCY", str(max_concurrency))
+    # EMF metric lines would drown the results table
+    sys.stdout = open(os.devnull, "w")
+    upload = load_handler({"cache": False})
+    upload.detection_client.invoke_url = invoke_url
+    from serve import UploadServer
+    server = UploadServer(sock, max_concurrency=max_concurrency)
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    server.serve_forever()
+
+
+def post(address, body: str):
+    connection = http.client.HTTPConnection(*address, timeout=60)
+    try:
+        started = time.perf_counter()
+        connection.request("POST", "/upload", body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        response.read()
+        return time.perf_counter() - started, response.status
+    finally:
+        connection.close()
+
+
+def wait_until_ready(address, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection(*address, timeout=1)
+            connection.request("GET", "/healthz")
+            response = connection.getresponse()
+            response.read()
+            connection.close()
+            if response.status == 200:
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("server did not start")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,8,32,64")
+    parser.add_argument("--latency", type=float, default=0.5, help="stub detection latency in seconds")
+    parser.add_argument("--duplicates", type=float, default=0.0,
+                        help="fraction of requests repeating one of a few popular images")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--max-concurrency", type=int, default=128, help="server requests in flight per process")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    from serve import listen
+    rng = random.Random(args.seed)
+    popular = [base64.b64encode(synthetic_photo(640, 480, seed=index)).decode() for index in range(4)]
+    config = StubConfig(latency=args.latency)
+    sock = listen("127.0.0.1", 0)
+    address = sock.getsockname()[:2]
+
+    with StubDetectionServer(config) as stub:
+        context = multiprocessing.get_context("fork")
+        workers = [context.Process(target=server_process, args=(sock, stub.url, args.max_concurrency))
+                   for _ in range(args.processes)]
+        for worker in workers:
+            worker.start()
+        try:
+            wait_until_ready(address)
+            print(f"{'concurrency':>11} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} "
+                  f"{'errors':>6} {'upstream':>8}")
+            seed = 1000
+            for concurrency in (int(level) for level in args.concurrency.split(",")):
+                bodies = []
+                for _ in range(args.requests):
+                    if rng.random() < args.duplicates:
+                        image = rng.choice(popular)
+                    else:
+                        seed += 1
+                        image = base64.b64encode(synthetic_photo(640, 480, seed=seed)).decode()
+                    bodies.append(json.dumps({"image": image}))
+                upstream_before = config.requests
+                started = time.perf_counter()
+                with ThreadPoolExecutor(concurrency) as pool:
+                    samples = list(pool.map(lambda body: post(address, body), bodies))
+                elapsed = time.perf_counter() - started
+                latencies = sorted(latency for latency, _ in samples)
+                errors = sum(status != 200 for _, status in samples)
+                print(f"{concurrency:>11} {len(samples) / elapsed:8.1f} {percentile(latencies, 0.5) * 1000:8.0f} "
+                      f"{percentile(latencies, 0.95) * 1000:8.0f} {percentile(latencies, 0.99) * 1000:8.0f} "
+                      f"{errors:>6} {config.requests - upstream_before:>8}")
+        finally:
+            for worker in workers:
+                worker.terminate()
+                worker.join(timeout=35)
+
+
+if __name__ == "__main__":
+    main()
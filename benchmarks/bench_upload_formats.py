@@ -0,0 +1,155 @@
+"""
+Compares the three /upload body formats: JSON-wrapped base64, a raw
+image/* body and multipart/form-data. Each runs at 1, 5 and 9 MB images
+through `upload.lambda_handler`, with the detection API replaced by the
+local stub and AWS services by in-memory stand-ins.
+
+Events are built the way API Gateway delivers them: binary media types
+arrive base64 encoded with isBase64Encoded set. Every scenario runs in a
+fresh interpreter. Reported per request:
+- CPU time
+- wall time
+- peak Python heap (tracemalloc, which counts every copy of the body)
+- growth in peak RSS (which also counts Pillow's buffers)
+
+    python benchmarks/bench_upload_formats.py --iterations 10
+    python benchmarks/bench_upload_formats.py --normalize-max-edge 0   # body handling only
+
+Through API Gateway and Lambda the event limit is 6 MB, so larger images
+still need /upload/presign; the 9 MB case applies to scripts/serve.py.
+Requires Pillow to generate the images.
+"""
+import argparse
+import base64
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(BENCH_DIR, ".."))
+
+from benchmarks.bench_upload_handler import LambdaContext, api_event, load_handler, peak_rss_mb  # noqa: E402
+
+FORMATS = ("json", "raw", "multipart")
+SIZES_MB = (1, 5, 9)
+BOUNDARY = "----benchBoundary7MA4YWxkTrZu0gW"
+
+
+def noise_png(target_bytes: int, seed: int) -> bytes:
+    """
+    Returns a PNG of random pixels, which does not compress, so its size
+    tracks width x height x 3
+    """
+    from PIL import Image
+    import io
+    side = int(math.sqrt(target_bytes / 3))
+    pixels = random.Random(seed).randbytes(side * side * 3)
+    output = io.BytesIO()
+    Image.frombytes("RGB", (side, side), pixels).save(output, format="PNG", compress_level=1)
+    return output.getvalue()
+
+
+def build_event(body_format: str, image: bytes) -> dict:
+    if body_format == "json":
+        return api_event("/upload", json.dumps({"image": base64.b64encode(image).decode()}))
+    if body_format == "raw":
+        event = api_event("/upload", base64.b64encode(image).decode())
+        event["headers"] = {"Content-Type": "image/png"}
+    else:
+        body = (f"--{BOUNDARY}\r\nContent-Disposition: form-data; name=\"image\"; filename=\"bench.png\"\r\n"
+                f"Content-Type: image/png\r\n\r\n").encode() + image + f"\r\n--{BOUNDARY}--\r\n".encode()
+        event = api_event("/upload", base64.b64encode(body).decode())
+        event["headers"] = {"Content-Type": f"multipart/form-data; boundary={BOUNDARY}"}
+    event["isBase64Encoded"] = True
+    return event
+
+
+def run_scenario(body_format: str, size_mb: int, options: dict) -> dict:
+    from benchmarks.stub_detection_server import StubConfig, StubDetectionServer
+    upload = load_handler({"cache": False})
+    upload.NEAR_DUPLICATE_MODE = "off"
+    images = [noise_png(size_mb * 1_000_000, seed) for seed in range(options["iterations"] + 1)]
+    events = [build_event(body_format, image) for image in images]
+    del images
+
+    with StubDetectionServer(StubConfig()) as server:
+        upload.detection_client.invoke_url = server.url
+        # First request warms imports, pools and Pillow; not measured
+        upload.lambda_handler(events.pop(), LambdaContext())
+
+        rss_before = peak_rss_mb()
+        cpu, wall, statuses = [], [], []
+        for event in events[1:]:
+            cpu_start, wall_start = time.process_time(), time.perf_counter()
+            response = upload.lambda_handler(event, LambdaContext())
+            cpu.append(time.process_time() - cpu_start)
+            wall.append(time.perf_counter() - wall_start)
+            statuses.append(json.loads(response["body"]).get("statusCode", response["statusCode"]))
+        rss_growth = peak_rss_mb() - rss_before
+
+        # Traced separately; tracemalloc slows allocation-heavy code down
+        tracemalloc.start()
+        upload.lambda_handler(events[0], LambdaContext())
+        _, heap_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "format": body_format,
+        "size_mb": size_mb,
+        "event_mb": len(events[0]["body"]) / 1e6,
+        "cpu_ms": sum(cpu) / len(cpu) * 1000,
+        "wall_ms": sum(wall) / len(wall) * 1000,
+        "heap_peak_mb": heap_peak / 1e6,
+        "rss_growth_mb": rss_growth,
+        "statuses": sorted(set(statuses)),
+    }
+
+
+def run_isolated(body_format: str, size_mb: int, options: dict) -> dict:
+    with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", f"{body_format}:{size_mb}",
+             "--worker-options", json.dumps(options), "--worker-output", result_file.name],
+            stdout=subprocess.DEVNULL, check=True
+        )
+        with open(result_file.name) as f:
+            return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--normalize-max-edge", type=int, default=1536)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-options", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        os.environ["POWERTOOLS_LOG_LEVEL"] = "WARNING"
+        os.environ["PREFLIGHT_MAX_BYTES"] = str(16 * 1024 * 1024)
+        os.environ["NORMALIZE_MAX_EDGE"] = str(json.loads(args.worker_options)["normalize_max_edge"])
+        body_format, size_mb = args.worker.split(":")
+        result = run_scenario(body_format, int(size_mb), json.loads(args.worker_options))
+        with open(args.worker_output, "w") as f:
+            json.dump(result, f)
+        return
+
+    options = {"iterations": args.iterations, "normalize_max_edge": args.normalize_max_edge}
+    print(f"{'format':<10} {'image':>6} {'event':>8} {'cpu/req':>9} {'wall/req':>9} {'heap peak':>10} "
+          f"{'rss growth':>11}  status")
+    for size_mb in SIZES_MB:
+        for body_format in FORMATS:
+            r = run_isolated(body_format, size_mb, options)
+            print(f"{r['format']:<10} {r['size_mb']:>5}M {r['event_mb']:7.2f}M {r['cpu_ms']:7.1f}ms "
+                  f"{r['wall_ms']:7.1f}ms {r['heap_peak_mb']:8.1f}MB {r['rss_growth_mb']:9.1f}MB  {r['statuses']}")
+
+
+if __name__ == "__main__":
+    main()
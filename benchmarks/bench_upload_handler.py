@@ -0,0 +1,340 @@
+"""
+End-to-end benchmark of the upload Lambda: invokes `upload.lambda_handler`
+with synthetic API Gateway events across image sizes, with the NVIDIA API
+replaced by the local detection stub and S3, Secrets Manager and DynamoDB
+by in-memory stand-ins.
+
+Each scenario runs in a fresh interpreter so peak RSS is measured per image
+size. Reports end-to-end p50/p95/p99, single-container throughput, peak RSS
+and the mean time spent in each handler stage.
+
+    python benchmarks/bench_upload_handler.py --iterations 30
+    python benchmarks/bench_upload_handler.py --latency 0.2 --error-rate 0.1
+    python benchmarks/bench_upload_handler.py --save before.json
+    python benchmarks/bench_upload_handler.py --compare before.json --fail-over 10
+
+Requires Pillow to generate the synthetic photos.
+"""
+import argparse
+import base64
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.join(BENCH_DIR, "..")
+LAMBDA_DIR = os.path.join(REPO_DIR, "lambda")
+
+SCENARIOS = {
+    "small": (640, 480),
+    "medium": (1920, 1440),
+    "large": (3264, 2448),
+}
+
+# Stand-in configuration for the handler's module-level setup
+HANDLER_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "BUCKET_NAME": "bench-bucket",
+    "RESULTS_TABLE_NAME": "bench-table",
+    "API_SECRET_ARN": "arn:aws:secretsmanager:us-east-1:000000000000:secret:bench",
+    "POWERTOOLS_TRACE_DISABLED": "1",
+}
+
+STAGES = ("preflight", "cache_lookup", "normalize", "detect", "archive_wait")
+
+
+class LambdaContext:
+    function_name = "deepfake_upload_lambda_function"
+    memory_limit_in_mb = 128
+    invoked_function_arn = "arn:aws:lambda:us-east-1:000000000000:function:deepfake_upload_lambda_function"
+    aws_request_id = "bench"
+
+    def __init__(self, timeout: float = 30.0):
+        self.deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int((self.deadline - time.monotonic()) * 1000)
+
+
+def api_event(path: str, body: str, method: str = "POST") -> dict:
+    return {
+        "httpMethod": method,
+        "path": path,
+        "resource": path,
+        "headers": {"Content-Type": "application/json"},
+        "requestContext": {"requestId": "bench", "stage": "prod", "httpMethod": method, "path": path},
+        "body": body,
+        "isBase64Encoded": False,
+        "queryStringParameters": None,
+        "pathParameters": None,
+    }
+
+
+class StageTimer:
+    """
+    Wraps handler collaborators and accumulates the time spent in each
+    during the current invocation
+    """
+
+    def __init__(self):
+        self.current = defaultdict(float)
+
+    def wrap(self, name: str, func):
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.current[name] += time.perf_counter() - start
+        return timed
+
+    def take(self) -> dict:
+        stages, self.current = dict(self.current), defaultdict(float)
+        return stages
+
+
+def percentile(ordered, q: float) -> float:
+    # Nearest-rank, so p99 of 20 samples is the slowest one rather than an interpolation
+    index = max(0, min(len(ordered) - 1, int(round(q * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def load_handler(options: dict):
+    """
+    Imports the upload handler with S3, Secrets Manager and DynamoDB replaced
+    by in-memory stand-ins; point `upload.detection_client.invoke_url` at a stub
+    """
+    os.environ.update(HANDLER_ENV)
+    if not options.get("log"):
+        os.environ["POWERTOOLS_LOG_LEVEL"] = "WARNING"
+    sys.path.insert(0, LAMBDA_DIR)
+    sys.path.insert(0, REPO_DIR)
+
+    from benchmarks.aws_stubs import InMemoryS3, InMemorySecrets, InMemoryTable
+    from secret_provider import secrets_manager_fetcher
+    from verdict_cache import VerdictCache
+    import upload
+
+    s3 = InMemoryS3(put_latency=options.get("s3_latency", 0.0))
+    upload.s3 = s3
+    upload.archiver.s3_client = s3
+    upload.api_key_provider._fetch = secrets_manager_fetcher("bench", client=InMemorySecrets())
+    upload.api_key_provider.invalidate()
+    # Everything backed by the results table shares one in-memory table
+    table = InMemoryTable()
+    upload.results_table = table
+    upload.near_duplicate_index.table = table
+    upload.analysis_recorder.table = table
+    if upload.detection_guard.circuit_breaker.store is not None:
+        upload.detection_guard.circuit_breaker.store.table = table
+    if options.get("cache", True):
+        upload.verdict_cache = VerdictCache(table=table)
+    else:
+        # Every invocation pays for the full analysis path
+        upload.verdict_cache = VerdictCache(table=None, max_entries=0)
+        upload.NEAR_DUPLICATE_MODE = "off"
+    return upload
+
+
+def logical_status(response: dict) -> int:
+    # build_response puts the logical status inside the body envelope
+    body = json.loads(response["body"])
+    if isinstance(body, dict) and "statusCode" in body:
+        return body["statusCode"]
+    return response["statusCode"]
+
+
+def run_scenario(name: str, options: dict) -> dict:
+    """
+    Benchmarks one image size inside the current interpreter
+    """
+    upload = load_handler(options)
+    from benchmarks.bench_normalization import synthetic_photo
+    from benchmarks.stub_detection_server import StubConfig, StubDetectionServer
+
+    width, height = SCENARIOS[name]
+    image_data = synthetic_photo(width, height)
+    event = api_event("/upload", json.dumps({"image": base64.b64encode(image_data).decode()}))
+
+    timer = StageTimer()
+    upload.preflight_base64 = timer.wrap("preflight", upload.preflight_base64)
+    upload.normalize_image = timer.wrap("normalize", upload.normalize_image)
+    upload.verdict_cache.get = timer.wrap("cache_lookup", upload.verdict_cache.get)
+    upload.detection_client.detect = timer.wrap("detect", upload.detection_client.detect)
+    upload.archiver.wait = timer.wrap("archive_wait", upload.archiver.wait)
+
+    config = StubConfig(latency=options["latency"], error_rate=options["error_rate"],
+                        error_status=options["error_status"], retry_after=options["retry_after"])
+    rss_before = peak_rss_mb()
+    latencies, outcomes, stage_samples = [], Counter(), defaultdict(list)
+    with StubDetectionServer(config) as server:
+        upload.detection_client.invoke_url = server.url
+        for _ in range(options["warmup"]):
+            upload.lambda_handler(event, LambdaContext())
+        timer.take()
+
+        started = time.perf_counter()
+        for _ in range(options["iterations"]):
+            start = time.perf_counter()
+            response = upload.lambda_handler(event, LambdaContext())
+            elapsed = time.perf_counter() - start
+            latencies.append(elapsed)
+
+            outcomes[str(logical_status(response))] += 1
+
+            stages = timer.take()
+            for stage in STAGES:
+                stage_samples[stage].append(stages.get(stage, 0.0))
+            stage_samples["other"].append(max(elapsed - sum(stages.values()), 0.0))
+        wall_time = time.perf_counter() - started
+
+    ordered = sorted(latencies)
+    return {
+        "scenario": name,
+        "resolution": f"{width}x{height}",
+        "image_bytes": len(image_data),
+        "event_bytes": len(event["body"]),
+        "iterations": len(latencies),
+        "outcomes": dict(outcomes),
+        "p50_ms": percentile(ordered, 0.50) * 1000,
+        "p95_ms": percentile(ordered, 0.95) * 1000,
+        "p99_ms": percentile(ordered, 0.99) * 1000,
+        "mean_ms": sum(latencies) / len(latencies) * 1000,
+        "throughput_rps": len(latencies) / wall_time,
+        "peak_rss_mb": peak_rss_mb(),
+        "handler_rss_mb": peak_rss_mb() - rss_before,
+        "stages_ms": {stage: sum(samples) / len(samples) * 1000 for stage, samples in stage_samples.items()},
+        "stub": {"requests": config.requests, "connections": config.connections},
+    }
+
+
+def run_isolated(name: str, options: dict) -> dict:
+    """
+    Runs a scenario in a child interpreter so its RSS is not inflated by earlier ones
+    """
+    with tempfile.NamedTemporaryFile(suffix=".json") as result_file:
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", name,
+             "--worker-options", json.dumps(options), "--worker-output", result_file.name],
+            stdout=None if options["log"] else subprocess.DEVNULL, check=True
+        )
+        with open(result_file.name) as f:
+            return json.load(f)
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(results) -> None:
+    print(f"{'scenario':<8} {'resolution':>10} {'image':>8} {'p50':>9} {'p95':>9} {'p99':>9} "
+          f"{'rps':>7} {'peak rss':>9}  outcomes")
+    for r in results:
+        print(f"{r['scenario']:<8} {r['resolution']:>10} {r['image_bytes'] / 1e6:7.2f}M "
+              f"{r['p50_ms']:7.1f}ms {r['p95_ms']:7.1f}ms {r['p99_ms']:7.1f}ms "
+              f"{r['throughput_rps']:7.1f} {r['peak_rss_mb']:7.1f}MB  {r['outcomes']}")
+
+    print(f"\n{'mean ms':<8} " + " ".join(f"{stage:>12}" for stage in STAGES + ("other",)))
+    for r in results:
+        print(f"{r['scenario']:<8} " + " ".join(f"{r['stages_ms'].get(stage, 0.0):12.2f}"
+                                                  for stage in STAGES + ("other",)))
+
+
+def compare(results, baseline_path: str) -> float:
+    """
+    Prints the change against a saved report and returns the worst p95 regression in percent
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    previous = {r["scenario"]: r for r in baseline["results"]}
+    print(f"\nvs {baseline_path} ({baseline.get('revision', 'unknown')})")
+    worst = 0.0
+    for r in results:
+        before = previous.get(r["scenario"])
+        if before is None:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p95_ms", "p99_ms", "peak_rss_mb"):
+            change = (r[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+            changes.append(f"{metric[:-3] if metric.endswith('_ms') else 'rss'} {before[metric]:.1f}->{r[metric]:.1f} ({change:+.1f}%)")
+            if metric == "p95_ms":
+                worst = max(worst, change)
+        print(f"  {r['scenario']:<8} " + "  ".join(changes))
+    return worst
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="comma-separated subset of " + ", ".join(SCENARIOS))
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--latency", type=float, default=0.05, help="stub inference latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of stub responses that fail")
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--retry-after", default=None, help="Retry-After header sent with injected errors")
+    parser.add_argument("--s3-latency", type=float, default=0.01, help="in-memory S3 put latency in seconds")
+    parser.add_argument("--cache", action="store_true", help="keep the verdict cache on, measuring the cache-hit path")
+    parser.add_argument("--log", action="store_true", help="keep handler INFO logging on")
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="previous report to diff against")
+    parser.add_argument("--fail-over", type=float, default=None,
+                        help="exit non-zero if any scenario's p95 grew by more than this percentage")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-options", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        result = run_scenario(args.worker, json.loads(args.worker_options))
+        with open(args.worker_output, "w") as f:
+            json.dump(result, f)
+        return
+
+    options = {
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "latency": args.latency,
+        "error_rate": args.error_rate,
+        "error_status": args.error_status,
+        "retry_after": args.retry_after,
+        "s3_latency": args.s3_latency,
+        "cache": args.cache,
+        "log": args.log,
+    }
+    results = [run_isolated(name, options) for name in args.scenarios.split(",")]
+    print_report(results)
+
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "options": options,
+        "results": results,
+    }
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        worst = compare(results, args.compare)
+        if args.fail_over is not None and worst > args.fail_over:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,352 @@
+"""
+Load generator that replays recorded upload requests, or synthesizes them,
+against the upload handler running locally or a deployed API, to see how the
+system behaves at production concurrency.
+
+Requests come from a JSONL log, one request per line:
+
+    {"method": "POST", "path": "/upload", "body": {"image": "<base64>"}, "timestamp": 1718000000.25}
+    {"path": "/upload", "image_path": "photos/cat.jpg"}
+
+`image_path` is read relative to the log file and sent as `{"image": ...}`;
+`timestamp` (seconds) is optional. Lines without a `path` are skipped.
+
+Arrival modes:
+  --rate R       open loop, Poisson arrivals at R requests/second
+  (recorded)     open loop, the log's own inter-arrival times scaled by --speed
+  (neither)      closed loop, each worker sends its next request as soon as
+                 the previous one completes
+
+Locally every worker is a separate process importing the real handler with
+in-memory AWS stand-ins and a shared detection stub, so `--concurrency 8` is
+eight warm Lambda containers. With `--url` workers are threads posting to the
+deployed API. Latency is measured from the scheduled arrival, so it includes
+time spent queued behind busy workers.
+
+    python benchmarks/load_replay.py --synthesize --concurrency 1,2,4,8 --duration 20
+    python benchmarks/load_replay.py --log recorded.jsonl --rate 5 --concurrency 4
+    python benchmarks/load_replay.py --log recorded.jsonl --url https://abc.execute-api.us-east-1.amazonaws.com/prod
+"""
+import argparse
+import base64
+import json
+import multiprocessing
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from benchmarks.bench_upload_handler import LambdaContext, api_event, load_handler, logical_status, percentile  # noqa: E402
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+HISTOGRAM_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, float("inf"))
+
+SYNTHETIC_RESOLUTIONS = ((640, 480), (1280, 960), (1920, 1440), (3024, 4032))
+
+# The upload handler's default preflight limit; synthesized photos stay under
+# it so they measure analysis rather than fast 413 rejections
+PREFLIGHT_MAX_BYTES = int(os.environ.get("PREFLIGHT_MAX_BYTES", str(8 * 1024 * 1024)))
+
+
+def load_log(path: str):
+    """
+    Returns (records, skipped) parsed from a JSONL request log
+    """
+    base_dir = os.path.dirname(os.path.abspath(path))
+    records, skipped = [], 0
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                skipped += 1
+                continue
+            if not isinstance(entry, dict) or "path" not in entry:
+                skipped += 1
+                continue
+            body = entry.get("body")
+            if entry.get("image_path"):
+                with open(os.path.join(base_dir, entry["image_path"]), "rb") as image:
+                    body = {"image": base64.b64encode(image.read()).decode()}
+            records.append({
+                "method": entry.get("method", "POST"),
+                "path": entry["path"],
+                "body": body if isinstance(body, str) or body is None else json.dumps(body),
+                "timestamp": entry.get("timestamp"),
+            })
+    return records, skipped
+
+
+def synthesize(count: int, seed: int):
+    """
+    Returns upload requests for `count` distinct synthetic photos of mixed
+    sizes, each re-encoded at a lower JPEG quality until it fits under
+    PREFLIGHT_MAX_BYTES, as a phone would compress a photo to upload it
+    """
+    from benchmarks.bench_normalization import synthetic_photo
+
+    rng = random.Random(seed)
+    records = []
+    for index in range(count):
+        width, height = rng.choice(SYNTHETIC_RESOLUTIONS)
+        quality = 95
+        image_data = synthetic_photo(width, height, seed=seed + index, quality=quality)
+        while len(image_data) > PREFLIGHT_MAX_BYTES and quality > 50:
+            quality -= 5
+            image_data = synthetic_photo(width, height, seed=seed + index, quality=quality)
+        image = base64.b64encode(image_data).decode()
+        records.append({"method": "POST", "path": "/upload", "body": json.dumps({"image": image}), "timestamp": None})
+    return records
+
+
+def schedule(records, rate, speed: float, duration: float, rng: random.Random):
+    """
+    Returns [(record_index, arrival_offset)] for an open-loop run, or None for closed loop
+    """
+    arrivals = []
+    if rate:
+        offset, index = 0.0, 0
+        while True:
+            offset += rng.expovariate(rate)
+            if offset > duration:
+                return arrivals
+            arrivals.append((index % len(records), offset))
+            index += 1
+
+    timestamps = [record["timestamp"] for record in records]
+    if any(timestamp is None for timestamp in timestamps):
+        return None
+
+    # Recorded timing, looped until the duration is filled
+    first = timestamps[0]
+    span = (timestamps[-1] - first) / speed + 1.0 / max(len(records), 1)
+    loop = 0
+    while True:
+        for index, timestamp in enumerate(timestamps):
+            offset = loop * span + (timestamp - first) / speed
+            if offset > duration:
+                return arrivals
+            arrivals.append((index, offset))
+        loop += 1
+
+
+def local_worker(options: dict, records, tasks, results) -> None:
+    """
+    One warm container: imports the handler once and serves tasks until a None arrives
+    """
+    upload = load_handler(options)
+    upload.detection_client.invoke_url = options["invoke_url"]
+    events = [api_event(record["path"], record["body"], record["method"]) for record in records]
+    results.put(None)
+
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        index, scheduled = task
+        started = time.monotonic()
+        try:
+            status, error = logical_status(upload.lambda_handler(events[index], LambdaContext())), None
+        except Exception as e:
+            status, error = None, type(e).__name__
+        results.put((scheduled, started, time.monotonic(), status, error))
+
+
+def remote_worker(base_url: str, timeout: float, records, tasks, results) -> None:
+    import requests
+
+    session = requests.Session()
+    results.put(None)
+    while True:
+        task = tasks.get()
+        if task is None:
+            return
+        index, scheduled = task
+        record = records[index]
+        started = time.monotonic()
+        try:
+            response = session.request(record["method"], base_url.rstrip("/") + record["path"], data=record["body"],
+                                       headers={"Content-Type": "application/json"}, timeout=timeout)
+            status, error = response.status_code, None
+            if response.ok:
+                try:
+                    status = logical_status({"statusCode": response.status_code, "body": response.text})
+                except ValueError:
+                    pass
+        except requests.RequestException as e:
+            status, error = None, type(e).__name__
+        results.put((scheduled, started, time.monotonic(), status, error))
+
+
+def start_workers(args, records, concurrency: int, invoke_url: str):
+    """
+    Returns (tasks, results, workers) once every worker has finished its cold start
+    """
+    if args.url:
+        tasks, results = queue.Queue(), queue.Queue()
+        workers = [threading.Thread(target=remote_worker, args=(args.url, args.timeout, records, tasks, results),
+                                    daemon=True) for _ in range(concurrency)]
+    else:
+        # spawn keeps the stub server's threads out of the children
+        context = multiprocessing.get_context("spawn")
+        tasks, results = context.Queue(), context.Queue()
+        options = {"invoke_url": invoke_url, "cache": not args.no_cache, "s3_latency": args.s3_latency}
+        workers = [context.Process(target=local_worker, args=(options, records, tasks, results), daemon=True)
+                   for _ in range(concurrency)]
+    for worker in workers:
+        worker.start()
+    for _ in workers:
+        results.get()
+    return tasks, results, workers
+
+
+def run_level(args, records, concurrency: int, invoke_url: str, rng: random.Random) -> dict:
+    tasks, results, workers = start_workers(args, records, concurrency, invoke_url)
+    arrivals = schedule(records, args.rate, args.speed, args.duration, rng)
+    samples = []
+    start = time.monotonic()
+
+    if arrivals is None:
+        # Closed loop: keep every worker busy until the duration runs out
+        sent = 0
+        for _ in range(concurrency):
+            tasks.put((sent % len(records), time.monotonic()))
+            sent += 1
+        while len(samples) < sent:
+            samples.append(results.get())
+            if time.monotonic() - start < args.duration:
+                tasks.put((sent % len(records), time.monotonic()))
+                sent += 1
+    else:
+        for index, offset in arrivals:
+            delay = start + offset - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            tasks.put((index, start + offset))
+        for _ in arrivals:
+            samples.append(results.get())
+
+    for _ in workers:
+        tasks.put(None)
+    for worker in workers:
+        worker.join(timeout=10)
+    return summarize(concurrency, samples, start)
+
+
+def summarize(concurrency: int, samples, start: float) -> dict:
+    latencies = sorted((finished - scheduled) * 1000 for scheduled, _, finished, _, _ in samples)
+    service = [(finished - started) * 1000 for _, started, finished, _, _ in samples]
+    outcomes = Counter(str(status) if error is None else error for _, _, _, status, error in samples)
+    succeeded = sum(1 for _, _, _, status, error in samples if error is None and status is not None and status < 400)
+    # Oversized images answered by preflight, reported apart from failures
+    rejected = sum(1 for _, _, _, status, error in samples if error is None and status == 413)
+    elapsed = max((finished for _, _, finished, _, _ in samples), default=start) - start
+
+    histogram = [0] * len(HISTOGRAM_BUCKETS_MS)
+    for latency in latencies:
+        histogram[next(i for i, bound in enumerate(HISTOGRAM_BUCKETS_MS) if latency <= bound)] += 1
+
+    return {
+        "concurrency": concurrency,
+        "requests": len(samples),
+        "succeeded": succeeded,
+        "rejected": rejected,
+        "error_rate": 1 - (succeeded + rejected) / len(samples) if samples else 0.0,
+        "throughput_rps": succeeded / elapsed if elapsed > 0 else 0.0,
+        "p50_ms": percentile(latencies, 0.50) if latencies else 0.0,
+        "p95_ms": percentile(latencies, 0.95) if latencies else 0.0,
+        "p99_ms": percentile(latencies, 0.99) if latencies else 0.0,
+        "mean_service_ms": sum(service) / len(service) if service else 0.0,
+        "outcomes": dict(outcomes),
+        "histogram": histogram,
+    }
+
+
+def print_histogram(level: dict) -> None:
+    print(f"\nconcurrency {level['concurrency']}: {level['requests']} requests, outcomes {level['outcomes']}")
+    peak = max(level["histogram"]) or 1
+    lower = 0
+    for bound, count in zip(HISTOGRAM_BUCKETS_MS, level["histogram"]):
+        label = f"{lower:g}-{bound:g}ms" if bound != float("inf") else f">{lower:g}ms"
+        print(f"  {label:>14} {count:6d} {'#' * round(40 * count / peak)}")
+        lower = bound
+
+
+def print_curve(levels) -> None:
+    print(f"\n{'concurrency':>11} {'rps':>8} {'p50':>9} {'p95':>9} {'p99':>9} {'service':>9} {'errors':>7} {'413s':>6}")
+    for level in levels:
+        print(f"{level['concurrency']:>11} {level['throughput_rps']:8.1f} {level['p50_ms']:7.0f}ms "
+              f"{level['p95_ms']:7.0f}ms {level['p99_ms']:7.0f}ms {level['mean_service_ms']:7.0f}ms "
+              f"{level['error_rate'] * 100:6.1f}% {level['rejected']:>6}")
+
+    # The knee: the lowest concurrency within 5% of the best throughput
+    best = max(level["throughput_rps"] for level in levels)
+    if best > 0:
+        knee = next(level for level in levels if level["throughput_rps"] >= 0.95 * best)
+        print(f"\nthroughput saturates at concurrency {knee['concurrency']} ({knee['throughput_rps']:.1f} rps)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--log", help="JSONL request log to replay")
+    source.add_argument("--synthesize", action="store_true", help="generate upload requests from synthetic photos")
+    parser.add_argument("--images", type=int, default=20, help="distinct images to synthesize")
+    parser.add_argument("--url", help="deployed API base URL; runs the handler locally when omitted")
+    parser.add_argument("--concurrency", default="1,2,4,8", help="comma-separated worker counts to sweep")
+    parser.add_argument("--duration", type=float, default=15.0, help="seconds of load per concurrency level")
+    parser.add_argument("--rate", type=float, default=None, help="open-loop arrival rate in requests/second")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed-up for recorded timestamps")
+    parser.add_argument("--timeout", type=float, default=30.0, help="per-request timeout for --url")
+    parser.add_argument("--latency", type=float, default=0.2, help="local detection stub latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="local detection stub failure rate")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--s3-latency", type=float, default=0.02, help="local in-memory S3 put latency")
+    parser.add_argument("--no-cache", action="store_true", help="disable the verdict cache in local workers")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    args = parser.parse_args()
+
+    if args.log:
+        records, skipped = load_log(args.log)
+        if skipped:
+            print(f"skipped {skipped} lines that are not recorded requests")
+        if not records:
+            sys.exit(f"{args.log} has no recorded requests")
+    else:
+        records = synthesize(args.images, args.seed)
+
+    levels = []
+    concurrency_levels = [int(level) for level in args.concurrency.split(",")]
+    if args.url:
+        for concurrency in concurrency_levels:
+            levels.append(run_level(args, records, concurrency, None, random.Random(args.seed)))
+    else:
+        from benchmarks.stub_detection_server import StubConfig, StubDetectionServer
+
+        config = StubConfig(latency=args.latency, error_rate=args.error_rate, error_status=args.error_status)
+        with StubDetectionServer(config) as server:
+            for concurrency in concurrency_levels:
+                levels.append(run_level(args, records, concurrency, server.url, random.Random(args.seed)))
+
+    for level in levels:
+        print_histogram(level)
+    print_curve(levels)
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"target": args.url or "local", "rate": args.rate, "duration": args.duration,
+                       "histogram_buckets_ms": [str(bound) for bound in HISTOGRAM_BUCKETS_MS],
+                       "levels": levels}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
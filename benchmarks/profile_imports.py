@@ -0,0 +1,117 @@
+"""
+Reports per-module import cost of a Lambda handler module, to track init
+duration regressions locally without deploying.
+
+Each run imports the handler in a fresh interpreter under `python -X
+importtime` with placeholder environment variables, so nothing talks to
+AWS. Costs are the median across runs.
+
+    python benchmarks/profile_imports.py                       # upload.py
+    python benchmarks/profile_imports.py --module worker --top 30
+    python benchmarks/profile_imports.py --save init.json
+    python benchmarks/profile_imports.py --compare init.json --fail-over 20
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+LAMBDA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda")
+
+PLACEHOLDER_ENV = {
+    "AWS_DEFAULT_REGION": "us-east-1",
+    "BUCKET_NAME": "profile-bucket",
+    "RESULTS_TABLE_NAME": "profile-table",
+    "API_SECRET_ARN": "arn:aws:secretsmanager:us-east-1:000000000000:secret:profile",
+    "JOB_QUEUE_URL": "https://sqs.us-east-1.amazonaws.com/000000000000/profile",
+}
+
+
+def profile_once(module: str):
+    env = {**os.environ, **PLACEHOLDER_ENV}
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=LAMBDA_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    modules = {}
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us), "depth": depth}
+    return modules
+
+
+def profile(module: str, runs: int):
+    samples = defaultdict(list)
+    depths = {}
+    for _ in range(runs):
+        for name, stats in profile_once(module).items():
+            samples[name].append(stats)
+            depths[name] = stats["depth"]
+    return {
+        name: {
+            "self_us": int(statistics.median(s["self_us"] for s in stats)),
+            "cumulative_us": int(statistics.median(s["cumulative_us"] for s in stats)),
+            "depth": depths[name]
+        }
+        for name, stats in samples.items()
+    }
+
+
+def by_package(modules):
+    packages = defaultdict(int)
+    for name, stats in modules.items():
+        packages[name.split(".")[0]] += stats["self_us"]
+    return dict(packages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="upload", help="handler module in lambda/")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--save", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="previous report to diff against")
+    parser.add_argument("--fail-over", type=float, default=None,
+                        help="exit non-zero if total import time grew by more than this percentage")
+    args = parser.parse_args()
+
+    modules = profile(args.module, args.runs)
+    total_us = modules[args.module]["cumulative_us"]
+    packages = by_package(modules)
+
+    print(f"import {args.module}: {total_us / 1000:.1f} ms (median of {args.runs} runs)\n")
+    print(f"{'package':<32} {'self ms':>9}")
+    for name, self_us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<32} {self_us / 1000:9.1f}")
+
+    print(f"\n{'direct import':<32} {'cumulative ms':>13}")
+    direct = [(name, stats) for name, stats in modules.items() if stats["depth"] == 1]
+    for name, stats in sorted(direct, key=lambda item: -item[1]["cumulative_us"])[:args.top]:
+        print(f"{name:<32} {stats['cumulative_us'] / 1000:13.1f}")
+
+    report = {"module": args.module, "total_us": total_us, "packages": packages, "modules": modules}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        change = (total_us - baseline["total_us"]) / baseline["total_us"] * 100
+        print(f"\ntotal: {baseline['total_us'] / 1000:.1f} ms -> {total_us / 1000:.1f} ms ({change:+.1f}%)")
+        for name in sorted(set(packages) | set(baseline["packages"])):
+            delta = packages.get(name, 0) - baseline["packages"].get(name, 0)
+            if abs(delta) >= 1000:
+                print(f"  {name:<30} {delta / 1000:+8.1f} ms")
+        if args.fail_over is not None and change > args.fail_over:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+"""
+Local stand-in for the NVIDIA hive deepfake-image-detection endpoint.
+
+Serves canned detection results over keep-alive HTTP/1.1 with configurable
+response latency, a slow tail, per-connection setup cost (to model the
+TCP+TLS handshake a fresh connection pays against ai.api.nvidia.com) and
+error injection. `schema="faces-v1"` serves the alternate self-hosted
+detector response shape instead. `key_rate` enforces a per-API-key rate
+limit (a token bucket per bearer token), answering 429 with Retry-After
+like the real endpoint.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import argparse
+import json
+import random
+import threading
+import time
+
+DETECTION_RESULT = {
+    "data": [{
+        "index": 0,
+        "bounding_boxes": [{
+            "vertices": [{"x": 10, "y": 12}, {"x": 200, "y": 240}],
+            "bbox_confidence": 0.97,
+            "is_deepfake": 0.08
+        }],
+        "status": "SUCCESS"
+    }]
+}
+
+FACES_V1_RESULT = {
+    "faces": [{
+        "box": {"x1": 10, "y1": 12, "x2": 200, "y2": 240},
+        "face_confidence": 0.97,
+        "fake_probability": 0.08
+    }]
+}
+
+
+class StubConfig:
+    def __init__(self, latency: float = 0.0, handshake_delay: float = 0.0,
+                 error_rate: float = 0.0, error_status: int = 503, retry_after: str = None,
+                 bandwidth_mbps: float = 0.0, tail_rate: float = 0.0, tail_latency: float = 0.0,
+                 schema: str = "nvidia-hive", key_rate: float = 0.0, key_burst: float = 1.0):
+        self.latency = latency
+        self.tail_rate = tail_rate
+        self.tail_latency = tail_latency
+        self.schema = schema
+        self.bandwidth_mbps = bandwidth_mbps
+        self.handshake_delay = handshake_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.retry_after = retry_after
+        self.key_rate = key_rate
+        self.key_burst = key_burst
+        self.key_buckets = {}
+        self.requests_by_key = {}
+        self.throttled_by_key = {}
+        self.requests = 0
+        self.connections = 0
+        self.bytes_received = 0
+        self.lock = threading.Lock()
+
+    def take_key_token(self, key: str):
+        """
+        Returns None if `key` is within its rate limit, else the seconds
+        until it has a token again
+        """
+        with self.lock:
+            self.requests_by_key[key] = self.requests_by_key.get(key, 0) + 1
+            if not self.key_rate:
+                return None
+            now = time.monotonic()
+            tokens, updated_at = self.key_buckets.get(key, (self.key_burst, now))
+            tokens = min(self.key_burst, tokens + (now - updated_at) * self.key_rate)
+            if tokens < 1:
+                self.key_buckets[key] = (tokens, now)
+                self.throttled_by_key[key] = self.throttled_by_key.get(key, 0) + 1
+                return (1 - tokens) / self.key_rate
+            self.key_buckets[key] = (tokens - 1, now)
+            return None
+
+
+def make_handler(config: StubConfig):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+
+        def setup(self):
+            super().setup()
+            with config.lock:
+                config.connections += 1
+            if config.handshake_delay:
+                time.sleep(config.handshake_delay)
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            self.rfile.read(length)
+            with config.lock:
+                config.requests += 1
+                config.bytes_received += length
+            if config.latency:
+                time.sleep(config.latency)
+            if config.tail_rate and random.random() < config.tail_rate:
+                time.sleep(config.tail_latency)
+            if config.bandwidth_mbps:
+                # Models upload time over a constrained link to the real endpoint
+                time.sleep(length * 8 / (config.bandwidth_mbps * 1_000_000))
+
+            retry_after = config.retry_after
+            throttled_for = config.take_key_token(self.headers.get("Authorization", ""))
+            if throttled_for is not None:
+                status, body = 429, {"error": "rate limit exceeded for key"}
+                retry_after = f"{throttled_for:.3f}"
+            elif config.error_rate and random.random() < config.error_rate:
+                status, body = config.error_status, {"error": "injected failure"}
+            else:
+                status, body = 200, FACES_V1_RESULT if config.schema == "faces-v1" else DETECTION_RESULT
+
+            payload = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(payload)))
+            if status != 200 and retry_after:
+                self.send_header("Retry-After", retry_after)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+class StubDetectionServer:
+    """
+    Runs the stub on a background thread; usable as a context manager
+    """
+
+    def __init__(self, config: StubConfig = None, host: str = "127.0.0.1", port: int = 0):
+        self.config = config or StubConfig()
+        self.httpd = ThreadingHTTPServer((host, port), make_handler(self.config))
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}/v1/cv/hive/deepfake-image-detection"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds per response")
+    parser.add_argument("--handshake-delay", type=float, default=0.0, help="seconds per new connection")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--bandwidth-mbps", type=float, default=0.0, help="simulated upload bandwidth, 0 for unlimited")
+    parser.add_argument("--tail-rate", type=float, default=0.0, help="fraction of responses that are slow")
+    parser.add_argument("--tail-latency", type=float, default=0.0, help="extra seconds for a slow response")
+    parser.add_argument("--schema", choices=["nvidia-hive", "faces-v1"], default="nvidia-hive")
+    parser.add_argument("--key-rate", type=float, default=0.0, help="requests per second allowed per API key, 0 for unlimited")
+    parser.add_argument("--key-burst", type=float, default=1.0)
+    args = parser.parse_args()
+
+    config = StubConfig(args.latency, args.handshake_delay, args.error_rate, args.error_status,
+                        bandwidth_mbps=args.bandwidth_mbps, tail_rate=args.tail_rate,
+                        tail_latency=args.tail_latency, schema=args.schema,
+                        key_rate=args.key_rate, key_burst=args.key_burst)
+    with StubDetectionServer(config, port=args.port) as server:
+        print(f"Stub detection API listening on {server.url}")
+        try:
+            server.thread.join()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
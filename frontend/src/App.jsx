@@ -3,8 +3,48 @@ import axios from 'axios'
 import { FiShield, FiCheck, FiX, FiLoader, FiFolder, FiEye, FiBarChart2, FiGithub, FiExternalLink } from 'react-icons/fi'
 import './App.css'
 
+// Polling interval and limit for async analysis jobs
+const JOB_POLL_INTERVAL_MS = 1000
+const JOB_POLL_MAX_ATTEMPTS = 90
+
+// Route responses are wrapped as { statusCode, body, headers } by the upload Lambda
+const unwrapBody = (data) => {
+  const body = data?.body ?? data
+  if (body?.error) {
+    throw new Error(body.error)
+  }
+  return body
+}
+
+// SHA-256 of the file bytes, the same content hash the API keys results by
+const hashFile = async (file) => {
+  const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer())
+  return Array.from(new Uint8Array(digest), (byte) => byte.toString(16).padStart(2, '0')).join('')
+}
+
+// Returns the stored result for an already analysed image, or null on a miss
+const lookupResult = async (apiEndpoint, file) => {
+  const imageHash = await hashFile(file)
+  const response = await axios.get(`${apiEndpoint}/results/${imageHash}`, {
+    validateStatus: (status) => status === 200 || status === 404
+  })
+  return response.status === 200 ? unwrapBody(response.data) : null
+}
+
+const waitForJob = async (apiEndpoint, jobId) => {
+  for (let attempt = 0; attempt < JOB_POLL_MAX_ATTEMPTS; attempt++) {
+    const response = await axios.get(`${apiEndpoint}/jobs/${jobId}`)
+    const job = unwrapBody(response.data)
+    if (job.status === 'succeeded') return job.result
+    if (job.status === 'failed') throw new Error(job.error || 'Analysis failed')
+    await new Promise((resolve) => setTimeout(resolve, JOB_POLL_INTERVAL_MS))
+  }
+  throw new Error('Analysis timed out')
+}
+
 function App() {
   const [image, setImage] = useState(null)
+  const [file, setFile] = useState(null)
   const [loading, setLoading] = useState(false)
   const [result, setResult] = useState(null)
   const [error, setError] = useState(null)
@@ -63,31 +103,45 @@ function App() {
   const handleImageUpload = (e) => {
     const file = e.target.files[0]
     if (file) {
-      const reader = new FileReader()
-      reader.onload = (e) => setImage(e.target.result)
-      reader.readAsDataURL(file)
+      // Object URLs preview the file without reading it into a base64 string
+      if (image) URL.revokeObjectURL(image)
+      setFile(file)
+      setImage(URL.createObjectURL(file))
       setResult(null)
       setError(null)
     }
   }
 
   const uploadImage = async () => {
-    if (!image) return
+    if (!file) return
     
     setLoading(true)
     setError(null)
     
     try {
-      const base64 = image.split(',')[1]
-      const response = await axios.post(`${import.meta.env.VITE_API_ENDPOINT}/upload`, {
-        image: base64
+      const apiEndpoint = import.meta.env.VITE_API_ENDPOINT
+      const contentType = file.type || 'image/jpeg'
+
+      // Ask by content hash first; the image is only uploaded if it was never analysed
+      const storedResult = await lookupResult(apiEndpoint, file).catch(() => null)
+      if (storedResult) {
+        setResult({ body: storedResult })
+        setLoading(false)
+        return
+      }
+
+      // Upload straight to S3 through a presigned URL, then poll the analysis job
+      const presignResponse = await axios.post(`${apiEndpoint}/upload/presign`, {
+        content_type: contentType
       })
-      
+      const presign = unwrapBody(presignResponse.data)
+      await axios.put(presign.upload_url, file, { headers: presign.headers })
 
-      setResult(response.data)
+      const jobResult = await waitForJob(apiEndpoint, presign.job_id)
+      setResult({ body: jobResult })
     } catch (error) {
       console.error('Upload failed:', error)
-      setError(error.response?.data?.error || 'Upload failed')
+      setError(error.response?.data?.body?.error || error.response?.data?.error || error.message || 'Upload failed')
     }
     setLoading(false)
   }
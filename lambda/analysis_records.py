@@ -0,0 +1,243 @@
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Callable, Dict, List, Optional, Tuple
+import random
+import threading
+import time
+import uuid
+
+from aws_lambda_powertools import Logger
+
+logger = Logger(child=True)
+
+VERDICT_DEEPFAKE = "deepfake"
+VERDICT_AUTHENTIC = "authentic"
+VERDICT_NO_FACE = "no_face"
+VERDICTS = (VERDICT_DEEPFAKE, VERDICT_AUTHENTIC, VERDICT_NO_FACE)
+
+# Same cut-off the frontend uses to label a detection as a deepfake
+DEEPFAKE_THRESHOLD = 0.5
+
+# UTC bucket formats; they sort lexicographically in time order
+ROLLUP_FORMATS = {"hour": "%Y-%m-%dT%H", "day": "%Y-%m-%d"}
+ROLLUP_STEPS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+
+# Counters kept on every rollup item
+ROLLUP_COUNTERS = ("analyses", "cache_hits", "latency_ms_sum", "bytes_sum") + tuple(f"verdict_{v}" for v in VERDICTS)
+
+# Every container would otherwise increment the same item for the current
+# hour and day; each write picks one of these shards at random
+ROLLUP_SHARDS = 10
+
+
+# Records are indexed by verdict and tenth of confidence for /history
+CONFIDENCE_BANDS = 10
+NO_CONFIDENCE_BAND = "none"
+
+
+def confidence_band(confidence: Optional[float]) -> str:
+    if confidence is None:
+        return NO_CONFIDENCE_BAND
+    return str(min(int(float(confidence) * CONFIDENCE_BANDS), CONFIDENCE_BANDS - 1))
+
+
+def history_partition(verdict: str, band: str) -> str:
+    return f"HISTORY#{verdict}#{band}"
+
+
+def summarize_verdict(detection_result: Dict) -> Tuple[str, Optional[float]]:
+    """
+    Returns (verdict, confidence) for a detection API response, where
+    confidence is the highest is_deepfake score across detected faces
+    """
+    scores = [
+        float(box["is_deepfake"])
+        for entry in detection_result.get("data", [])
+        for box in entry.get("bounding_boxes", [])
+        if "is_deepfake" in box
+    ]
+    if not scores:
+        return VERDICT_NO_FACE, None
+    confidence = max(scores)
+    return (VERDICT_DEEPFAKE if confidence > DEEPFAKE_THRESHOLD else VERDICT_AUTHENTIC), confidence
+
+
+def rollup_bucket(granularity: str, timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime(ROLLUP_FORMATS[granularity])
+
+
+def bucket_start(granularity: str, bucket: str) -> datetime:
+    return datetime.strptime(bucket, ROLLUP_FORMATS[granularity]).replace(tzinfo=timezone.utc)
+
+
+def rollup_partition(granularity: str, shard: Optional[int] = None) -> str:
+    # Unsharded partitions hold counters written before sharding
+    return f"ROLLUP#{granularity}" if shard is None else f"ROLLUP#{granularity}#{shard}"
+
+
+class AnalysisRecorder:
+    """
+    Stores one compact record per analysis in the results table and keeps
+    hourly and daily rollups current with ADD updates, so stats are read
+    from a few counter items instead of scanning records or logs.
+
+    Records are keyed pk="ANALYSIS#<sha256>", sk="<analyzed_at ms>#<id>"
+    and carry history_pk="HISTORY#<verdict>#<band>", history_sk=sk for the
+    HistoryIndex GSI. Rollups are sharded across `rollup_shards` partitions
+    keyed pk="ROLLUP#<granularity>#<shard>", sk=<UTC bucket>, so no single
+    counter item takes every write; any time range is one Query per shard,
+    bounded by the number of buckets in it. A record and its rollup
+    increments are written in one transaction, so they never disagree.
+
+    submit() writes on a small background pool, off the request's latency
+    path. Lambda freezes the container after the response, so a write still
+    in flight completes on the next invocation, or is lost if the container
+    is recycled.
+    """
+
+    def __init__(self, table, record_ttl_seconds: int = 90 * 24 * 3600,
+                 rollup_ttl_seconds: Optional[Dict[str, int]] = None,
+                 rollup_shards: int = ROLLUP_SHARDS, max_workers: int = 2,
+                 clock: Callable[[], float] = time.time):
+        self.table = table
+        self.record_ttl_seconds = record_ttl_seconds
+        # Hourly buckets age out; daily buckets are kept (0 means no expiry)
+        self.rollup_ttl_seconds = rollup_ttl_seconds if rollup_ttl_seconds is not None else {"hour": 35 * 24 * 3600, "day": 0}
+        self.rollup_shards = rollup_shards
+        self.clock = clock
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="record")
+        self._pending = set()
+        self._lock = threading.Lock()
+        self.write_stats = {"records": 0, "failures": 0}
+
+    def record(self, image_hash: str, detection_result: Dict, latency_ms: float, size_bytes: int,
+               cache_hit: bool = False, rollups: bool = True, analyzed_at: Optional[float] = None) -> Dict:
+        """
+        Stores the record and, unless `rollups` is off (e.g. for bulk
+        re-scoring of images already counted), updates the rollup counters
+        in the same transaction
+        """
+        now = analyzed_at if analyzed_at is not None else self.clock()
+        item = self.build_record(image_hash, detection_result, latency_ms, size_bytes, cache_hit, now)
+        if not rollups:
+            self.table.put_item(Item=item)
+            return item
+
+        table_name = self.table.name
+        shard = random.randrange(self.rollup_shards)
+        self.table.meta.client.transact_write_items(TransactItems=[{"Put": {"TableName": table_name, "Item": item}}] + [
+            {"Update": {"TableName": table_name,
+                        **self._increment(granularity, shard, now, item["verdict"], item["latency_ms"], size_bytes, cache_hit)}}
+            for granularity in ROLLUP_FORMATS
+        ])
+        return item
+
+    def submit(self, image_hash: str, detection_result: Dict, latency_ms: float, size_bytes: int,
+               cache_hit: bool = False) -> Future:
+        """
+        Records the analysis on the background pool; a failed write is logged
+        """
+        future = self._executor.submit(self.record, image_hash, detection_result, latency_ms, size_bytes,
+                                       cache_hit, analyzed_at=self.clock())
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._finished)
+        return future
+
+    def _finished(self, future: Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+            self.write_stats["failures" if future.exception() is not None else "records"] += 1
+        if future.exception() is not None:
+            logger.warning(f"Failed to record analysis: {str(future.exception())}")
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """
+        Waits for submitted records, e.g. when a long-running server stops
+        """
+        with self._lock:
+            pending = list(self._pending)
+        wait(pending, timeout=timeout)
+
+    def build_record(self, image_hash: str, detection_result: Dict, latency_ms: float, size_bytes: int,
+                     cache_hit: bool, now: float) -> Dict:
+        verdict, confidence = summarize_verdict(detection_result)
+        analyzed_at = int(now * 1000)
+        latency_ms = int(round(latency_ms))
+        sort_key = f"{analyzed_at:013d}#{uuid.uuid4().hex[:8]}"
+        item = {
+            "pk": f"ANALYSIS#{image_hash}",
+            "sk": sort_key,
+            "history_pk": history_partition(verdict, confidence_band(confidence)),
+            "history_sk": sort_key,
+            "image_hash": image_hash,
+            "verdict": verdict,
+            "latency_ms": latency_ms,
+            "bytes": size_bytes,
+            "analyzed_at": analyzed_at,
+            "cache_hit": cache_hit
+        }
+        # The DynamoDB resource rejects floats
+        if confidence is not None:
+            item["confidence"] = Decimal(str(round(confidence, 4)))
+        if self.record_ttl_seconds:
+            item["expires_at"] = int(now) + self.record_ttl_seconds
+        return item
+
+    def _increment(self, granularity: str, shard: int, now: float, verdict: str, latency_ms: int,
+                   size_bytes: int, cache_hit: bool) -> Dict:
+        bucket = rollup_bucket(granularity, now)
+        expression = "ADD analyses :one, #verdict :one, cache_hits :cache_hit, latency_ms_sum :latency, bytes_sum :bytes"
+        values = {":one": 1, ":cache_hit": 1 if cache_hit else 0, ":latency": latency_ms, ":bytes": size_bytes}
+        ttl = self.rollup_ttl_seconds.get(granularity)
+        if ttl:
+            expression += " SET expires_at = :expires_at"
+            values[":expires_at"] = int(bucket_start(granularity, bucket).timestamp()) + ttl
+        # ADD creates missing counters at zero, so the first write needs no setup
+        return {
+            "Key": {"pk": rollup_partition(granularity, shard), "sk": bucket},
+            "UpdateExpression": expression,
+            "ExpressionAttributeNames": {"#verdict": f"verdict_{verdict}"},
+            "ExpressionAttributeValues": values
+        }
+
+    def rollups(self, granularity: str, start: str, end: str) -> List[Dict]:
+        """
+        Returns the rollup buckets from `start` to `end` inclusive, oldest
+        first, summed across shards, with empty buckets filled in as zeros
+        """
+        found = {}
+        for shard in [None] + list(range(self.rollup_shards)):
+            kwargs = {
+                "KeyConditionExpression": "pk = :pk AND sk BETWEEN :start AND :end",
+                "ExpressionAttributeValues": {":pk": rollup_partition(granularity, shard), ":start": start, ":end": end}
+            }
+            while True:
+                page = self.table.query(**kwargs)
+                for item in page.get("Items", []):
+                    counters = found.setdefault(item["sk"], dict.fromkeys(ROLLUP_COUNTERS, 0))
+                    for name in ROLLUP_COUNTERS:
+                        counters[name] += int(item.get(name, 0))
+                if "LastEvaluatedKey" not in page:
+                    break
+                kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+
+        buckets = []
+        current, last = bucket_start(granularity, start), bucket_start(granularity, end)
+        while current <= last:
+            bucket = current.strftime(ROLLUP_FORMATS[granularity])
+            buckets.append({"bucket": bucket, **found.get(bucket, dict.fromkeys(ROLLUP_COUNTERS, 0))})
+            current += ROLLUP_STEPS[granularity]
+        return buckets
+
+    def stats(self, granularity: str = "hour", periods: int = 24) -> Dict:
+        """
+        Returns the last `periods` buckets up to now and their totals
+        """
+        now = datetime.fromtimestamp(self.clock(), tz=timezone.utc)
+        start = (now - ROLLUP_STEPS[granularity] * (periods - 1)).strftime(ROLLUP_FORMATS[granularity])
+        buckets = self.rollups(granularity, start, now.strftime(ROLLUP_FORMATS[granularity]))
+        totals = {name: sum(bucket[name] for bucket in buckets) for name in ROLLUP_COUNTERS}
+        totals["avg_latency_ms"] = round(totals["latency_ms_sum"] / totals["analyses"], 1) if totals["analyses"] else None
+        return {"granularity": granularity, "buckets": buckets, "totals": totals}
@@ -0,0 +1,107 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
+
+from aws_lambda_powertools import Logger
+
+from verdict_cache import content_hash
+
+logger = Logger(child=True)
+
+ARCHIVE_MODE_DURABLE = "durable"
+ARCHIVE_MODE_FIRE_AND_FORGET = "fire-and-forget"
+
+ARCHIVE_PREFIX = "archive/"
+
+# S3 answers a conditional PUT with 412 when the key exists, and with 409
+# when another conditional write to the same key is in flight
+EXISTING_OBJECT_ERROR_CODES = {"PreconditionFailed", "ConditionalRequestConflict"}
+
+
+def archive_key(digest: str, extension: str) -> str:
+    """
+    Content-addressed key, e.g. archive/ab/cd/abcd....jpg. The two hex
+    shard levels spread keys evenly so S3 can partition the prefix as
+    request rates grow, instead of every write landing on one prefix.
+    """
+    return f"{ARCHIVE_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}.{extension}"
+
+
+def is_existing_object_error(error: Exception) -> bool:
+    response = getattr(error, "response", None) or {}
+    return response.get("Error", {}).get("Code") in EXISTING_OBJECT_ERROR_CODES
+
+
+class ImageArchiver:
+    """
+    Writes uploaded images to the archive bucket on a bounded thread pool
+    so the S3 PUT overlaps with the detection request.
+
+    Images are stored once per content hash. The PUT is conditional
+    (If-None-Match: *), so an image that is already archived costs one
+    rejected request and no new object or version.
+
+    In "durable" mode the handler waits for the write before responding
+    (a failed write is logged, never raised). In "fire-and-forget" mode it
+    does not wait; Lambda freezes the container after the response, so a
+    write still in flight completes on the next invocation or is lost if
+    the container is recycled.
+    """
+
+    def __init__(self, s3_client, bucket_name: str, mode: str = ARCHIVE_MODE_DURABLE, max_workers: int = 4):
+        if mode not in (ARCHIVE_MODE_DURABLE, ARCHIVE_MODE_FIRE_AND_FORGET):
+            raise ValueError(f"Unknown archive mode: {mode}")
+        self.s3_client = s3_client
+        self.bucket_name = bucket_name
+        self.mode = mode
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="archive")
+        self.stats = {"writes": 0, "deduplicated": 0, "failures": 0}
+
+    def _put(self, image_data: bytes, content_type: str, extension: str, digest: Optional[str]) -> str:
+        file_key = archive_key(digest or content_hash(image_data), extension)
+        try:
+            self.s3_client.put_object(
+                Bucket=self.bucket_name,
+                Key=file_key,
+                Body=image_data,
+                ContentType=content_type,
+                IfNoneMatch="*"
+            )
+        except Exception as e:
+            if is_existing_object_error(e):
+                self.stats["deduplicated"] += 1
+                return file_key
+            self.stats["failures"] += 1
+            raise
+        self.stats["writes"] += 1
+        return file_key
+
+    def submit(self, image_data: bytes, content_type: str = 'image/jpeg', extension: str = 'jpg',
+               digest: Optional[str] = None) -> Future:
+        future = self._executor.submit(self._put, image_data, content_type, extension, digest)
+        if self.mode == ARCHIVE_MODE_FIRE_AND_FORGET:
+            future.add_done_callback(self._log_failure)
+        return future
+
+    @staticmethod
+    def _log_failure(future: Future) -> None:
+        if future.exception() is not None:
+            logger.warning(f"Image archive write failed: {str(future.exception())}")
+
+    def wait(self, future: Future, timeout: Optional[float] = None) -> Optional[str]:
+        """
+        Returns the archived object key, or None if the write failed, timed
+        out, or the archive runs in fire-and-forget mode
+        """
+        if self.mode == ARCHIVE_MODE_FIRE_AND_FORGET:
+            return None
+        try:
+            return future.result(timeout=timeout)
+        except Exception as e:
+            logger.warning(f"Image archive write failed: {str(e)}")
+            return None
+
+    def shutdown(self) -> None:
+        """
+        Waits for queued writes; used when a long-running server stops
+        """
+        self._executor.shutdown(wait=True)
@@ -0,0 +1,91 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+import threading
+import time
+
+from verdict_cache import content_hash
+
+
+def run_batch(items: List[Dict],
+              load: Callable[[Dict], bytes],
+              analyze: Callable[[bytes], Dict],
+              max_concurrency: int,
+              deadline: Optional[float] = None) -> List[Dict]:
+    """
+    Analyses every batch item with at most `max_concurrency` calls in flight.
+
+    Each item is loaded and analysed in the same task, so no more than
+    `max_concurrency` images are held in memory at once. Items whose bytes
+    are identical are analysed once and share the result; the first of them
+    in the batch is reported as the original. Failures are reported per
+    item, so one bad image never fails the batch. Results are returned in
+    the order of `items`.
+    """
+    owners: Dict[str, int] = {}
+    outcomes: Dict[str, Future] = {}
+    item_hashes: List[Optional[str]] = [None] * len(items)
+    lock = threading.Lock()
+
+    def process(index: int):
+        if deadline is not None and time.monotonic() >= deadline:
+            return None, TimeoutError("Batch deadline exceeded")
+        image_data, error = _capture(load, items[index])
+        if error is not None:
+            return None, error
+        digest = content_hash(image_data)
+        with lock:
+            item_hashes[index] = digest
+            owners[digest] = min(owners.get(digest, index), index)
+            outcome = outcomes.get(digest)
+            analyses = outcome is None
+            if analyses:
+                outcome = outcomes[digest] = Future()
+        if not analyses:
+            # Only the analysing task keeps its copy of the bytes
+            del image_data
+            return outcome.result()
+        if deadline is not None and time.monotonic() >= deadline:
+            result = None, TimeoutError("Batch deadline exceeded")
+        else:
+            result = _capture(analyze, image_data)
+        outcome.set_result(result)
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch") as executor:
+        analyzed = list(executor.map(process, range(len(items))))
+
+    results: List[Dict] = []
+    for index, (item, (result, error)) in enumerate(zip(items, analyzed)):
+        if error is not None:
+            results.append(_error(item, index, error))
+            continue
+        results.append({
+            "id": item.get('id', index),
+            "status": "ok",
+            "deduplicated": owners[item_hashes[index]] != index,
+            **result
+        })
+    return results
+
+
+def summarize_batch(results: List[Dict]) -> Dict:
+    succeeded = sum(1 for result in results if result["status"] == "ok")
+    return {
+        "total": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "deduplicated": sum(1 for result in results if result.get("deduplicated")),
+        "cache_hits": sum(1 for result in results if result.get("cache_hit"))
+    }
+
+
+def _capture(func: Callable, arg):
+    try:
+        return func(arg), None
+    except Exception as e:
+        return None, e
+
+
+def _error(item: Dict, index: int, error: Exception) -> Dict:
+    item_id = item.get('id', index) if isinstance(item, dict) else index
+    return {"id": item_id, "status": "error", "error": str(error) or type(error).__name__}
@@ -0,0 +1,44 @@
+import threading
+
+# boto3 sessions are not thread-safe, and client construction loads the
+# service model from disk, so clients are built once, on first use
+_lock = threading.Lock()
+_clients = {}
+
+
+def _build(kind: str, service: str):
+    key = (kind, service)
+    with _lock:
+        if key not in _clients:
+            import boto3
+            factory = boto3.client if kind == "client" else boto3.resource
+            _clients[key] = factory(service)
+        return _clients[key]
+
+
+class LazyClient:
+    """
+    Stands in for a boto3 client and builds it on first attribute access,
+    keeping client construction (and the boto3 import) out of the cold start
+    """
+
+    def __init__(self, service: str):
+        self._service = service
+
+    def __getattr__(self, name):
+        return getattr(_build("client", self._service), name)
+
+
+class LazyTable:
+    """
+    Stands in for a DynamoDB Table resource and builds it on first use
+    """
+
+    def __init__(self, table_name: str):
+        self.table_name = table_name
+        self._table = None
+
+    def __getattr__(self, name):
+        if self._table is None:
+            self._table = _build("resource", "dynamodb").Table(self.table_name)
+        return getattr(self._table, name)
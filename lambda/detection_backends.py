@@ -0,0 +1,242 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Union
+import json
+import threading
+import time
+
+from aws_lambda_powertools import Logger
+
+from detection_client import DetectionClient
+
+logger = Logger(child=True)
+
+SCHEMA_NVIDIA_HIVE = "nvidia-hive"
+SCHEMA_FACES_V1 = "faces-v1"
+
+
+def normalize_nvidia_hive(body: Dict) -> Dict:
+    # Already the shape every caller and the frontend consume
+    return body
+
+
+def normalize_faces_v1(body: Dict) -> Dict:
+    """
+    Maps {"faces": [{"box": {"x1", "y1", "x2", "y2"}, "fake_probability",
+    "face_confidence"}]}, as served by self-hosted detectors, onto the
+    NVIDIA hive shape
+    """
+    boxes = []
+    for face in body.get("faces", []):
+        box = face.get("box", {})
+        boxes.append({
+            "vertices": [{"x": box.get("x1"), "y": box.get("y1")}, {"x": box.get("x2"), "y": box.get("y2")}],
+            "bbox_confidence": face.get("face_confidence"),
+            "is_deepfake": face.get("fake_probability")
+        })
+    return {"data": [{"index": 0, "bounding_boxes": boxes, "status": "SUCCESS"}]}
+
+
+# Response schema name -> function mapping a successful body onto the NVIDIA hive shape
+RESPONSE_SCHEMAS: Dict[str, Callable[[Dict], Dict]] = {
+    SCHEMA_NVIDIA_HIVE: normalize_nvidia_hive,
+    SCHEMA_FACES_V1: normalize_faces_v1,
+}
+
+# How a backend authenticates: with the NVIDIA API key, or not at all (self-hosted, local stub)
+AUTH_MODES = {"nvidia", "none"}
+
+
+def parse_backend_specs(raw: str) -> List[Dict]:
+    """
+    Parses the DETECTION_BACKENDS JSON list of alternate endpoints, e.g.
+    [{"name": "eu", "url": "https://...", "schema": "nvidia-hive", "auth": "nvidia"}]
+    """
+    specs = json.loads(raw) if raw else []
+    if not isinstance(specs, list):
+        raise ValueError("DETECTION_BACKENDS must be a JSON list")
+    parsed = []
+    for spec in specs:
+        if not isinstance(spec, dict) or not spec.get("name") or not spec.get("url"):
+            raise ValueError(f"Detection backend needs a name and url: {spec}")
+        schema = spec.get("schema", SCHEMA_NVIDIA_HIVE)
+        auth = spec.get("auth", "nvidia")
+        if schema not in RESPONSE_SCHEMAS:
+            raise ValueError(f"Unknown detection response schema: {schema}")
+        if auth not in AUTH_MODES:
+            raise ValueError(f"Unknown detection backend auth: {auth}")
+        parsed.append({"name": spec["name"], "url": spec["url"], "schema": schema, "auth": auth})
+    return parsed
+
+
+class LatencyTracker:
+    """
+    Rolling window of a backend's successful call latencies
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            if not self._samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(len(ordered) * q), len(ordered) - 1)]
+
+
+class DetectionBackend:
+    """
+    One detection endpoint: the client that calls it (with its own retries
+    and guard) and the schema its successful responses use
+    """
+
+    def __init__(self, name: str, client: DetectionClient, schema: str = SCHEMA_NVIDIA_HIVE):
+        if schema not in RESPONSE_SCHEMAS:
+            raise ValueError(f"Unknown detection response schema: {schema}")
+        self.name = name
+        self.client = client
+        self.schema = schema
+        self.latency = LatencyTracker()
+
+
+class BackendResponse:
+    """
+    A backend's response with its body mapped onto the NVIDIA hive shape;
+    error bodies are passed through unchanged
+    """
+
+    def __init__(self, response, backend: DetectionBackend, hedged: bool = False):
+        self.response = response
+        self.backend = backend
+        self.hedged = hedged
+
+    @property
+    def ok(self) -> bool:
+        return self.response.ok
+
+    @property
+    def status_code(self) -> int:
+        return self.response.status_code
+
+    def json(self) -> Dict:
+        body = self.response.json()
+        return RESPONSE_SCHEMAS[self.backend.schema](body) if self.ok else body
+
+
+class HedgedDetector:
+    """
+    Sends each detection request to the primary backend and, if it has not
+    answered within its observed `hedge_quantile` latency (or has already
+    failed), sends a duplicate to the next backend. The first successful
+    response wins. A losing call that has not started is cancelled; one
+    already in flight cannot be interrupted by requests, so its response is
+    discarded and the connection returned to the pool.
+
+    With a single backend, or hedging off, requests run on the caller's
+    thread with no extra overhead.
+    """
+
+    def __init__(self, backends: List[DetectionBackend], hedging: bool = True,
+                 hedge_quantile: float = 0.95, initial_hedge_delay: float = 3.0,
+                 min_hedge_delay: float = 0.05, min_samples: int = 20, max_workers: int = 16):
+        if not backends:
+            raise ValueError("At least one detection backend is required")
+        self.backends = backends
+        self.hedging = hedging and len(backends) > 1
+        self.hedge_quantile = hedge_quantile
+        self.initial_hedge_delay = initial_hedge_delay
+        self.min_hedge_delay = min_hedge_delay
+        self.min_samples = min_samples
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge") if self.hedging else None
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "primary_wins": 0, "cancelled": 0}
+
+    @property
+    def primary(self) -> DetectionBackend:
+        return self.backends[0]
+
+    def hedge_delay(self) -> float:
+        """
+        Seconds to wait on the primary before hedging: its observed latency
+        quantile, or `initial_hedge_delay` until enough calls are seen
+        """
+        if len(self.primary.latency) < self.min_samples:
+            return self.initial_hedge_delay
+        return max(self.primary.latency.quantile(self.hedge_quantile), self.min_hedge_delay)
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self.stats[name] += 1
+
+    def _call(self, backend: DetectionBackend, payload: Union[Dict, bytes],
+              deadline: Optional[float]) -> BackendResponse:
+        started = time.monotonic()
+        response = backend.client.detect(payload, deadline=deadline)
+        if response.ok:
+            backend.latency.add(time.monotonic() - started)
+        return BackendResponse(response, backend)
+
+    @staticmethod
+    def _succeeded(future: Future) -> bool:
+        return future.exception() is None and future.result().ok
+
+    def detect(self, payload: Union[Dict, bytes], deadline: Optional[float] = None) -> BackendResponse:
+        self._count("requests")
+        if not self.hedging:
+            return self._call(self.primary, payload, deadline)
+
+        primary = self._executor.submit(self._call, self.primary, payload, deadline)
+        calls = {primary: self.primary}
+        delay = self.hedge_delay()
+        if deadline is not None:
+            delay = min(delay, max(deadline - time.monotonic(), 0))
+        done, _ = wait([primary], timeout=delay)
+        if not done or not self._succeeded(primary):
+            logger.info(f"Hedging detection call after {delay:.2f}s", extra={
+                "primary_failed": bool(done), "backends": [backend.name for backend in self.backends[1:]]})
+            for backend in self.backends[1:]:
+                calls[self._executor.submit(self._call, backend, payload, deadline)] = backend
+            self._count("hedged")
+
+        pending = set(calls)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            winner = next((future for future in done if self._succeeded(future)), None)
+            if winner is None:
+                continue
+            for future in pending:
+                if future.cancel():
+                    self._count("cancelled")
+                else:
+                    future.add_done_callback(self._discard)
+            response = winner.result()
+            response.hedged = len(calls) > 1
+            if response.hedged:
+                self._count("primary_wins" if winner is primary else "hedge_wins")
+            return response
+
+        # Nothing succeeded: surface the primary's outcome as a single backend would
+        return primary.result()
+
+    @staticmethod
+    def _discard(future: Future) -> None:
+        if future.cancelled() or future.exception() is not None:
+            return
+        close = getattr(future.result().response, "close", None)
+        if close is not None:
+            close()
+
+    def hedge_rate(self) -> float:
+        return self.stats["hedged"] / self.stats["requests"] if self.stats["requests"] else 0.0
+
+    def hedge_win_ratio(self) -> float:
+        return self.stats["hedge_wins"] / self.stats["hedged"] if self.stats["hedged"] else 0.0
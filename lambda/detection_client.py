@@ -0,0 +1,176 @@
+from typing import TYPE_CHECKING, Dict, Optional, Union
+import random
+import time
+
+from flow_control import DetectionGuard
+from key_pool import ApiKeyPool
+from secret_provider import SecretProvider
+
+if TYPE_CHECKING:
+    import requests
+
+DEFAULT_INVOKE_URL = "https://ai.api.nvidia.com/v1/cv/hive/deepfake-image-detection"
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def image_payload(mime_type: str, base64_image: Union[str, bytes]) -> bytes:
+    """
+    Serializes the detection request body for one image in a single join,
+    instead of the data URI, json.dumps and encode copies of the image the
+    dict form costs
+    """
+    if isinstance(base64_image, str):
+        base64_image = base64_image.encode("ascii")
+    return b"".join((b'{"input": ["data:', mime_type.encode("ascii"), b";base64,", base64_image, b'"]}'))
+
+
+class DetectionClient:
+    """
+    Keep-alive client for the deepfake detection API.
+
+    One instance is created per container so the pooled Session keeps its
+    TCP/TLS connections open across warm invocations. Throttling (429) and
+    server errors (5xx) are retried with full-jitter exponential backoff,
+    honouring Retry-After, for as long as the caller's deadline allows.
+    An optional DetectionGuard paces every attempt and fails fast with
+    DetectionUnavailableError while the API is being protected. With a
+    `key_pool`, each attempt uses a key leased from the pool instead of
+    `api_key_provider`, and a throttled attempt is retried on another key
+    without waiting out its Retry-After.
+    """
+
+    def __init__(self, api_key_provider: SecretProvider,
+                 invoke_url: str = DEFAULT_INVOKE_URL,
+                 session: Optional["requests.Session"] = None,
+                 connect_timeout: float = 3.05,
+                 read_timeout: float = 25.0,
+                 max_attempts: int = 4,
+                 backoff_base: float = 0.2,
+                 backoff_cap: float = 4.0,
+                 pool_maxsize: int = 10,
+                 guard: Optional[DetectionGuard] = None,
+                 key_pool: Optional[ApiKeyPool] = None):
+        self.api_key_provider = api_key_provider
+        self.key_pool = key_pool
+        self.invoke_url = invoke_url
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.pool_maxsize = pool_maxsize
+        self.guard = guard
+        self._session = session
+        self.stats = {"requests": 0, "attempts": 0, "retries": 0, "key_refreshes": 0}
+
+    @property
+    def session(self) -> "requests.Session":
+        # requests is imported and the pool built on first use, off the cold start path
+        if self._session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_maxsize)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+        return self._session
+
+    @staticmethod
+    def build_headers(api_key: str) -> Dict:
+        return {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {api_key}",
+            "Accept": "application/json"
+        }
+
+    @staticmethod
+    def _retry_after(response: Optional["requests.Response"]) -> Optional[float]:
+        retry_after = response.headers.get("Retry-After") if response is not None else None
+        if retry_after:
+            try:
+                return float(retry_after)
+            except ValueError:
+                # HTTP-date form is not used by the detection API
+                pass
+        return None
+
+    def _backoff(self, attempt: int, response: Optional["requests.Response"]) -> float:
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+        retry_after = self._retry_after(response)
+        return max(delay, retry_after) if retry_after is not None else delay
+
+    def detect(self, payload: Union[Dict, bytes], deadline: Optional[float] = None) -> "requests.Response":
+        """
+        POSTs `payload`, a dict or an already serialized JSON body, and
+        returns the final response.
+
+        `deadline` is an absolute time.monotonic() value; no attempt or
+        backoff sleep is started that would run past it.
+        """
+        import requests
+        if deadline is None:
+            deadline = time.monotonic() + self.connect_timeout + self.read_timeout
+        self.stats["requests"] += 1
+        body = {"data": payload} if isinstance(payload, bytes) else {"json": payload}
+        key_refreshed = False
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise requests.Timeout("Detection API deadline exceeded")
+            lease = self.key_pool.acquire(deadline) if self.key_pool is not None else None
+            try:
+                probe = self.guard.acquire(deadline) if self.guard is not None else False
+            except Exception:
+                if lease is not None:
+                    self.key_pool.release(lease, None)
+                raise
+            # Waiting on the guard may have used up most of the budget
+            remaining = max(deadline - time.monotonic(), 0.01)
+            timeout = (min(self.connect_timeout, remaining), min(self.read_timeout, remaining))
+            self.stats["attempts"] += 1
+            response = None
+            started = time.monotonic()
+            try:
+                response = self.session.post(
+                    self.invoke_url,
+                    headers=self.build_headers(lease.key if lease is not None else self.api_key_provider.get()),
+                    timeout=timeout,
+                    **body
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt + 1 >= self.max_attempts or deadline - time.monotonic() <= 0:
+                    raise
+            finally:
+                status_code = response.status_code if response is not None else None
+                if self.guard is not None:
+                    self.guard.release(time.monotonic() - started, status_code, probe)
+                if lease is not None:
+                    self.key_pool.release(lease, status_code, self._retry_after(response))
+
+            if response is not None:
+                # A rejected key may have been rotated; refetch it once and retry
+                if response.status_code in (401, 403) and not key_refreshed:
+                    key_refreshed = True
+                    self.stats["key_refreshes"] += 1
+                    if self.key_pool is not None:
+                        self.key_pool.refresh()
+                    else:
+                        self.api_key_provider.get(force_refresh=True)
+                    continue
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+
+            attempt += 1
+            if self.key_pool is not None and status_code == 429 and self.key_pool.available():
+                # The limit is per key, so another key need not wait out this one's Retry-After
+                delay = self._backoff(attempt, None)
+            else:
+                delay = self._backoff(attempt, response)
+            if attempt >= self.max_attempts or time.monotonic() + delay >= deadline:
+                if response is None:
+                    raise requests.Timeout("Detection API deadline exceeded")
+                return response
+            self.stats["retries"] += 1
+            time.sleep(delay)
@@ -0,0 +1,258 @@
+from typing import Callable, Optional
+import threading
+import time
+
+from aws_lambda_powertools import Logger
+
+logger = Logger(child=True)
+
+# Statuses meaning the detection API is overloaded rather than the request bad
+OVERLOAD_STATUS_CODES = {429, 503}
+# Statuses meaning the detection API itself is failing; a 429 is one key's
+# rate limit, so it is counted apart and never trips the shared breaker
+FAILURE_STATUS_CODES = {500, 502, 503, 504}
+THROTTLED_STATUS_CODE = 429
+
+
+class DetectionUnavailableError(Exception):
+    """
+    Raised instead of calling the detection API while it is being protected;
+    carries the seconds after which the caller may retry
+    """
+
+    def __init__(self, retry_after: float, reason: str):
+        super().__init__(f"Detection API unavailable ({reason}); retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class TokenBucket:
+    """
+    Paces calls to `rate` per second with bursts of up to `burst`.
+
+    Tokens are reserved, so concurrent callers queue behind each other
+    instead of all waking at once; a caller whose turn would come after its
+    deadline is refused without waiting.
+    """
+
+    def __init__(self, rate: float, burst: float, clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.rate = rate
+        self.burst = burst
+        self._clock = clock
+        self._sleep = sleep
+        self._tokens = burst
+        self._updated_at = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, deadline: float) -> None:
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated_at) * self.rate)
+            self._updated_at = now
+            wait = max(0.0, (1 - self._tokens) / self.rate)
+            if now + wait > deadline:
+                raise DetectionUnavailableError(wait, "rate limit")
+            self._tokens -= 1
+        if wait:
+            self._sleep(wait)
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    AIMD limit on in-flight detection calls. The limit grows by one per
+    limit's worth of fast successes and is cut by `decrease_ratio` whenever
+    a call is throttled, overloaded or slower than `latency_target`.
+    """
+
+    def __init__(self, max_limit: int, min_limit: int = 1, initial_limit: Optional[int] = None,
+                 latency_target: float = 10.0, decrease_ratio: float = 0.5,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_limit = max_limit
+        self.min_limit = min_limit
+        self.limit = float(initial_limit or max_limit)
+        self.latency_target = latency_target
+        self.decrease_ratio = decrease_ratio
+        self._clock = clock
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, deadline: float) -> None:
+        with self._condition:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - self._clock()
+                if remaining <= 0:
+                    raise DetectionUnavailableError(1.0, "concurrency limit")
+                self._condition.wait(remaining)
+            self.in_flight += 1
+
+    def release(self, latency: float, overloaded: bool) -> None:
+        with self._condition:
+            self.in_flight -= 1
+            if overloaded or latency > self.latency_target:
+                self.limit = max(self.min_limit, self.limit * self.decrease_ratio)
+            else:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._condition.notify_all()
+
+
+class BreakerStateStore:
+    """
+    Shares a circuit breaker's open-until time through the results table,
+    keyed pk="BREAKER#<name>", sk="BREAKER", so every container backs off
+    together. Reads are cached for `sync_interval` seconds.
+    """
+
+    def __init__(self, table, name: str = "detection", sync_interval: float = 2.0,
+                 clock: Callable[[], float] = time.time):
+        self.table = table
+        self.key = {"pk": f"BREAKER#{name}", "sk": "BREAKER"}
+        self.sync_interval = sync_interval
+        self._clock = clock
+        self._open_until = 0.0
+        self._synced_at: Optional[float] = None
+
+    def open_until(self) -> float:
+        now = self._clock()
+        if self._synced_at is None or now - self._synced_at >= self.sync_interval:
+            try:
+                item = self.table.get_item(Key=self.key).get("Item") or {}
+                self._open_until = float(item.get("open_until", 0))
+            except Exception as e:
+                # A store outage must not take detection down with it
+                logger.warning(f"Circuit breaker state read failed: {str(e)}")
+            self._synced_at = now
+        return self._open_until
+
+    def set_open_until(self, open_until: float) -> None:
+        self._open_until = open_until
+        self._synced_at = self._clock()
+        try:
+            self.table.put_item(Item={
+                **self.key,
+                "open_until": int(open_until),
+                "updated_at": int(self._synced_at),
+                "expires_at": int(max(open_until, self._synced_at)) + 24 * 3600
+            })
+        except Exception as e:
+            logger.warning(f"Circuit breaker state write failed: {str(e)}")
+
+
+class CircuitBreaker:
+    """
+    Fails fast once the detection API has failed `failure_threshold` times in
+    a row. After `cooldown` seconds one probe call is let through per
+    container; success closes the breaker, failure re-opens it. Throttled
+    calls neither count as failures nor reset the run of failures; the key
+    pool and the concurrency limit back off from them.
+    """
+
+    def __init__(self, failure_threshold: int = 5, cooldown: float = 30.0,
+                 store: Optional[BreakerStateStore] = None, clock: Callable[[], float] = time.time):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.store = store
+        self._clock = clock
+        self._open_until = 0.0
+        self._consecutive_failures = 0
+        self._probing = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0, "throttled": 0}
+
+    def _current_open_until(self) -> float:
+        return self.store.open_until() if self.store is not None else self._open_until
+
+    def before_call(self) -> bool:
+        """
+        Raises while the breaker is open; returns True if this call is the probe
+        """
+        open_until = self._current_open_until()
+        with self._lock:
+            if not open_until:
+                return False
+            now = self._clock()
+            if now < open_until:
+                self.stats["rejected"] += 1
+                raise DetectionUnavailableError(open_until - now, "circuit open")
+            # Cooldown over: let a single probe through while the rest wait
+            if self._probing:
+                self.stats["rejected"] += 1
+                raise DetectionUnavailableError(1.0, "circuit half-open")
+            self._probing = True
+            return True
+
+    def cancel_probe(self) -> None:
+        """
+        Returns the probe slot when the call is abandoned before it is made
+        """
+        with self._lock:
+            self._probing = False
+
+    def record(self, failed: bool, probe: bool = False, throttled: bool = False) -> None:
+        with self._lock:
+            if probe:
+                self._probing = False
+            if throttled:
+                # The next call after the cooldown probes again
+                self.stats["throttled"] += 1
+                return
+            if failed:
+                self._consecutive_failures += 1
+            else:
+                self._consecutive_failures = 0
+            opened = failed and (probe or self._consecutive_failures >= self.failure_threshold)
+            closed = probe and not failed
+            if opened:
+                self._open_until = self._clock() + self.cooldown
+                self._consecutive_failures = 0
+                self.stats["opened"] += 1
+            elif closed:
+                self._open_until = 0.0
+            open_until = self._open_until
+
+        if opened:
+            logger.warning(f"Detection circuit opened for {self.cooldown:.0f}s")
+        if self.store is not None and (opened or closed):
+            self.store.set_open_until(open_until)
+
+
+class DetectionGuard:
+    """
+    Client-side protection applied to every detection API attempt: the
+    circuit breaker first, then the token bucket, then the adaptive
+    concurrency limit. Any part may be None.
+    """
+
+    def __init__(self, rate_limiter: Optional[TokenBucket] = None,
+                 concurrency_limiter: Optional[AdaptiveConcurrencyLimiter] = None,
+                 circuit_breaker: Optional[CircuitBreaker] = None):
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.circuit_breaker = circuit_breaker
+
+    def acquire(self, deadline: float) -> bool:
+        """
+        Waits for permission to make one attempt; returns True if the attempt
+        is the circuit breaker's probe, to be passed back to release()
+        """
+        probe = self.circuit_breaker.before_call() if self.circuit_breaker is not None else False
+        try:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire(deadline)
+            if self.concurrency_limiter is not None:
+                self.concurrency_limiter.acquire(deadline)
+        except DetectionUnavailableError:
+            if probe:
+                self.circuit_breaker.cancel_probe()
+            raise
+        return probe
+
+    def release(self, latency: float, status_code: Optional[int], probe: bool = False) -> None:
+        """
+        Reports an attempt's outcome; a None status means no response arrived
+        """
+        if self.concurrency_limiter is not None:
+            self.concurrency_limiter.release(latency, status_code is None or status_code in OVERLOAD_STATUS_CODES)
+        if self.circuit_breaker is not None:
+            self.circuit_breaker.record(status_code is None or status_code in FAILURE_STATUS_CODES, probe,
+                                        throttled=status_code == THROTTLED_STATUS_CODE)
@@ -0,0 +1,195 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Sequence
+import base64
+import heapq
+import json
+
+from analysis_records import (CONFIDENCE_BANDS, DEEPFAKE_THRESHOLD, NO_CONFIDENCE_BAND, VERDICT_AUTHENTIC,
+                              VERDICT_DEEPFAKE, VERDICT_NO_FACE, VERDICTS, history_partition)
+
+HISTORY_INDEX_NAME = "HistoryIndex"
+
+# Attributes projected into the index; a query may ask for any subset
+HISTORY_FIELDS = ("image_hash", "verdict", "confidence", "latency_ms", "bytes", "analyzed_at", "cache_hit")
+
+# Upper bound for a sort key with a given millisecond prefix
+SORT_KEY_MAX_SUFFIX = "#~"
+
+
+class HistoryQueryError(ValueError):
+    pass
+
+
+def _verdict_bands(verdict: str) -> List[int]:
+    # Scores at exactly the threshold are authentic, so band 5 holds both verdicts
+    threshold_band = int(DEEPFAKE_THRESHOLD * CONFIDENCE_BANDS)
+    if verdict == VERDICT_DEEPFAKE:
+        return list(range(threshold_band, CONFIDENCE_BANDS))
+    if verdict == VERDICT_AUTHENTIC:
+        return list(range(0, threshold_band + 1))
+    return []
+
+
+def partitions_for(verdict: Optional[str], min_confidence: Optional[float],
+                   max_confidence: Optional[float]) -> List[str]:
+    """
+    Returns the index partitions that can hold records matching the filter
+    """
+    verdicts = [verdict] if verdict else list(VERDICTS)
+    bounded = min_confidence is not None or max_confidence is not None
+    low = int(min(max(min_confidence or 0.0, 0.0), 1.0) * CONFIDENCE_BANDS)
+    high = int(min(max(max_confidence if max_confidence is not None else 1.0, 0.0), 1.0) * CONFIDENCE_BANDS)
+    partitions = []
+    for name in verdicts:
+        if name == VERDICT_NO_FACE:
+            # Records without a face have no confidence to filter on
+            if not bounded:
+                partitions.append(history_partition(name, NO_CONFIDENCE_BAND))
+            continue
+        partitions.extend(history_partition(name, str(band)) for band in _verdict_bands(name) if low <= band <= high)
+    return partitions
+
+
+def parse_time_ms(value: str) -> int:
+    """
+    Parses an ISO 8601 time (UTC when no offset is given) or epoch
+    milliseconds into epoch milliseconds
+    """
+    if value.isdigit():
+        return int(value)
+    try:
+        parsed = datetime.fromisoformat(value)
+    except ValueError:
+        raise HistoryQueryError(f"Invalid time: {value}")
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+def encode_cursor(sort_key: str) -> str:
+    return base64.urlsafe_b64encode(json.dumps({"before": sort_key}).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> str:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        return json.loads(base64.urlsafe_b64decode(padded))["before"]
+    except (ValueError, KeyError, TypeError):
+        raise HistoryQueryError("Invalid cursor")
+
+
+def _plain(value):
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    return value
+
+
+class AnalysisHistory:
+    """
+    Newest-first browsing of analysis records through the HistoryIndex
+    GSI of the results table; nothing is ever scanned.
+
+    A filter maps to a handful of (verdict, confidence band) partitions.
+    Each is queried on its own sort-key range and the streams are merged
+    by time. Pages are keyset paginated: the cursor is the sort key of
+    the last record returned, so the next page starts strictly below it.
+    """
+
+    def __init__(self, table, index_name: str = HISTORY_INDEX_NAME, max_workers: int = 4):
+        self.table = table
+        self.index_name = index_name
+        self.max_workers = max_workers
+
+    def query(self, verdict: Optional[str] = None,
+              min_confidence: Optional[float] = None,
+              max_confidence: Optional[float] = None,
+              start_ms: Optional[int] = None,
+              end_ms: Optional[int] = None,
+              limit: int = 50,
+              cursor: Optional[str] = None,
+              fields: Optional[Sequence[str]] = None) -> Dict:
+        if verdict is not None and verdict not in VERDICTS:
+            raise HistoryQueryError(f"verdict must be one of {', '.join(VERDICTS)}")
+        fields = list(fields) if fields else list(HISTORY_FIELDS)
+        unknown = [field for field in fields if field not in HISTORY_FIELDS]
+        if unknown:
+            raise HistoryQueryError(f"Unknown fields: {', '.join(unknown)}")
+
+        lower = f"{start_ms or 0:013d}"
+        upper = f"{end_ms:013d}{SORT_KEY_MAX_SUFFIX}" if end_ms is not None else f"{'9' * 13}{SORT_KEY_MAX_SUFFIX}"
+        before = decode_cursor(cursor) if cursor else None
+        if before is not None:
+            upper = min(upper, before)
+
+        # Confidence is read back to trim the edge bands, and the sort key for the cursor
+        filtering = min_confidence is not None or max_confidence is not None
+        projected = set(fields) | {"history_sk"} | ({"confidence"} if filtering else set())
+
+        partitions = partitions_for(verdict, min_confidence, max_confidence)
+        readers = [self._read(partition, lower, upper, before, sorted(projected), limit + 1) for partition in partitions]
+        # First pages are fetched concurrently; later pages only when a partition runs dry
+        if len(readers) > 1:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(readers)), thread_name_prefix="history") as executor:
+                firsts = list(executor.map(self._first, readers))
+        else:
+            firsts = [self._first(reader) for reader in readers]
+        streams = [self._chain(first, reader) for first, reader in zip(firsts, readers)]
+
+        items, last_key = [], None
+        for item in heapq.merge(*streams, key=lambda item: item["history_sk"], reverse=True):
+            if filtering and not self._within(item.get("confidence"), min_confidence, max_confidence):
+                continue
+            if len(items) == limit:
+                break
+            last_key = item["history_sk"]
+            items.append({field: _plain(item[field]) for field in fields if field in item})
+        else:
+            last_key = None
+
+        return {
+            "items": items,
+            "count": len(items),
+            "next_cursor": encode_cursor(last_key) if last_key is not None else None
+        }
+
+    @staticmethod
+    def _within(confidence, low: Optional[float], high: Optional[float]) -> bool:
+        if confidence is None:
+            return False
+        confidence = float(confidence)
+        return (low is None or confidence >= low) and (high is None or confidence <= high)
+
+    @staticmethod
+    def _first(reader: Iterator[Dict]) -> Optional[Dict]:
+        return next(reader, None)
+
+    @staticmethod
+    def _chain(first: Optional[Dict], reader: Iterator[Dict]) -> Iterator[Dict]:
+        if first is None:
+            return
+        yield first
+        yield from reader
+
+    def _read(self, partition: str, lower: str, upper: str, before: Optional[str],
+              projected: List[str], page_size: int) -> Iterator[Dict]:
+        names = {f"#f{i}": field for i, field in enumerate(projected)}
+        kwargs = {
+            "IndexName": self.index_name,
+            "KeyConditionExpression": "history_pk = :pk AND history_sk BETWEEN :lower AND :upper",
+            "ExpressionAttributeValues": {":pk": partition, ":lower": lower, ":upper": upper},
+            "ExpressionAttributeNames": names,
+            "ProjectionExpression": ", ".join(names),
+            "ScanIndexForward": False,
+            "Limit": page_size
+        }
+        while True:
+            page = self.table.query(**kwargs)
+            for item in page.get("Items", []):
+                # BETWEEN is inclusive, so the cursor's own record comes back once
+                if item["history_sk"] != before:
+                    yield item
+            if "LastEvaluatedKey" not in page:
+                return
+            kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
@@ -0,0 +1,179 @@
+from typing import Dict, Optional, Tuple
+import io
+
+_pillow = None
+
+
+def pillow():
+    """
+    Returns PIL.Image, imported on first use, or None when Pillow is missing.
+    Pillow ships in the Lambda layer; without it images are forwarded unchanged.
+    """
+    global _pillow
+    if _pillow is None:
+        try:
+            from PIL import Image
+            _pillow = Image
+        except ImportError:  # pragma: no cover - depends on the deployed layer
+            _pillow = False
+    return _pillow or None
+
+IMAGE_FORMATS = {
+    "jpeg": ("image/jpeg", "jpg"),
+    "png": ("image/png", "png"),
+    "gif": ("image/gif", "gif"),
+    "webp": ("image/webp", "webp"),
+    "bmp": ("image/bmp", "bmp"),
+    "tiff": ("image/tiff", "tiff"),
+}
+
+# Formats the detection API accepts as-is; anything else is re-encoded to JPEG
+DETECTION_FORMATS = {"jpeg", "png"}
+
+
+def sniff_format(data: bytes) -> Optional[str]:
+    """
+    Returns the image format named by the file's magic bytes, or None
+    """
+    if data[:3] == b"\xff\xd8\xff":
+        return "jpeg"
+    if data[:8] == b"\x89PNG\r\n\x1a\n":
+        return "png"
+    if data[:6] in (b"GIF87a", b"GIF89a"):
+        return "gif"
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "webp"
+    if data[:2] == b"BM":
+        return "bmp"
+    if data[:4] in (b"II*\x00", b"MM\x00*"):
+        return "tiff"
+    return None
+
+
+def mime_type(image_format: Optional[str]) -> str:
+    return IMAGE_FORMATS.get(image_format, ("application/octet-stream", "bin"))[0]
+
+
+def file_extension(image_format: Optional[str]) -> str:
+    return IMAGE_FORMATS.get(image_format, ("application/octet-stream", "bin"))[1]
+
+
+class NormalizedImage:
+    """
+    Image bytes prepared for the detection API, plus the factors that map
+    coordinates on the normalized image back onto the original
+    """
+
+    def __init__(self, data: bytes, image_format: Optional[str],
+                 original_size: Optional[Tuple[int, int]] = None,
+                 size: Optional[Tuple[int, int]] = None):
+        self.data = data
+        self.format = image_format
+        self.original_size = original_size
+        self.size = size or original_size
+
+    @property
+    def mime_type(self) -> str:
+        return mime_type(self.format)
+
+    @property
+    def scale(self) -> Tuple[float, float]:
+        if not self.original_size or not self.size or self.size == self.original_size:
+            return 1.0, 1.0
+        return self.original_size[0] / self.size[0], self.original_size[1] / self.size[1]
+
+
+def normalize_image(data: bytes, max_edge: int = 1536, jpeg_quality: int = 85) -> NormalizedImage:
+    """
+    Downscales images whose longest edge exceeds `max_edge` and re-encodes
+    formats the detection API does not take. Images that need neither are
+    returned untouched, so small uploads pay no decode cost.
+    """
+    image_format = sniff_format(data)
+    if image_format is None or max_edge <= 0:
+        return NormalizedImage(data, image_format)
+
+    Image = pillow()
+    if Image is None:
+        return NormalizedImage(data, image_format)
+
+    try:
+        return _normalize_with_pillow(Image, data, image_format, max_edge, jpeg_quality)
+    except (OSError, ValueError):
+        # Undecodable images are left for the detection API to judge
+        return NormalizedImage(data, image_format)
+
+
+def _normalize_with_pillow(Image, data: bytes, image_format: str, max_edge: int, jpeg_quality: int) -> NormalizedImage:
+    with Image.open(io.BytesIO(data)) as image:
+        original_size = image.size
+        needs_resize = max(original_size) > max_edge
+        if not needs_resize and image_format in DETECTION_FORMATS:
+            return NormalizedImage(data, image_format, original_size)
+
+        if needs_resize:
+            ratio = max_edge / max(original_size)
+            target = (max(1, round(original_size[0] * ratio)), max(1, round(original_size[1] * ratio)))
+            # draft() lets the JPEG decoder skip straight to a reduced DCT scale
+            image.draft("RGB", target)
+            image = image.convert("RGB").resize(target, Image.LANCZOS, reducing_gap=2.0)
+        else:
+            image = image.convert("RGB")
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=jpeg_quality)
+        return NormalizedImage(output.getvalue(), "jpeg", original_size, image.size)
+
+
+# Images smaller than this carry too little structure for a meaningful hash
+PERCEPTUAL_HASH_MIN_EDGE = 32
+
+
+def difference_hash(data: bytes, hash_size: int = 8) -> Optional[Tuple[int, Tuple[int, int]]]:
+    """
+    Returns (dHash, (width, height)) for an image, or None when Pillow is
+    missing, the image cannot be decoded or it is too small or flat to hash.
+
+    The hash records whether each pixel of a (hash_size + 1) x hash_size
+    greyscale thumbnail is brighter than its right-hand neighbour, so it
+    survives re-compression, resizing and metadata changes.
+    """
+    Image = pillow()
+    if Image is None:
+        return None
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            size = image.size
+            if min(size) < PERCEPTUAL_HASH_MIN_EDGE:
+                return None
+            image.draft("L", ((hash_size + 1) * 8, hash_size * 8))
+            pixels = image.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS).tobytes()
+    except (OSError, ValueError):
+        return None
+
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = value << 1 | (pixels[offset + col] > pixels[offset + col + 1])
+    # A flat image hashes to zero and would match every other flat image
+    return (value, size) if value else None
+
+
+def scale_detection_result(result: Dict, scale: Tuple[float, float]) -> Dict:
+    """
+    Maps bounding box vertices in a detection result from normalized-image
+    coordinates back to the original image, in place
+    """
+    scale_x, scale_y = scale
+    if scale_x == 1.0 and scale_y == 1.0:
+        return result
+    for entry in result.get("data", []):
+        for box in entry.get("bounding_boxes", []):
+            for vertex in box.get("vertices", []):
+                if "x" in vertex:
+                    vertex["x"] = round(vertex["x"] * scale_x)
+                if "y" in vertex:
+                    vertex["y"] = round(vertex["y"] * scale_y)
+    return result
@@ -0,0 +1,135 @@
+from contextlib import contextmanager
+from typing import Callable, List, Tuple
+import os
+import threading
+import time
+
+from aws_lambda_powertools import Metrics, Tracer
+from aws_lambda_powertools.metrics import EphemeralMetrics, MetricUnit
+
+tracer = Tracer(service="ReceiptApp")
+
+# Metrics are buffered and written as a single Embedded Metric Format log
+# line when the handler decorated with @metrics.log_metrics returns
+metrics = Metrics(namespace=os.environ.get('POWERTOOLS_METRICS_NAMESPACE', 'DeepFake'), service="ReceiptApp")
+
+# The metric buffer is a plain dict; batch threads and concurrent server
+# requests add to it while another request may be flushing it
+metrics_lock = threading.Lock()
+
+
+def add_metric(name: str, unit: MetricUnit, value: float) -> None:
+    with metrics_lock:
+        metrics.add_metric(name=name, unit=unit, value=value)
+
+
+def flush_metrics() -> None:
+    """
+    Writes buffered metrics as one EMF line; for callers not wrapped in
+    @metrics.log_metrics (the standalone server)
+    """
+    with metrics_lock:
+        if metrics.metric_set:
+            metrics.flush_metrics()
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Times a block as the `<name>Latency` metric in milliseconds and traces it
+    as an X-Ray subsegment of the same name
+    """
+    start = time.perf_counter()
+    with tracer.provider.in_subsegment(f"## {name}") as subsegment:
+        try:
+            yield subsegment
+        finally:
+            add_metric(f"{name}Latency", MetricUnit.Milliseconds, round((time.perf_counter() - start) * 1000, 3))
+
+
+def timed(name: str, func: Callable) -> Callable:
+    """
+    Wraps `func` so every call is recorded as a stage
+    """
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def count(name: str, value: float = 1) -> None:
+    add_metric(name, MetricUnit.Count, value)
+
+
+def size(name: str, value: int) -> None:
+    add_metric(name, MetricUnit.Bytes, value)
+
+
+def record_deltas(before: dict, after: dict, names: dict) -> None:
+    """
+    Records the growth of counters in a stats dict as Count metrics,
+    e.g. {"retries": "DetectionRetries"}
+    """
+    for key, metric_name in names.items():
+        delta = after.get(key, 0) - before.get(key, 0)
+        if delta:
+            count(metric_name, delta)
+
+
+class CounterDeltas:
+    """
+    Records the growth of shared stats dicts, given as (get_stats, names)
+    pairs, as Count metrics once per invocation. Invocations running at the
+    same time (the standalone server) each record what grew since the last
+    one finished, so every increment is counted exactly once.
+    """
+
+    def __init__(self, sources: List[Tuple[Callable[[], dict], dict]]):
+        self.sources = sources
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._recorded: List[dict] = []
+
+    def start(self) -> None:
+        with self._lock:
+            # Counters moved between invocations (e.g. by a background thread) are not attributed
+            if self._in_flight == 0:
+                self._recorded = [dict(get_stats()) for get_stats, _ in self.sources]
+            self._in_flight += 1
+
+    def finish(self) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            for index, (get_stats, names) in enumerate(self.sources):
+                after = dict(get_stats())
+                self._record(self._recorded[index], after, names)
+                self._recorded[index] = after
+
+    def _record(self, before: dict, after: dict, names: dict) -> None:
+        record_deltas(before, after, names)
+
+
+class GroupCounterDeltas(CounterDeltas):
+    """
+    CounterDeltas for counters kept per member of a group, e.g. per API key:
+    `get_stats` returns {member: {counter: value}}. The buffered metrics
+    share one dimension set, so each member that moved gets its own EMF
+    line with the member's name as `dimension`.
+    """
+
+    def __init__(self, get_stats: Callable[[], dict], names: dict, dimension: str):
+        super().__init__([(get_stats, names)])
+        self.dimension = dimension
+        self._metrics = EphemeralMetrics(namespace=metrics.namespace, service="ReceiptApp")
+
+    def _record(self, before: dict, after: dict, names: dict) -> None:
+        # Called under the lock, so the ephemeral metric set is never shared
+        for member, counters in after.items():
+            previous = before.get(member, {})
+            for key, metric_name in names.items():
+                delta = counters.get(key, 0) - previous.get(key, 0)
+                if delta:
+                    self._metrics.add_metric(name=metric_name, unit=MetricUnit.Count, value=delta)
+            if self._metrics.metric_set:
+                self._metrics.add_dimension(name=self.dimension, value=member)
+                self._metrics.flush_metrics()
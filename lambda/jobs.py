@@ -0,0 +1,120 @@
+from typing import Dict, Optional
+import json
+import time
+import uuid
+
+JOB_STATUS_QUEUED = "queued"
+JOB_STATUS_RUNNING = "running"
+JOB_STATUS_SUCCEEDED = "succeeded"
+JOB_STATUS_FAILED = "failed"
+
+
+def new_job_id() -> str:
+    return uuid.uuid4().hex
+
+
+def staged_image_key(job_id: str) -> str:
+    """
+    S3 key where a job's image waits for the worker; SQS messages are
+    capped at 256 KB so images never travel through the queue itself
+    """
+    return f"jobs/{job_id}"
+
+
+def upload_key(job_id: str) -> str:
+    """
+    S3 key a client PUTs to through a presigned URL; objects under this
+    prefix trigger the S3 analysis Lambda
+    """
+    return f"incoming/{job_id}"
+
+
+def job_id_from_upload_key(s3_key: str) -> str:
+    return s3_key[len("incoming/"):]
+
+
+class JobStore:
+    """
+    Job status records in the results table, keyed pk="JOB#<id>", sk="JOB".
+    Records expire through the table's expires_at TTL attribute.
+    """
+
+    def __init__(self, table, ttl_seconds: int = 24 * 3600):
+        self.table = table
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _key(job_id: str) -> Dict:
+        return {"pk": f"JOB#{job_id}", "sk": "JOB"}
+
+    def create(self, job_id: str, status: str = JOB_STATUS_QUEUED, result: Optional[Dict] = None) -> Dict:
+        now = int(time.time())
+        item = {
+            **self._key(job_id),
+            "job_id": job_id,
+            "status": status,
+            "created_at": now,
+            "updated_at": now,
+            "expires_at": now + self.ttl_seconds
+        }
+        if result is not None:
+            item["result"] = json.dumps(result)
+        self.table.put_item(Item=item)
+        return item
+
+    def _update(self, job_id: str, status: str, **fields) -> None:
+        names = {"#status": "status"}
+        values = {":status": status, ":updated_at": int(time.time())}
+        assignments = ["#status = :status", "updated_at = :updated_at"]
+        for name, value in fields.items():
+            names[f"#{name}"] = name
+            values[f":{name}"] = value
+            assignments.append(f"#{name} = :{name}")
+        self.table.update_item(
+            Key=self._key(job_id),
+            UpdateExpression="SET " + ", ".join(assignments),
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values
+        )
+
+    def mark_running(self, job_id: str) -> None:
+        self._update(job_id, JOB_STATUS_RUNNING)
+
+    def complete(self, job_id: str, result: Dict) -> None:
+        # Stored as a JSON string so floats survive without Decimal conversion
+        self._update(job_id, JOB_STATUS_SUCCEEDED, result=json.dumps(result))
+
+    def fail(self, job_id: str, error: str) -> None:
+        self._update(job_id, JOB_STATUS_FAILED, error=error)
+
+    def get(self, job_id: str) -> Optional[Dict]:
+        item = self.table.get_item(Key=self._key(job_id)).get("Item")
+        if not item:
+            return None
+        job = {
+            "job_id": item["job_id"],
+            "status": item["status"],
+            "created_at": int(item["created_at"]),
+            "updated_at": int(item["updated_at"])
+        }
+        if "result" in item:
+            job["result"] = json.loads(item["result"])
+        if "error" in item:
+            job["error"] = item["error"]
+        return job
+
+
+class JobQueue:
+    """
+    Sends job messages to the SQS queue consumed by the worker Lambda
+    """
+
+    def __init__(self, sqs_client, queue_url: str):
+        self.sqs_client = sqs_client
+        self.queue_url = queue_url
+
+    def send(self, job_id: str, s3_key: str) -> None:
+        self.sqs_client.send_message(
+            QueueUrl=self.queue_url,
+            MessageBody=json.dumps({"job_id": job_id, "s3_key": s3_key})
+        )
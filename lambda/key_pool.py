@@ -0,0 +1,168 @@
+from typing import Callable, Dict, List, Optional, Tuple
+import json
+import threading
+import time
+
+from aws_lambda_powertools import Logger
+
+from flow_control import DetectionUnavailableError
+from secret_provider import SecretProvider
+
+logger = Logger(child=True)
+
+
+def parse_key_pool(secret: str) -> List[Tuple[str, str]]:
+    """
+    Returns (name, key) pairs from the API key secret, which holds either a
+    single key or a JSON list of keys, each a string or {"name", "key"}.
+    Names identify keys in logs and stats without exposing them.
+    """
+    secret = secret.strip()
+    if not secret.startswith(("[", "{")):
+        return [("key-0", secret)]
+    entries = json.loads(secret)
+    if isinstance(entries, dict):
+        entries = entries.get("keys", [])
+    pool = []
+    for index, entry in enumerate(entries):
+        if isinstance(entry, str):
+            pool.append((f"key-{index}", entry))
+        else:
+            pool.append((entry.get("name") or f"key-{index}", entry["key"]))
+    if not pool:
+        raise ValueError("API key secret holds no keys")
+    return pool
+
+
+class ApiKey:
+
+    def __init__(self, name: str, key: str):
+        self.name = name
+        self.key = key
+        self.requests = 0
+        self.throttles = 0
+        self.in_flight = 0
+        self.last_throttled_at = float("-inf")
+        self.quarantined_until = 0.0
+
+
+class ApiKeyPool:
+    """
+    Spreads detection calls across the keys in the API key secret, since
+    the detection API rate-limits per key.
+
+    Each attempt takes the least recently throttled key that is not in
+    quarantine; keys not throttled within `throttle_memory` count as equal
+    and are balanced by in-flight and total requests. A key answering 429
+    is quarantined for its Retry-After, or `quarantine_seconds` without
+    one. When every key is quarantined, a caller waits for the first to be
+    released, or gets DetectionUnavailableError if that is past its
+    deadline. The key list is re-read whenever the provider's cached
+    secret changes; state is kept for keys by name.
+    """
+
+    def __init__(self, provider: SecretProvider, quarantine_seconds: float = 5.0,
+                 throttle_memory: float = 60.0, on_resize: Optional[Callable[[int], None]] = None,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        self.provider = provider
+        self.quarantine_seconds = quarantine_seconds
+        self.throttle_memory = throttle_memory
+        self.on_resize = on_resize
+        self._clock = clock
+        self._sleep = sleep
+        self._secret: Optional[str] = None
+        self._keys: List[ApiKey] = []
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "throttles": 0, "exhausted": 0}
+
+    def _load(self) -> None:
+        secret = self.provider.get()
+        with self._lock:
+            if secret == self._secret:
+                return
+            previous = {key.name: key for key in self._keys}
+            keys = []
+            for name, value in parse_key_pool(secret):
+                key = previous.get(name)
+                keys.append(key if key is not None and key.key == value else ApiKey(name, value))
+            self._secret, self._keys = secret, keys
+        logger.info("API key pool loaded", extra={"api_keys": [key.name for key in keys]})
+        if self.on_resize is not None:
+            self.on_resize(len(keys))
+
+    def acquire(self, deadline: float) -> ApiKey:
+        """
+        Returns the key to use for one attempt; pass it back to release()
+        """
+        self._load()
+        while True:
+            with self._lock:
+                now = self._clock()
+                available = [key for key in self._keys if key.quarantined_until <= now]
+                if available:
+                    key = min(available, key=lambda key: (
+                        key.last_throttled_at if now - key.last_throttled_at < self.throttle_memory else float("-inf"),
+                        key.in_flight,
+                        key.requests
+                    ))
+                    key.in_flight += 1
+                    key.requests += 1
+                    self.stats["requests"] += 1
+                    return key
+                wait = min(key.quarantined_until for key in self._keys) - now
+                if now + wait > deadline:
+                    self.stats["exhausted"] += 1
+                    raise DetectionUnavailableError(wait, "all API keys throttled")
+            self._sleep(wait)
+
+    def release(self, key: ApiKey, status_code: Optional[int], retry_after: Optional[float] = None) -> None:
+        """
+        Reports an attempt's outcome; a 429 quarantines the key
+        """
+        with self._lock:
+            key.in_flight -= 1
+            if status_code != 429:
+                return
+            now = self._clock()
+            quarantine = retry_after if retry_after is not None else self.quarantine_seconds
+            key.throttles += 1
+            key.last_throttled_at = now
+            key.quarantined_until = max(key.quarantined_until, now + quarantine)
+            self.stats["throttles"] += 1
+        logger.warning("API key quarantined", extra={
+            "api_key": key.name,
+            "quarantine_seconds": quarantine,
+            "key_requests": key.requests,
+            "key_throttles": key.throttles
+        })
+
+    def available(self) -> bool:
+        """
+        True if some key is out of quarantine
+        """
+        with self._lock:
+            now = self._clock()
+            return any(key.quarantined_until <= now for key in self._keys)
+
+    def refresh(self) -> None:
+        """
+        Re-reads the secret, e.g. after the API rejected a rotated key
+        """
+        self.provider.get(force_refresh=True)
+        self._load()
+
+    def key_stats(self) -> Dict[str, Dict]:
+        """
+        Per-key usage and throttle counters, keyed by key name
+        """
+        with self._lock:
+            now = self._clock()
+            return {
+                key.name: {
+                    "requests": key.requests,
+                    "throttles": key.throttles,
+                    "in_flight": key.in_flight,
+                    "quarantined_for": round(max(key.quarantined_until - now, 0.0), 3)
+                }
+                for key in self._keys
+            }
@@ -0,0 +1,193 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set, Tuple
+import threading
+import time
+
+from aws_lambda_powertools import Logger
+
+logger = Logger(child=True)
+
+HASH_BITS = 64
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def band_widths(bands: int, bits: int = HASH_BITS) -> List[int]:
+    """
+    Splits `bits` into `bands` near-equal widths
+    """
+    return [bits // bands + (1 if i < bits % bands else 0) for i in range(bands)]
+
+
+def split_bands(value: int, widths: List[int]) -> List[int]:
+    bands, shift = [], 0
+    for width in widths:
+        bands.append(value >> shift & ((1 << width) - 1))
+        shift += width
+    return bands
+
+
+class NearDuplicateMatch:
+
+    def __init__(self, digest: str, distance: int, size: Tuple[int, int]):
+        self.digest = digest
+        self.distance = distance
+        self.size = size
+
+
+class NearDuplicateIndex:
+    """
+    Hamming-distance index of perceptual hashes, mapping each to the content
+    hash of the image whose verdict is stored in the VerdictCache.
+
+    Uses multi-index hashing: hashes are split into max_distance + 1 bands,
+    and by the pigeonhole principle any hash within max_distance bits of a
+    query equals it exactly on at least one band. A lookup therefore only
+    compares the query against entries sharing one of its band values.
+
+    Like VerdictCache there are two tiers: an in-process index bounded to
+    `max_entries` images, and the shared DynamoDB results table, where each
+    image is stored once per band under pk="PHASH#<band>#<value>" and expires
+    through the expires_at TTL attribute. Band values are skewed in practice
+    (flat regions hash to zero bits), so a lookup reads at most
+    `max_band_reads` items from each band partition.
+    """
+
+    def __init__(self, table=None, max_distance: int = 3, max_entries: int = 10000,
+                 ttl_seconds: int = 7 * 24 * 3600, max_band_reads: int = 100):
+        if not 0 <= max_distance < HASH_BITS:
+            raise ValueError(f"max_distance must be between 0 and {HASH_BITS - 1}")
+        self.table = table
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_band_reads = max_band_reads
+        self.widths = band_widths(max_distance + 1)
+        self._entries: "OrderedDict[str, Tuple[int, Tuple[int, int], float]]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, int], Set[str]] = {}
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "table_hits": 0, "misses": 0, "truncated_bands": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def _band_key(band: int, band_value: int) -> str:
+        return f"PHASH#{band}#{band_value:x}"
+
+    def lookup(self, value: int) -> Optional[NearDuplicateMatch]:
+        """
+        Returns the closest indexed image within max_distance bits, or None
+        """
+        match = self._lookup_memory(value)
+        if match is not None:
+            with self._lock:
+                self.stats["memory_hits"] += 1
+            return match
+
+        if self.table is not None:
+            try:
+                match = self._lookup_table(value)
+            except Exception as e:
+                # An unavailable table only means a missed near-duplicate
+                logger.warning(f"Near-duplicate table lookup failed: {str(e)}")
+                match = None
+            if match is not None:
+                with self._lock:
+                    self.stats["table_hits"] += 1
+                return match
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def _lookup_memory(self, value: int) -> Optional[NearDuplicateMatch]:
+        now = time.time()
+        best = None
+        with self._lock:
+            for band, band_value in enumerate(split_bands(value, self.widths)):
+                for digest in self._buckets.get((band, band_value), ()):
+                    indexed_value, size, expires_at = self._entries[digest]
+                    distance = hamming_distance(value, indexed_value)
+                    if distance <= self.max_distance and expires_at > now and (best is None or distance < best.distance):
+                        best = NearDuplicateMatch(digest, distance, size)
+            if best is not None:
+                self._entries.move_to_end(best.digest)
+        return best
+
+    def _lookup_table(self, value: int) -> Optional[NearDuplicateMatch]:
+        now = time.time()
+        best = None
+        for band, band_value in enumerate(split_bands(value, self.widths)):
+            for item in self._query(self._band_key(band, band_value)):
+                # TTL deletion is lazy, so expired items can still be returned
+                if int(item.get("expires_at", 0)) <= now:
+                    continue
+                indexed_value = int(item["phash"], 16)
+                distance = hamming_distance(value, indexed_value)
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    size = (int(item["width"]), int(item["height"]))
+                    best = (distance, item["digest"], indexed_value, size, float(item["expires_at"]))
+            if best is not None and best[0] == 0:
+                break
+        if best is None:
+            return None
+
+        distance, digest, indexed_value, size, expires_at = best
+        self._remember(digest, indexed_value, size, expires_at)
+        return NearDuplicateMatch(digest, distance, size)
+
+    def _query(self, band_key: str):
+        remaining = self.max_band_reads
+        kwargs = {"KeyConditionExpression": "pk = :pk", "ExpressionAttributeValues": {":pk": band_key}}
+        while remaining > 0:
+            page = self.table.query(Limit=remaining, **kwargs)
+            items = page.get("Items", [])
+            yield from items
+            remaining -= len(items)
+            if "LastEvaluatedKey" not in page:
+                return
+            kwargs["ExclusiveStartKey"] = page["LastEvaluatedKey"]
+        # A crowded band may hide a closer match; other bands still cover it
+        with self._lock:
+            self.stats["truncated_bands"] += 1
+
+    def add(self, value: int, digest: str, size: Tuple[int, int]) -> None:
+        expires_at = int(time.time()) + self.ttl_seconds
+        self._remember(digest, value, size, float(expires_at))
+        if self.table is not None:
+            for band, band_value in enumerate(split_bands(value, self.widths)):
+                self.table.put_item(Item={
+                    "pk": self._band_key(band, band_value),
+                    "sk": f"{value:016x}#{digest}",
+                    "phash": f"{value:016x}",
+                    "digest": digest,
+                    "width": size[0],
+                    "height": size[1],
+                    "expires_at": expires_at,
+                })
+
+    def _remember(self, digest: str, value: int, size: Tuple[int, int], expires_at: float) -> None:
+        with self._lock:
+            if digest in self._entries:
+                self._forget(digest)
+            self._entries[digest] = (value, size, expires_at)
+            for band, band_value in enumerate(split_bands(value, self.widths)):
+                self._buckets.setdefault((band, band_value), set()).add(digest)
+            while len(self._entries) > self.max_entries:
+                self._forget(next(iter(self._entries)))
+
+    def _forget(self, digest: str) -> None:
+        value, _, _ = self._entries.pop(digest)
+        for band, band_value in enumerate(split_bands(value, self.widths)):
+            bucket = self._buckets[(band, band_value)]
+            bucket.discard(digest)
+            if not bucket:
+                del self._buckets[(band, band_value)]
+
+    def hit_ratio(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["table_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
@@ -0,0 +1,243 @@
+from typing import Iterable, Optional
+import base64
+import binascii
+import re
+import struct
+
+from image_processing import sniff_format
+
+# Header bytes decoded on the first pass; JPEG metadata segments can push
+# the frame header further out, so the prefix grows up to MAX_HEADER_BYTES
+INITIAL_HEADER_BYTES = 4 * 1024
+MAX_HEADER_BYTES = 256 * 1024
+
+# PNG chunks walked when checking for the end chunk; images split into
+# more are left to the decoder
+MAX_PNG_CHUNKS = 10_000
+
+WHITESPACE = re.compile(r"\s")
+
+
+class PreflightError(Exception):
+    """
+    Raised when an upload fails validation; carries the HTTP status to return
+    """
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class NeedMoreData(Exception):
+    pass
+
+
+class PreflightLimits:
+
+    def __init__(self, max_bytes: int = 8 * 1024 * 1024, max_pixels: int = 50_000_000,
+                 allowed_formats: Iterable[str] = ("jpeg", "png", "webp", "gif", "bmp")):
+        self.max_bytes = max_bytes
+        self.max_pixels = max_pixels
+        self.allowed_formats = set(allowed_formats)
+
+
+class ImageHeader:
+
+    def __init__(self, image_format: str, width: int, height: int, byte_size: int):
+        self.format = image_format
+        self.width = width
+        self.height = height
+        self.byte_size = byte_size
+
+
+def compact_base64(encoded: str) -> str:
+    """
+    Returns `encoded` without the line breaks and spaces that base64
+    encoders may wrap it with, which b64decode would skip
+    """
+    if WHITESPACE.search(encoded) is None:
+        return encoded
+    return "".join(encoded.split())
+
+
+def base64_decoded_size(encoded: str) -> int:
+    """
+    Returns the decoded length of a base64 string without decoding it
+    """
+    encoded = compact_base64(encoded)
+    padding = len(encoded) - len(encoded.rstrip("="))
+    return len(encoded) * 3 // 4 - padding
+
+
+def _decode_range(encoded: str, start_byte: int, end_byte: int) -> bytes:
+    # base64 works in 4-character groups of 3 bytes, so align to group boundaries
+    start_group = start_byte // 3
+    end_group = -(-end_byte // 3)
+    chunk = encoded[start_group * 4:end_group * 4]
+    decoded = base64.b64decode(chunk, validate=True)
+    offset = start_byte - start_group * 3
+    return decoded[offset:offset + end_byte - start_byte]
+
+
+def _u16be(data: bytes, offset: int) -> int:
+    if offset + 2 > len(data):
+        raise NeedMoreData()
+    return struct.unpack_from(">H", data, offset)[0]
+
+
+def _jpeg_dimensions(data: bytes):
+    offset = 2
+    while True:
+        if offset + 4 > len(data):
+            raise NeedMoreData()
+        if data[offset] != 0xFF:
+            raise PreflightError(400, "Corrupt JPEG header")
+        marker = data[offset + 1]
+        if marker == 0xFF:
+            offset += 1
+            continue
+        if marker in (0x01, 0xD8) or 0xD0 <= marker <= 0xD7:
+            offset += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            raise PreflightError(400, "JPEG has no frame header")
+        # SOF0-SOF15 carry the frame size; C4, C8 and CC are other tables
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            return _u16be(data, offset + 7), _u16be(data, offset + 5)
+        offset += 2 + _u16be(data, offset + 2)
+
+
+def _webp_dimensions(data: bytes):
+    if len(data) < 30:
+        raise NeedMoreData()
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        return struct.unpack_from("<H", data, 26)[0] & 0x3FFF, struct.unpack_from("<H", data, 28)[0] & 0x3FFF
+    if chunk == b"VP8L":
+        b0, b1, b2, b3 = data[21:25]
+        return 1 + (b0 | (b1 & 0x3F) << 8), 1 + (b1 >> 6 | b2 << 2 | (b3 & 0x0F) << 10)
+    if chunk == b"VP8X":
+        return 1 + int.from_bytes(data[24:27], "little"), 1 + int.from_bytes(data[27:30], "little")
+    raise PreflightError(400, "Unrecognised WebP chunk")
+
+
+def parse_dimensions(image_format: str, data: bytes):
+    """
+    Returns (width, height) read from the image header in `data`
+    """
+    if image_format == "jpeg":
+        return _jpeg_dimensions(data)
+    if image_format == "png":
+        if len(data) < 24:
+            raise NeedMoreData()
+        if data[12:16] != b"IHDR":
+            raise PreflightError(400, "Corrupt PNG header")
+        return struct.unpack_from(">II", data, 16)
+    if image_format == "gif":
+        if len(data) < 10:
+            raise NeedMoreData()
+        return struct.unpack_from("<HH", data, 6)
+    if image_format == "webp":
+        return _webp_dimensions(data)
+    if image_format == "bmp":
+        if len(data) < 26:
+            raise NeedMoreData()
+        if struct.unpack_from("<I", data, 14)[0] == 12:
+            return struct.unpack_from("<HH", data, 18)
+        width, height = struct.unpack_from("<ii", data, 18)
+        return width, abs(height)
+    raise PreflightError(415, f"Unsupported image format: {image_format}")
+
+
+def _declared_size(image_format: str, header: bytes) -> Optional[int]:
+    if image_format == "webp":
+        return struct.unpack_from("<I", header, 4)[0] + 8
+    if image_format == "bmp":
+        return struct.unpack_from("<I", header, 2)[0]
+    return None
+
+
+def _png_complete(read_range, byte_size: int) -> bool:
+    # Walks the chunk lengths, reading 8 bytes per chunk, so a cut-off
+    # image is caught without decoding it; data after IEND is allowed
+    offset = 8
+    for _ in range(MAX_PNG_CHUNKS):
+        if offset + 8 > byte_size:
+            return False
+        length, kind = struct.unpack(">I4s", read_range(offset, offset + 8))
+        if kind == b"IEND":
+            return True
+        offset += 12 + length
+    return True
+
+
+def _looks_complete(image_format: str, read_range, byte_size: int) -> bool:
+    if image_format == "png":
+        return _png_complete(read_range, byte_size)
+    if image_format == "gif":
+        return read_range(max(byte_size - 64, 0), byte_size).rstrip(b"\x00").endswith(b"\x3b")
+    # JPEG end markers are not checked: cameras append trailers after
+    # them and embedded thumbnails carry their own, so neither their
+    # absence at the end nor their presence proves anything
+    return True
+
+
+def _check(read_range, byte_size: int, limits: PreflightLimits) -> ImageHeader:
+    def header_reader(size):
+        return read_range(0, min(size, byte_size))
+
+    if byte_size > limits.max_bytes:
+        raise PreflightError(413, f"Image is {byte_size} bytes; the limit is {limits.max_bytes}")
+
+    header = header_reader(INITIAL_HEADER_BYTES)
+    image_format = sniff_format(header)
+    if image_format is None:
+        raise PreflightError(415, "Not a recognised image format")
+    if image_format not in limits.allowed_formats:
+        raise PreflightError(415, f"Unsupported image format: {image_format}")
+
+    size = INITIAL_HEADER_BYTES
+    while True:
+        try:
+            width, height = parse_dimensions(image_format, header)
+            break
+        except NeedMoreData:
+            if size >= MAX_HEADER_BYTES or len(header) >= byte_size:
+                raise PreflightError(400, "Image header is truncated")
+            size *= 4
+            header = header_reader(size)
+
+    if width <= 0 or height <= 0:
+        raise PreflightError(400, "Image has no pixels")
+    if width * height > limits.max_pixels:
+        raise PreflightError(413, f"Image is {width}x{height}; the limit is {limits.max_pixels} pixels")
+
+    declared = _declared_size(image_format, header)
+    if (declared is not None and declared > byte_size) or not _looks_complete(image_format, read_range, byte_size):
+        raise PreflightError(400, "Image data is truncated")
+
+    return ImageHeader(image_format, width, height, byte_size)
+
+
+def preflight_base64(encoded: str, limits: PreflightLimits) -> ImageHeader:
+    """
+    Validates a base64 image by decoding only the byte ranges the checks read
+    """
+    encoded = compact_base64(encoded)
+    byte_size = base64_decoded_size(encoded)
+    if byte_size <= 0 or len(encoded) % 4:
+        raise PreflightError(400, "Image is not valid base64")
+    try:
+        return _check(lambda start, end: _decode_range(encoded, start, end), byte_size, limits)
+    except (binascii.Error, ValueError):
+        raise PreflightError(400, "Image is not valid base64")
+
+
+def preflight_bytes(data: bytes, limits: PreflightLimits) -> ImageHeader:
+    """
+    Validates raw image bytes with the same header checks
+    """
+    if not data:
+        raise PreflightError(400, "No image provided")
+    return _check(lambda start, end: data[start:end], len(data), limits)
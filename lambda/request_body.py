@@ -0,0 +1,70 @@
+from typing import Dict, Optional, Tuple
+
+
+class MultipartFile:
+
+    def __init__(self, name: str, filename: Optional[str], content_type: Optional[str], data: bytes):
+        self.name = name
+        self.filename = filename
+        self.content_type = content_type
+        self.data = data
+
+
+def parse_content_type(value: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """
+    Splits e.g. 'multipart/form-data; boundary=x' into the lower-cased
+    media type and its parameters
+    """
+    if not value:
+        return "", {}
+    media_type, *params = value.split(";")
+    parsed = {}
+    for param in params:
+        key, _, param_value = param.strip().partition("=")
+        if key:
+            parsed[key.lower()] = param_value.strip().strip('"')
+    return media_type.strip().lower(), parsed
+
+
+def _part_headers(raw: bytes) -> Dict[str, str]:
+    headers = {}
+    for line in raw.decode("latin-1").split("\r\n"):
+        name, _, value = line.partition(":")
+        if value:
+            headers[name.strip().lower()] = value.strip()
+    return headers
+
+
+def multipart_file(body: bytes, boundary: str, field: str = "image") -> Optional[MultipartFile]:
+    """
+    Returns the `field` part of a multipart/form-data body, or else its
+    first file part. Parts are located by boundary search, so only the
+    returned part's bytes are copied out of the body.
+    """
+    if not boundary:
+        raise ValueError("Multipart body has no boundary")
+    delimiter = b"--" + boundary.encode("latin-1")
+    position = body.find(delimiter)
+    if position < 0:
+        raise ValueError("Multipart boundary not found")
+    fallback = None
+    while True:
+        position += len(delimiter)
+        if body[position:position + 2] == b"--":
+            return fallback
+        headers_end = body.find(b"\r\n\r\n", position)
+        if headers_end < 0:
+            raise ValueError("Multipart part has no header terminator")
+        data_end = body.find(b"\r\n" + delimiter, headers_end + 4)
+        if data_end < 0:
+            raise ValueError("Multipart body is truncated")
+
+        headers = _part_headers(body[position:headers_end].strip(b"\r\n"))
+        _, disposition = parse_content_type(headers.get("content-disposition"))
+        name, filename = disposition.get("name"), disposition.get("filename")
+        if name == field or (fallback is None and filename):
+            part = MultipartFile(name, filename, headers.get("content-type"), body[headers_end + 4:data_end])
+            if name == field:
+                return part
+            fallback = part
+        position = data_end + 2
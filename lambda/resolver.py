@@ -0,0 +1,53 @@
+from typing import Dict
+import threading
+
+from aws_lambda_powertools.event_handler import APIGatewayRestResolver
+
+
+class ThreadLocalRestResolver(APIGatewayRestResolver):
+    """
+    APIGatewayRestResolver that keeps the current event, Lambda context and
+    routing context per thread.
+
+    Powertools stores the event being resolved on the class, which is fine
+    for one invocation per Lambda container but lets concurrent requests in
+    the standalone server (scripts/serve.py) read each other's events.
+    """
+
+    _local = threading.local()
+
+    def resolve(self, event, context) -> Dict:
+        self._local.current_event = self._to_proxy_event(event)
+        self._local.lambda_context = context
+        self._local.context = {}
+        try:
+            return super().resolve(event, context)
+        finally:
+            self._local.current_event = None
+            self._local.lambda_context = None
+
+    @property
+    def current_event(self):
+        return getattr(self._local, "current_event", None)
+
+    @current_event.setter
+    def current_event(self, value):
+        self._local.current_event = value
+
+    @property
+    def lambda_context(self):
+        return getattr(self._local, "lambda_context", None)
+
+    @lambda_context.setter
+    def lambda_context(self, value):
+        self._local.lambda_context = value
+
+    @property
+    def context(self) -> Dict:
+        if not hasattr(self._local, "context"):
+            self._local.context = {}
+        return self._local.context
+
+    @context.setter
+    def context(self, value: Dict):
+        self._local.context = value
@@ -0,0 +1,36 @@
+from aws_lambda_powertools import Logger, Tracer
+
+from jobs import job_id_from_upload_key
+from upload import bucket_name, job_store, record_client_metrics, s3, staged_preflight_limits
+from instrumentation import metrics
+from worker import deadline_from, run_job
+
+logger = Logger(service="ReceiptApp")
+tracer = Tracer(service="ReceiptApp")
+
+
+@logger.inject_lambda_context
+@tracer.capture_lambda_handler
+@metrics.log_metrics
+@record_client_metrics
+def lambda_handler(event, context):
+    """
+    Analyses an image uploaded through a presigned URL, triggered by the
+    EventBridge "Object Created" event for the incoming/ prefix
+    """
+    s3_object = event['detail']['object']
+    s3_key = s3_object['key']
+    job_id = job_id_from_upload_key(s3_key)
+    
+    # Presigned PUTs cannot cap the body size, so oversized objects are
+    # dropped here, before the download; run_job preflights the rest
+    max_bytes = staged_preflight_limits.max_bytes
+    if s3_object.get('size', 0) > max_bytes:
+        logger.warning(f"Rejecting {s3_key}: {s3_object['size']} bytes exceeds {max_bytes}")
+        job_store.fail(job_id, f"Image is {s3_object['size']} bytes; the limit is {max_bytes}")
+        s3.delete_object(Bucket=bucket_name, Key=s3_key)
+        return
+    
+    # Transient detection errors are already retried inside the deadline,
+    # so whatever is left is recorded on the job for the client to see
+    run_job(job_id, s3_key, deadline_from(context), can_retry=False)
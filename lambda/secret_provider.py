@@ -0,0 +1,52 @@
+from typing import Callable, Optional
+import threading
+import time
+
+
+class SecretProvider:
+    """
+    Caches a secret value for the lifetime of the container.
+
+    The value is fetched through `fetch` on first use and re-fetched once
+    `ttl_seconds` have passed, or immediately after `invalidate()` (e.g. when
+    the downstream API rejects the key because it was rotated).
+    """
+
+    def __init__(self, fetch: Callable[[], str], ttl_seconds: float = 300, clock: Callable[[], float] = time.monotonic):
+        self._fetch = fetch
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._value: Optional[str] = None
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+        self.fetch_count = 0
+
+    def get(self, force_refresh: bool = False) -> str:
+        with self._lock:
+            expired = self._clock() - self._fetched_at >= self.ttl_seconds
+            if force_refresh or self._value is None or expired:
+                self._value = self._fetch()
+                self._fetched_at = self._clock()
+                self.fetch_count += 1
+            return self._value
+
+    def invalidate(self) -> None:
+        with self._lock:
+            self._value = None
+
+
+def secrets_manager_fetcher(secret_id: str, client=None) -> Callable[[], str]:
+    """
+    Returns a fetch function reading `secret_id` from Secrets Manager.
+
+    The boto3 client is built on first fetch and reused afterwards; pass
+    `client` to substitute a local stand-in.
+    """
+    if client is None:
+        from clients import LazyClient
+        client = LazyClient('secretsmanager')
+
+    def fetch() -> str:
+        return client.get_secret_value(SecretId=secret_id)['SecretString']
+
+    return fetch
@@ -0,0 +1,45 @@
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+import threading
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key: the first caller runs the
+    function and callers arriving while it runs wait for its result (or
+    exception) instead of repeating the work. Nothing is kept once the call
+    finishes; finished results are the verdict cache's job.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[str, Future] = {}
+        self.stats = {"calls": 0, "shared": 0}
+
+    def do(self, key: str, func: Callable[[], Any], timeout: Optional[float] = None) -> Tuple[Any, bool]:
+        """
+        Returns (result, shared); `shared` is True when another caller's
+        call produced the result. A waiting caller gives up with
+        TimeoutError after `timeout` seconds.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = Future()
+                self.stats["calls"] += 1
+            else:
+                self.stats["shared"] += 1
+        if not leader:
+            return call.result(timeout=timeout), True
+
+        try:
+            result = func()
+            call.set_result(result)
+            return result, False
+        except BaseException as e:
+            call.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
@@ -1,13 +1,34 @@
 from aws_lambda_powertools import Logger, Tracer
-from aws_lambda_powertools.event_handler import APIGatewayRestResolver, CORSConfig
+from aws_lambda_powertools.event_handler import CORSConfig, Response, content_types
 from aws_lambda_powertools.logging import correlation_paths
-from typing import Dict
-import boto3
+from typing import Dict, Optional, Tuple
 import os
 import base64
-import uuid
 import json
-import requests
+import math
+import re
+import time
+from clients import LazyClient, LazyTable
+from resolver import ThreadLocalRestResolver
+from single_flight import SingleFlight
+from verdict_cache import VerdictCache, content_hash, verdict_etag
+from analysis_records import AnalysisRecorder
+from history import AnalysisHistory, HistoryQueryError, parse_time_ms
+from near_duplicates import NearDuplicateIndex
+from secret_provider import SecretProvider, secrets_manager_fetcher
+from detection_client import DetectionClient, image_payload
+from key_pool import ApiKeyPool
+from detection_backends import DetectionBackend, HedgedDetector, parse_backend_specs
+from instrumentation import CounterDeltas, GroupCounterDeltas, count, metrics, size, stage, timed
+from flow_control import (AdaptiveConcurrencyLimiter, BreakerStateStore, CircuitBreaker, DetectionGuard,
+                          DetectionUnavailableError, TokenBucket)
+from archive import ImageArchiver
+from batch import run_batch, summarize_batch
+from image_processing import difference_hash, file_extension, mime_type, normalize_image, scale_detection_result, sniff_format
+from preflight import (PreflightError, PreflightLimits, base64_decoded_size, compact_base64, preflight_base64,
+                       preflight_bytes)
+from request_body import multipart_file, parse_content_type
+from jobs import JobQueue, JobStore, JOB_STATUS_SUCCEEDED, new_job_id, staged_image_key, upload_key
 
 cors_config = CORSConfig(
     allow_origin="*",
@@ -19,12 +40,195 @@ cors_config = CORSConfig(
 
 logger = Logger(service="ReceiptApp")
 tracer = Tracer(service="ReceiptApp")
-app = APIGatewayRestResolver(cors=cors_config)
+app = ThreadLocalRestResolver(cors=cors_config)
 
-dynamodb = boto3.resource('dynamodb')
-s3 = boto3.client('s3')
+# AWS clients are built on first use to keep them out of the cold start
+s3 = LazyClient('s3')
 bucket_name = os.environ['BUCKET_NAME']
 
+results_table_name = os.environ.get('RESULTS_TABLE_NAME')
+results_table = LazyTable(results_table_name) if results_table_name else None
+verdict_cache = VerdictCache(
+    table=results_table,
+    max_entries=int(os.environ.get('VERDICT_CACHE_MAX_ENTRIES', '1024')),
+    ttl_seconds=int(os.environ.get('VERDICT_CACHE_TTL_SECONDS', '604800'))
+)
+
+# Re-encoded, resized or re-tagged copies of an analysed image are found by
+# perceptual hash; "flag" still calls NVIDIA but reports the match, "reuse"
+# also answers from the match's verdict when the hashes are identical, "off"
+# skips the lookup. A face edited into an analysed photo can hash a few bits
+# away from it, so a verdict is never reused across a non-zero distance.
+NEAR_DUPLICATE_MODE = os.environ.get('NEAR_DUPLICATE_MODE', 'flag')
+near_duplicate_index = NearDuplicateIndex(
+    table=results_table,
+    max_distance=int(os.environ.get('NEAR_DUPLICATE_MAX_DISTANCE', '3')),
+    max_entries=int(os.environ.get('NEAR_DUPLICATE_MAX_ENTRIES', '10000')),
+    ttl_seconds=verdict_cache.ttl_seconds,
+    max_band_reads=int(os.environ.get('NEAR_DUPLICATE_MAX_BAND_READS', '100'))
+)
+
+# API key is fetched once per container and refreshed on TTL expiry or rejection;
+# self-hosted servers without Secrets Manager may pass NVIDIA_API_KEY instead
+api_key_provider = SecretProvider(
+    fetch=timed("SecretFetch", (lambda: os.environ['NVIDIA_API_KEY']) if os.environ.get('NVIDIA_API_KEY')
+                else secrets_manager_fetcher(os.environ.get('API_SECRET_ARN', ''))),
+    ttl_seconds=float(os.environ.get('API_KEY_TTL_SECONDS', '300'))
+)
+
+# Client-side protection for the detection API: a per-container token bucket
+# for the known rate limit, an AIMD cap on in-flight calls, and a circuit
+# breaker whose open state is shared through the results table
+DETECTION_RATE_PER_SECOND = float(os.environ.get('DETECTION_RATE_PER_SECOND', '0'))
+# In-flight detection calls per container; batches set it in Lambda, the standalone server per process
+DETECTION_MAX_CONCURRENCY = int(os.environ.get('DETECTION_MAX_CONCURRENCY', os.environ.get('BATCH_MAX_CONCURRENCY', '8')))
+detection_guard = DetectionGuard(
+    rate_limiter=TokenBucket(
+        rate=DETECTION_RATE_PER_SECOND,
+        burst=float(os.environ.get('DETECTION_RATE_BURST', '5'))
+    ) if DETECTION_RATE_PER_SECOND > 0 else None,
+    concurrency_limiter=AdaptiveConcurrencyLimiter(
+        max_limit=DETECTION_MAX_CONCURRENCY,
+        latency_target=float(os.environ.get('DETECTION_LATENCY_TARGET_SECONDS', '10'))
+    ),
+    circuit_breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5')),
+        cooldown=float(os.environ.get('CIRCUIT_COOLDOWN_SECONDS', '30')),
+        store=BreakerStateStore(results_table) if results_table is not None else None
+    )
+)
+
+def scale_rate_limit(key_count: int) -> None:
+    # DETECTION_RATE_PER_SECOND is the limit of one key
+    if detection_guard.rate_limiter is not None:
+        detection_guard.rate_limiter.rate = DETECTION_RATE_PER_SECOND * key_count
+
+# The secret may hold a JSON list of keys; calls are spread across them and
+# a key answering 429 sits out a quarantine while the others carry the load
+api_key_pool = ApiKeyPool(
+    api_key_provider,
+    quarantine_seconds=float(os.environ.get('API_KEY_QUARANTINE_SECONDS', '5')),
+    on_resize=scale_rate_limit
+)
+
+# Created once per container so warm invocations reuse pooled connections
+detection_client = DetectionClient(
+    api_key_provider=api_key_provider,
+    key_pool=api_key_pool,
+    connect_timeout=float(os.environ.get('DETECTION_CONNECT_TIMEOUT', '3.05')),
+    read_timeout=float(os.environ.get('DETECTION_READ_TIMEOUT', '25')),
+    max_attempts=int(os.environ.get('DETECTION_MAX_ATTEMPTS', '4')),
+    pool_maxsize=DETECTION_MAX_CONCURRENCY + 2,
+    guard=detection_guard
+)
+
+
+def alternate_backend(spec: Dict) -> DetectionBackend:
+    """
+    Builds a hedging target from a DETECTION_BACKENDS entry. Each gets its
+    own circuit breaker and concurrency limit; endpoints using the NVIDIA
+    key also share the primary's key pool and rate limit, which is per key.
+    """
+    guard = DetectionGuard(
+        rate_limiter=detection_guard.rate_limiter if spec["auth"] == "nvidia" else None,
+        concurrency_limiter=AdaptiveConcurrencyLimiter(
+            max_limit=DETECTION_MAX_CONCURRENCY,
+            latency_target=float(os.environ.get('DETECTION_LATENCY_TARGET_SECONDS', '10'))
+        ),
+        circuit_breaker=CircuitBreaker(
+            failure_threshold=int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', '5')),
+            cooldown=float(os.environ.get('CIRCUIT_COOLDOWN_SECONDS', '30')),
+            store=BreakerStateStore(results_table, name=f"detection-{spec['name']}") if results_table is not None else None
+        )
+    )
+    client = DetectionClient(
+        api_key_provider=api_key_provider if spec["auth"] == "nvidia" else SecretProvider(fetch=lambda: ""),
+        invoke_url=spec["url"],
+        connect_timeout=detection_client.connect_timeout,
+        read_timeout=detection_client.read_timeout,
+        max_attempts=detection_client.max_attempts,
+        pool_maxsize=detection_client.pool_maxsize,
+        guard=guard,
+        key_pool=api_key_pool if spec["auth"] == "nvidia" else None
+    )
+    return DetectionBackend(spec["name"], client, schema=spec["schema"])
+
+
+# NVIDIA is the primary backend; calls slower than its observed p95 are hedged to the alternates
+detector = HedgedDetector(
+    [DetectionBackend("nvidia", detection_client)]
+    + [alternate_backend(spec) for spec in parse_backend_specs(os.environ.get('DETECTION_BACKENDS', ''))],
+    hedging=os.environ.get('DETECTION_HEDGING', 'true').lower() == 'true',
+    hedge_quantile=float(os.environ.get('DETECTION_HEDGE_QUANTILE', '0.95')),
+    initial_hedge_delay=float(os.environ.get('DETECTION_HEDGE_INITIAL_DELAY_SECONDS', '3')),
+    min_hedge_delay=float(os.environ.get('DETECTION_HEDGE_MIN_DELAY_SECONDS', '0.05'))
+)
+
+# S3 archive writes run on a bounded pool, overlapping the detection call
+archiver = ImageArchiver(
+    s3_client=s3,
+    bucket_name=bucket_name,
+    mode=os.environ.get('ARCHIVE_MODE', 'durable'),
+    max_workers=int(os.environ.get('ARCHIVE_MAX_WORKERS', '4'))
+)
+
+# Requests for an image already being analysed wait for that analysis
+# instead of calling NVIDIA again (concurrent requests in scripts/serve.py)
+analysis_flights = SingleFlight()
+
+# Every analysis is stored as a compact record and counted into sharded
+# hourly and daily rollups, so /stats reads a few counter items instead of scanning
+analysis_recorder = AnalysisRecorder(
+    table=results_table,
+    record_ttl_seconds=int(os.environ.get('ANALYSIS_RECORD_TTL_SECONDS', str(90 * 24 * 3600))),
+    rollup_shards=int(os.environ.get('ROLLUP_SHARDS', '10'))
+) if results_table is not None else None
+analysis_history = AnalysisHistory(results_table) if results_table is not None else None
+
+job_store = JobStore(results_table) if results_table is not None else None
+job_queue = JobQueue(LazyClient('sqs'), os.environ['JOB_QUEUE_URL']) if os.environ.get('JOB_QUEUE_URL') else None
+
+# Time reserved after the detection call for the S3 write and the response
+DEADLINE_SAFETY_MARGIN_SECONDS = 2.0
+ARCHIVE_WAIT_MARGIN_SECONDS = 0.5
+
+# Longest edge sent to the detection API; 0 forwards images unchanged
+NORMALIZE_MAX_EDGE = int(os.environ.get('NORMALIZE_MAX_EDGE', '1536'))
+NORMALIZE_JPEG_QUALITY = int(os.environ.get('NORMALIZE_JPEG_QUALITY', '85'))
+
+# Cheap header checks that reject bad uploads before any network I/O
+preflight_limits = PreflightLimits(
+    max_bytes=int(os.environ.get('PREFLIGHT_MAX_BYTES', str(8 * 1024 * 1024))),
+    max_pixels=int(os.environ.get('PREFLIGHT_MAX_PIXELS', '50000000')),
+    allowed_formats=os.environ.get('PREFLIGHT_ALLOWED_FORMATS', 'jpeg,png,webp,gif,bmp').split(',')
+)
+
+# Presigned uploads go straight to S3 rather than through the API's payload
+# limit, so full-size phone photos are accepted there; normalization
+# downscales them before detection
+staged_preflight_limits = PreflightLimits(
+    max_bytes=int(os.environ.get('MAX_UPLOAD_BYTES', str(20 * 1024 * 1024))),
+    max_pixels=preflight_limits.max_pixels,
+    allowed_formats=preflight_limits.allowed_formats
+)
+
+PRESIGN_EXPIRY_SECONDS = int(os.environ.get('PRESIGN_EXPIRY_SECONDS', '300'))
+
+# How long browsers and caches may reuse a /results lookup; a re-analysis
+# changes the ETag, so a stale copy is replaced on its next revalidation
+RESULTS_MAX_AGE_SECONDS = int(os.environ.get('RESULTS_MAX_AGE_SECONDS', '3600'))
+SHA256_HEX = re.compile(r'^[0-9a-f]{64}$')
+
+# Hourly rollups expire after 35 days; daily rollups are kept
+STATS_DEFAULT_PERIODS = {"hour": 24, "day": 30}
+STATS_MAX_PERIODS = {"hour": 24 * 35, "day": 366}
+
+HISTORY_DEFAULT_LIMIT = 50
+HISTORY_MAX_LIMIT = 200
+
+BATCH_MAX_ITEMS = int(os.environ.get('BATCH_MAX_ITEMS', '100'))
+BATCH_MAX_CONCURRENCY = int(os.environ.get('BATCH_MAX_CONCURRENCY', '8'))
+
 def build_response(status_code: int, body: Dict) -> Dict:
     logger.info(f"Building response with status code: {status_code}")
     return {
@@ -39,66 +243,592 @@ def build_response(status_code: int, body: Dict) -> Dict:
         }
     }
 
+def error_response(status_code: int, message: str, headers: Optional[Dict] = None) -> Response:
+    """
+    Returns the build_response envelope with a real HTTP status, so clients
+    and API Gateway see the error without parsing the body
+    """
+    return Response(
+        status_code=status_code,
+        content_type=content_types.APPLICATION_JSON,
+        body=json.dumps(build_response(status_code, {"error": message})),
+        headers=headers
+    )
+
+def remaining_time() -> Optional[float]:
+    """
+    Returns the seconds left before the Lambda times out, or None outside Lambda
+    """
+    context = app.lambda_context
+    if context is None:
+        return None
+    return context.get_remaining_time_in_millis() / 1000
+
+def detection_deadline() -> float:
+    """
+    Returns the monotonic deadline for the detection call, derived from the
+    Lambda's remaining execution time
+    """
+    remaining = remaining_time()
+    if remaining is None:
+        return time.monotonic() + detection_client.connect_timeout + detection_client.read_timeout
+    return time.monotonic() + remaining - DEADLINE_SAFETY_MARGIN_SECONDS
+
+class DetectionError(Exception):
+    """
+    Raised when the detection API answers with a non-success status
+    """
+
+    def __init__(self, status_code: int, body: Dict):
+        super().__init__(f"Detection API returned {status_code}")
+        self.status_code = status_code
+        self.body = body
+
+def find_near_duplicate(phash: int, size) -> Optional[Dict]:
+    """
+    Returns the verdict of a previously analysed image within the configured
+    Hamming distance, with its boxes mapped onto this image's dimensions
+    """
+    match = near_duplicate_index.lookup(phash)
+    if match is None:
+        return None
+    verdict, _ = verdict_cache.get(match.digest)
+    logger.info("Near-duplicate lookup", extra={
+        "matched_hash": match.digest,
+        "distance": match.distance,
+        "verdict_found": verdict is not None
+    })
+    if verdict is None:
+        return None
+    
+    # Copied so scaling never touches the cached verdict
+    verdict = json.loads(json.dumps(verdict))
+    scale_detection_result(verdict, (size[0] / match.size[0], size[1] / match.size[1]))
+    return {
+        "verdict": verdict,
+        "image_hash": match.digest,
+        "distance": match.distance
+    }
+
+@tracer.capture_method
+def analyze_image(image_data: bytes, deadline: float, base64_image: Optional[str] = None) -> Dict:
+    """
+    Runs the cache lookup, archive write and detection call for one image
+    and returns the result fields shared by the single and batch routes
+    """
+    started = time.monotonic()
+    image_hash = content_hash(image_data)
+    result, shared = analysis_flights.do(
+        image_hash,
+        lambda: run_analysis(image_data, deadline, base64_image, image_hash),
+        timeout=max(deadline + DEADLINE_SAFETY_MARGIN_SECONDS - time.monotonic(), 0)
+    )
+    if shared:
+        # Answered by an identical in-flight request, so no detection call was made here
+        count("SingleFlightShared")
+        result = {**result, "cache_hit": True}
+    
+    # Stats are secondary, so the record is written off the response path
+    # and a failed write never fails the analysis
+    if analysis_recorder is not None:
+        analysis_recorder.submit(
+            result["image_hash"],
+            result["detection_result"],
+            latency_ms=(time.monotonic() - started) * 1000,
+            size_bytes=len(image_data),
+            cache_hit=result["cache_hit"]
+        )
+    return result
+
+def run_analysis(image_data: bytes, deadline: float, base64_image: Optional[str] = None,
+                 image_hash: Optional[str] = None) -> Dict:
+    image_hash = image_hash or content_hash(image_data)
+    
+    size("ImageBytes", len(image_data))
+    
+    # Identical images skip Secrets Manager, NVIDIA and S3 entirely
+    with stage("CacheLookup"):
+        cached_result, cache_tier = verdict_cache.get(image_hash)
+    count({"memory": "CacheMemoryHit", "table": "CacheTableHit"}.get(cache_tier, "CacheMiss"))
+    logger.info("Verdict cache lookup", extra={
+        "image_hash": image_hash,
+        "cache_tier": cache_tier,
+        "cache_stats": verdict_cache.stats
+    })
+    if cached_result is not None:
+        return {
+            "detection_result": cached_result,
+            "cache_hit": True,
+            "image_hash": image_hash
+        }
+    
+    near_duplicate = None
+    with stage("NearDuplicateLookup"):
+        fingerprint = difference_hash(image_data) if NEAR_DUPLICATE_MODE != 'off' else None
+        if fingerprint is not None:
+            near_duplicate = find_near_duplicate(*fingerprint)
+    if near_duplicate is not None:
+        count("NearDuplicateHit")
+        if NEAR_DUPLICATE_MODE == 'reuse' and near_duplicate["distance"] == 0:
+            verdict = near_duplicate.pop("verdict")
+            return {
+                "detection_result": verdict,
+                "cache_hit": True,
+                "image_hash": image_hash,
+                "near_duplicate": near_duplicate
+            }
+    
+    # Start the archive write first so it runs alongside the detection call;
+    # the archive keeps the original bytes under their real format
+    image_format = sniff_format(image_data)
+    archive_future = archiver.submit(image_data, content_type=mime_type(image_format),
+                                     extension=file_extension(image_format), digest=image_hash)
+    
+    # Downscale and re-encode before upload so the detection API gets fewer bytes
+    with stage("Normalize"):
+        normalized = normalize_image(image_data, max_edge=NORMALIZE_MAX_EDGE, jpeg_quality=NORMALIZE_JPEG_QUALITY)
+        if normalized.data is not image_data or base64_image is None:
+            base64_image = base64.b64encode(normalized.data)
+    size("PayloadBytes", len(base64_image))
+    logger.info("Image normalized", extra={
+        "image_format": image_format,
+        "original_bytes": len(image_data),
+        "normalized_bytes": len(normalized.data),
+        "original_size": normalized.original_size,
+        "normalized_size": normalized.size
+    })
+    
+    # Call NVIDIA deepfake detection API
+    payload = image_payload(normalized.mime_type if normalized.format else 'image/png', base64_image)
+    
+    with stage("Detection"):
+        response = detector.detect(payload, deadline=deadline)
+        api_response = response.json()
+    
+    # Remove the image key from response if it exists
+    if 'image' in api_response:
+        del api_response['image']
+    
+    # Bounding boxes are reported on the normalized image
+    scale_detection_result(api_response, normalized.scale)
+    
+    logger.info(f"NVIDIA API Response: {api_response}")
+    
+    # A failed archive write is logged but never fails the analysis
+    archive_timeout = deadline + DEADLINE_SAFETY_MARGIN_SECONDS - ARCHIVE_WAIT_MARGIN_SECONDS - time.monotonic()
+    with stage("ArchiveWait"):
+        archiver.wait(archive_future, timeout=max(archive_timeout, 0))
+    
+    # Only successful analyses are cached; error payloads must be retried
+    if not response.ok:
+        raise DetectionError(response.status_code, api_response)
+    # The detection call has already been paid for, so a failed cache write
+    # is logged and the verdict still returned
+    try:
+        verdict_cache.put(image_hash, api_response)
+        if fingerprint is not None:
+            near_duplicate_index.add(fingerprint[0], image_hash, fingerprint[1])
+    except Exception as e:
+        logger.warning(f"Failed to cache verdict: {str(e)}")
+    
+    result = {
+        "detection_result": api_response,
+        "cache_hit": False,
+        "image_hash": image_hash
+    }
+    if near_duplicate is not None:
+        near_duplicate.pop("verdict")
+        result["near_duplicate"] = near_duplicate
+    return result
+
+def binary_body() -> Optional[str]:
+    """
+    Returns the request body as API Gateway delivers binary media types:
+    base64, which is also the form the detection payload needs
+    """
+    event = app.current_event
+    if not event.body:
+        return None
+    if not event.is_base64_encoded:
+        raise PreflightError(415, "Binary uploads need their Content-Type listed as an API binary media type")
+    return event.body
+
+def read_upload() -> Tuple[Optional[bytes], Optional[str]]:
+    """
+    Returns the uploaded image (None if the request has none) and, when the
+    request carried exactly these bytes as base64, that string so the
+    detection payload can reuse it.
+
+    Accepts a raw image/* body, multipart/form-data with an `image` file
+    field, or the JSON {"image": "<base64>"} body.
+    """
+    media_type, params = parse_content_type(app.current_event.headers.get("Content-Type"))
+
+    if media_type.startswith("image/"):
+        base64_image = binary_body()
+        if base64_image is None:
+            return None, None
+        with stage("Preflight"):
+            preflight_base64(base64_image, preflight_limits)
+        with stage("Decode"):
+            return base64.b64decode(base64_image), base64_image
+
+    if media_type == "multipart/form-data":
+        encoded = binary_body()
+        if encoded is None:
+            return None, None
+        # Form overhead is small, so a body this large cannot hold an allowed image
+        if base64_decoded_size(encoded) > preflight_limits.max_bytes + 64 * 1024:
+            raise PreflightError(413, "Image exceeds the size limit")
+        with stage("Decode"):
+            try:
+                part = multipart_file(base64.b64decode(encoded), params.get("boundary"))
+            except ValueError as e:
+                raise PreflightError(400, f"Malformed multipart body: {e}")
+        if part is None:
+            return None, None
+        with stage("Preflight"):
+            preflight_bytes(part.data, preflight_limits)
+        return part.data, None
+
+    body = app.current_event.json_body or {}
+    base64_image = body.get('image')
+    if not base64_image:
+        return None, None
+    # Reused in the detection request, so line-wrapped base64 is joined first
+    base64_image = compact_base64(base64_image)
+    with stage("Preflight"):
+        preflight_base64(base64_image, preflight_limits)
+    with stage("Decode"):
+        return base64.b64decode(base64_image), base64_image
+
 @app.post("/upload")
 @tracer.capture_method
 def upload_file():
     try:
+        image_data, base64_image = read_upload()
+        if image_data is None:
+            return build_response(400, {"error": "No image provided"})
+        
+        result = analyze_image(image_data, detection_deadline(), base64_image)
+        
+        return build_response(200, {
+            "message": "Analysis complete",
+            **result
+        })
+        
+    except PreflightError as e:
+        logger.warning(f"Upload rejected by preflight: {e.message}")
+        return error_response(e.status_code, e.message)
+    except DetectionUnavailableError as e:
+        # Fail fast so callers back off instead of holding Lambda concurrency
+        logger.warning(f"Detection unavailable: {e.reason}")
+        return error_response(503, "Detection service is temporarily unavailable",
+                              headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))})
+    except Exception as e:
+        logger.error(f"Analysis failed: {str(e)}")
+        return build_response(500, {"error": "Analysis failed"})
+
+def load_batch_image(item: Dict) -> bytes:
+    """
+    Returns the bytes of a batch item given inline as base64 or as an S3 key
+    """
+    if item.get('image'):
+        with stage("Preflight"):
+            preflight_base64(item['image'], preflight_limits)
+        with stage("Decode"):
+            return base64.b64decode(item['image'])
+    if item.get('s3_key'):
+        with stage("S3Read"):
+            image_data = s3.get_object(Bucket=bucket_name, Key=item['s3_key'])['Body'].read()
+        with stage("Preflight"):
+            preflight_bytes(image_data, preflight_limits)
+        return image_data
+    raise ValueError("Item needs an 'image' or 's3_key'")
+
+@app.post("/upload/batch")
+@tracer.capture_method
+def upload_batch():
+    try:
+        body = app.current_event.json_body or {}
+        items = body.get('images')
+        
+        if not items or not isinstance(items, list):
+            return error_response(400, "No images provided")
+        if len(items) > BATCH_MAX_ITEMS:
+            return error_response(400, f"Batch is limited to {BATCH_MAX_ITEMS} images")
+        try:
+            concurrency = int(body.get('concurrency', BATCH_MAX_CONCURRENCY))
+        except (TypeError, ValueError):
+            return error_response(400, "concurrency must be an integer")
+        if concurrency < 1:
+            return error_response(400, "concurrency must be at least 1")
+        
+        deadline = detection_deadline()
+        results = run_batch(
+            items,
+            load=load_batch_image,
+            analyze=lambda image_data: analyze_image(image_data, deadline),
+            max_concurrency=min(concurrency, BATCH_MAX_CONCURRENCY),
+            deadline=deadline
+        )
+        
+        return build_response(200, {
+            "message": "Batch analysis complete",
+            "results": results,
+            "summary": summarize_batch(results)
+        })
+        
+    except Exception as e:
+        logger.error(f"Batch analysis failed: {str(e)}")
+        return error_response(500, "Batch analysis failed")
+
+@app.post("/upload/presign")
+@tracer.capture_method
+def presign_upload():
+    try:
+        if job_store is None:
+            return error_response(503, "Async jobs are not configured")
+        
+        body = app.current_event.json_body or {}
+        content_type = body.get('content_type', 'image/jpeg')
+        
+        if not content_type.startswith('image/'):
+            return error_response(400, "Only image uploads are supported")
+        
+        # The client PUTs straight into the bucket; the S3 analysis Lambda
+        # picks the object up, so the image never passes through API Gateway
+        job_id = new_job_id()
+        s3_key = upload_key(job_id)
+        upload_url = s3.generate_presigned_url(
+            'put_object',
+            Params={'Bucket': bucket_name, 'Key': s3_key, 'ContentType': content_type},
+            ExpiresIn=PRESIGN_EXPIRY_SECONDS
+        )
+        job_store.create(job_id)
+        
+        return build_response(200, {
+            "job_id": job_id,
+            "upload_url": upload_url,
+            "headers": {"Content-Type": content_type},
+            "expires_in": PRESIGN_EXPIRY_SECONDS
+        })
+        
+    except Exception as e:
+        logger.error(f"Presign failed: {str(e)}")
+        return error_response(500, "Presign failed")
+
+@app.post("/jobs")
+@tracer.capture_method
+def submit_job():
+    try:
+        if job_store is None or job_queue is None:
+            return error_response(503, "Async jobs are not configured")
+        
         body = app.current_event.json_body
         base64_image = body.get('image')
         
         if not base64_image:
-            return build_response(400, {"error": "No image provided"})
+            return error_response(400, "No image provided")
         
-        # Get API key from Secrets Manager
-        secrets_client = boto3.client('secretsmanager')
-        secret_value = secrets_client.get_secret_value(SecretId=os.environ['API_SECRET_ARN'])
-        api_key = secret_value['SecretString']
+        preflight_base64(base64_image, preflight_limits)
+        image_data = base64.b64decode(base64_image)
+        job_id = new_job_id()
         
-        # Call NVIDIA deepfake detection API
-        invoke_url = "https://ai.api.nvidia.com/v1/cv/hive/deepfake-image-detection"
+        # Already-analysed images complete without touching the queue
+        cached_result, _ = verdict_cache.get(content_hash(image_data))
+        if cached_result is not None:
+            job_store.create(job_id, status=JOB_STATUS_SUCCEEDED, result={
+                "detection_result": cached_result,
+                "cache_hit": True,
+                "image_hash": content_hash(image_data)
+            })
+        else:
+            s3_key = staged_image_key(job_id)
+            s3.put_object(Bucket=bucket_name, Key=s3_key, Body=image_data)
+            job_store.create(job_id)
+            job_queue.send(job_id, s3_key)
         
-        payload = {
-            "input": [f"data:image/png;base64,{base64_image}"]
-        }
+        return Response(
+            status_code=202,
+            content_type=content_types.APPLICATION_JSON,
+            body=json.dumps(build_response(202, {
+                "message": "Analysis queued",
+                "job_id": job_id
+            }))
+        )
+        
+    except PreflightError as e:
+        logger.warning(f"Job rejected by preflight: {e.message}")
+        return error_response(e.status_code, e.message)
+    except Exception as e:
+        logger.error(f"Job submission failed: {str(e)}")
+        return error_response(500, "Job submission failed")
+
+@app.get("/jobs/<job_id>")
+@tracer.capture_method
+def get_job(job_id: str):
+    try:
+        if job_store is None:
+            return error_response(503, "Async jobs are not configured")
+        
+        job = job_store.get(job_id)
+        if job is None:
+            return error_response(404, "Job not found")
+        
+        return build_response(200, job)
+        
+    except Exception as e:
+        logger.error(f"Job lookup failed: {str(e)}")
+        return error_response(500, "Job lookup failed")
+
+@app.get("/results/<image_hash>")
+@tracer.capture_method
+def get_result(image_hash: str):
+    """
+    Returns the stored verdict for a SHA-256 content hash, so clients can
+    hash an image locally and only upload it on a miss
+    """
+    try:
+        image_hash = image_hash.lower()
+        if not SHA256_HEX.match(image_hash):
+            return error_response(400, "image_hash must be a hex SHA-256 digest")
+        
+        verdict, _ = verdict_cache.get(image_hash)
+        if verdict is None:
+            count("ResultLookupMiss")
+            # Not cached, so the upload that follows is visible on the next lookup
+            return error_response(404, "Result not found", headers={"Cache-Control": "no-store"})
+        count("ResultLookupHit")
         
         headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {api_key}",
-            "Accept": "application/json"
+            "ETag": verdict_etag(verdict),
+            "Cache-Control": f"public, max-age={RESULTS_MAX_AGE_SECONDS}"
         }
+        if_none_match = app.current_event.headers.get("If-None-Match") or ""
+        if headers["ETag"] in (tag.strip() for tag in if_none_match.split(",")):
+            return Response(status_code=304, body="", headers=headers)
+        return Response(
+            status_code=200,
+            content_type=content_types.APPLICATION_JSON,
+            body=json.dumps(build_response(200, {
+                "detection_result": verdict,
+                "cache_hit": True,
+                "image_hash": image_hash
+            })),
+            headers=headers
+        )
         
-        response = requests.post(invoke_url, headers=headers, json=payload, timeout=30)
-        api_response = response.json()
+    except Exception as e:
+        logger.error(f"Result lookup failed: {str(e)}")
+        return build_response(500, {"error": "Result lookup failed"})
+
+@app.get("/stats")
+@tracer.capture_method
+def get_stats():
+    try:
+        if analysis_recorder is None:
+            return error_response(503, "Analysis stats are not configured")
         
-        # Remove the image key from response if it exists
-        if 'image' in api_response:
-            del api_response['image']
+        params = app.current_event.query_string_parameters or {}
+        granularity = params.get('granularity', 'hour')
+        if granularity not in STATS_MAX_PERIODS:
+            return error_response(400, "granularity must be 'hour' or 'day'")
+        try:
+            periods = int(params.get('periods', STATS_DEFAULT_PERIODS[granularity]))
+        except ValueError:
+            return error_response(400, "periods must be an integer")
+        if not 1 <= periods <= STATS_MAX_PERIODS[granularity]:
+            return error_response(400, f"periods must be between 1 and {STATS_MAX_PERIODS[granularity]}")
         
-        logger.info(f"NVIDIA API Response: {api_response}")
+        return build_response(200, analysis_recorder.stats(granularity, periods))
         
-        # Save image to S3
-        image_data = base64.b64decode(base64_image)
-        file_key = f"raw/{uuid.uuid4()}.jpg"
+    except Exception as e:
+        logger.error(f"Stats lookup failed: {str(e)}")
+        return error_response(500, "Stats lookup failed")
+
+@app.get("/history")
+@tracer.capture_method
+def get_history():
+    try:
+        if analysis_history is None:
+            return error_response(503, "Analysis history is not configured")
         
-        s3.put_object(
-            Bucket=bucket_name,
-            Key=file_key,
-            Body=image_data,
-            ContentType='image/jpeg'
-        )
+        params = app.current_event.query_string_parameters or {}
+        limit = int(params.get('limit', HISTORY_DEFAULT_LIMIT))
+        if not 1 <= limit <= HISTORY_MAX_LIMIT:
+            return error_response(400, f"limit must be between 1 and {HISTORY_MAX_LIMIT}")
         
-        return build_response(200, {
-            "message": "Analysis complete",
-            "detection_result": api_response
-        })
+        page = analysis_history.query(
+            verdict=params.get('verdict'),
+            min_confidence=float(params['min_confidence']) if 'min_confidence' in params else None,
+            max_confidence=float(params['max_confidence']) if 'max_confidence' in params else None,
+            start_ms=parse_time_ms(params['start']) if 'start' in params else None,
+            end_ms=parse_time_ms(params['end']) if 'end' in params else None,
+            limit=limit,
+            cursor=params.get('cursor'),
+            fields=params['fields'].split(',') if params.get('fields') else None
+        )
+        return build_response(200, page)
         
+    except HistoryQueryError as e:
+        return error_response(400, str(e))
+    except ValueError:
+        return error_response(400, "limit, min_confidence and max_confidence must be numbers")
     except Exception as e:
-        logger.error(f"Analysis failed: {str(e)}")
-        return build_response(500, {"error": "Analysis failed"})
+        logger.error(f"History lookup failed: {str(e)}")
+        return error_response(500, "History lookup failed")
+
+    
+# Counters the detection client, guard and hedging move, recorded once per invocation
+client_counters = CounterDeltas([
+    (lambda: detection_client.stats, {
+        "attempts": "DetectionAttempts",
+        "retries": "DetectionRetries",
+        "key_refreshes": "ApiKeyRefreshes"
+    }),
+    (lambda: detection_guard.circuit_breaker.stats, {
+        "rejected": "DetectionRejected",
+        "opened": "CircuitOpened",
+        "throttled": "DetectionThrottled"
+    }),
+    (lambda: api_key_pool.stats, {
+        "throttles": "ApiKeyThrottles",
+        "exhausted": "ApiKeyPoolExhausted"
+    }),
+    (lambda: detector.stats, {
+        "requests": "DetectionRequests",
+        "hedged": "DetectionHedged",
+        "hedge_wins": "HedgeWins"
+    })
+])
+
+# The same counters per API key, with an ApiKey dimension, so a key that
+# is throttled far more often than the others shows up on the dashboard
+key_counters = GroupCounterDeltas(lambda: api_key_pool.key_stats(), {
+    "requests": "ApiKeyRequests",
+    "throttles": "ApiKeyThrottles"
+}, dimension="ApiKey")
+
+def record_client_metrics(handler):
+    """
+    Records the detection client, guard, hedging and per-key counters an invocation moved
+    """
+    def wrapper(event, context):
+        client_counters.start()
+        key_counters.start()
+        try:
+            return handler(event, context)
+        finally:
+            client_counters.finish()
+            key_counters.finish()
+    return wrapper
 
     
 @logger.inject_lambda_context(correlation_id_path=correlation_paths.API_GATEWAY_REST)
 @tracer.capture_lambda_handler
+@metrics.log_metrics
+@record_client_metrics
 def lambda_handler(event, context):
     logger.info("Lambda handler started")
     return app.resolve(event, context)
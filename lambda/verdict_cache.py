@@ -0,0 +1,107 @@
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+import hashlib
+import json
+import threading
+import time
+
+from aws_lambda_powertools import Logger
+
+logger = Logger(child=True)
+
+
+def content_hash(image_data: bytes) -> str:
+    """
+    Returns the SHA-256 hex digest used as the cache key for an image
+    """
+    return hashlib.sha256(image_data).hexdigest()
+
+
+def verdict_etag(verdict: Dict) -> str:
+    """
+    Returns a strong ETag for a verdict. It is derived from the verdict's
+    content, so every container agrees on it and it changes when the image
+    is re-analysed.
+    """
+    canonical = json.dumps(verdict, sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha256(canonical.encode()).hexdigest()[:32] + '"'
+
+
+class VerdictCache:
+    """
+    Two-tier cache of detection verdicts keyed by image content hash.
+
+    The first tier is an in-process LRU that lives as long as the Lambda
+    container; the second is the shared DynamoDB results table, where
+    entries expire through the table's expires_at TTL attribute. A failed
+    table read is treated as a miss, so an unavailable table costs a
+    detection call rather than the request.
+    """
+
+    def __init__(self, table=None, max_entries: int = 1024, ttl_seconds: int = 7 * 24 * 3600):
+        self.table = table
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, Tuple[Dict, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "table_hits": 0, "misses": 0}
+
+    @staticmethod
+    def _key(digest: str) -> Dict:
+        return {"pk": f"VERDICT#{digest}", "sk": "VERDICT"}
+
+    def get(self, digest: str) -> Tuple[Optional[Dict], Optional[str]]:
+        """
+        Returns (verdict, tier) where tier is "memory" or "table", or (None, None) on a miss
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is not None:
+                verdict, expires_at = entry
+                if expires_at > now:
+                    self._entries.move_to_end(digest)
+                    self.stats["memory_hits"] += 1
+                    return verdict, "memory"
+                del self._entries[digest]
+
+        if self.table is not None:
+            try:
+                item = self.table.get_item(Key=self._key(digest)).get("Item")
+            except Exception as e:
+                logger.warning(f"Verdict cache read failed: {str(e)}")
+                item = None
+            # TTL deletion is lazy, so expired items can still be returned
+            if item and int(item.get("expires_at", 0)) > now:
+                verdict = json.loads(item["verdict"])
+                self._remember(digest, verdict, float(item["expires_at"]))
+                with self._lock:
+                    self.stats["table_hits"] += 1
+                return verdict, "table"
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None, None
+
+    def put(self, digest: str, verdict: Dict) -> None:
+        expires_at = int(time.time()) + self.ttl_seconds
+        self._remember(digest, verdict, float(expires_at))
+        if self.table is not None:
+            # Stored as a JSON string so floats survive without Decimal conversion
+            self.table.put_item(Item={
+                **self._key(digest),
+                "verdict": json.dumps(verdict),
+                "expires_at": expires_at,
+            })
+
+    def _remember(self, digest: str, verdict: Dict, expires_at: float) -> None:
+        with self._lock:
+            self._entries[digest] = (verdict, expires_at)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def hit_ratio(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["table_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
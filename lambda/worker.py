@@ -0,0 +1,96 @@
+from aws_lambda_powertools import Logger, Tracer
+from aws_lambda_powertools.utilities.batch import BatchProcessor, EventType, process_partial_response
+from aws_lambda_powertools.utilities.data_classes.sqs_event import SQSRecord
+import json
+import os
+import time
+
+from upload import (
+    DEADLINE_SAFETY_MARGIN_SECONDS,
+    DetectionError,
+    analyze_image,
+    bucket_name,
+    job_store,
+    record_client_metrics,
+    s3,
+    staged_preflight_limits,
+)
+from instrumentation import metrics, stage
+from preflight import PreflightError, preflight_bytes
+
+logger = Logger(service="ReceiptApp")
+tracer = Tracer(service="ReceiptApp")
+processor = BatchProcessor(event_type=EventType.SQS)
+
+# Matches the queue's redrive policy
+MAX_RECEIVE_COUNT = int(os.environ.get('JOB_MAX_RECEIVE_COUNT', '3'))
+
+# Set per invocation so each record gets the time actually left
+lambda_context = None
+
+
+def deadline_from(context) -> float:
+    remaining = context.get_remaining_time_in_millis() / 1000 if context else 60
+    return time.monotonic() + remaining - DEADLINE_SAFETY_MARGIN_SECONDS
+
+
+@tracer.capture_method
+def run_job(job_id: str, s3_key: str, deadline: float, can_retry: bool) -> None:
+    """
+    Analyses the image staged at `s3_key` and records the outcome on the job.
+
+    The object gets the same preflight as inline uploads, with the larger
+    MAX_UPLOAD_BYTES size limit, since presigned uploads reach S3 unchecked. Throttling, server and network errors are
+    re-raised while `can_retry` is set so the event source redelivers;
+    otherwise, and for images failing preflight, the job is failed.
+    """
+    logger.append_keys(job_id=job_id)
+    
+    job_store.mark_running(job_id)
+    try:
+        image_data = s3.get_object(Bucket=bucket_name, Key=s3_key)['Body'].read()
+        with stage("Preflight"):
+            preflight_bytes(image_data, staged_preflight_limits)
+        result = analyze_image(image_data, deadline)
+    except PreflightError as e:
+        logger.warning(f"Job rejected by preflight: {e.message}")
+        job_store.fail(job_id, e.message)
+        s3.delete_object(Bucket=bucket_name, Key=s3_key)
+        return
+    except Exception as e:
+        retryable = not isinstance(e, DetectionError) or e.status_code == 429 or e.status_code >= 500
+        if retryable and can_retry:
+            logger.warning(f"Job attempt failed, will be retried: {str(e)}")
+            raise
+        logger.error(f"Job failed: {str(e)}")
+        job_store.fail(job_id, str(e))
+        return
+    
+    job_store.complete(job_id, result)
+    s3.delete_object(Bucket=bucket_name, Key=s3_key)
+
+
+def process_job(record: SQSRecord) -> None:
+    message = json.loads(record.body)
+    run_job(
+        message['job_id'],
+        message['s3_key'],
+        deadline_from(lambda_context),
+        # The last delivery records the failure instead of dead-lettering silently
+        can_retry=int(record.attributes.approximate_receive_count) < MAX_RECEIVE_COUNT
+    )
+
+
+@logger.inject_lambda_context
+@tracer.capture_lambda_handler
+@metrics.log_metrics
+@record_client_metrics
+def lambda_handler(event, context):
+    global lambda_context
+    lambda_context = context
+    return process_partial_response(
+        event=event,
+        record_handler=process_job,
+        processor=processor,
+        context=context
+    )
@@ -0,0 +1,186 @@
+"""
+Rewrites legacy raw/<uuid>.<ext> archive objects into the content-addressed
+archive/<aa>/<bb>/<sha256>.<ext> layout.
+
+Each source object is streamed once to hash it. When the hash is not yet
+archived, the object is copied server side, so image bytes are never
+uploaded again. Copies run on a thread pool. Duplicates collapse onto a
+single key. The run is idempotent and can be restarted at any time.
+
+    python scripts/migrate_archive.py --bucket <image-bucket> --dry-run
+    python scripts/migrate_archive.py --bucket <image-bucket> --workers 32 --delete-source
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, Optional
+import argparse
+import hashlib
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+
+from archive import archive_key  # noqa: E402
+from image_processing import file_extension, mime_type, sniff_format  # noqa: E402
+
+CHUNK_BYTES = 1024 * 1024
+
+
+def list_keys(s3_client, bucket: str, prefix: str) -> Iterator[Dict]:
+    kwargs = {"Bucket": bucket, "Prefix": prefix, "MaxKeys": 1000}
+    while True:
+        page = s3_client.list_objects_v2(**kwargs)
+        yield from page.get("Contents", [])
+        if not page.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+def object_exists(s3_client, bucket: str, key: str) -> bool:
+    try:
+        s3_client.head_object(Bucket=bucket, Key=key)
+        return True
+    except Exception as e:
+        status = getattr(e, "response", {}).get("ResponseMetadata", {}).get("HTTPStatusCode")
+        if status == 404:
+            return False
+        raise
+
+
+class ArchiveMigration:
+    """
+    Migrates one object at a time from `migrate_object`, safe to call from
+    many threads; `stats` counts outcomes across all of them
+    """
+
+    def __init__(self, s3_client, bucket: str, delete_source: bool = False, dry_run: bool = False):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.delete_source = delete_source
+        self.dry_run = dry_run
+        self.lock = threading.Lock()
+        # Target keys this run is writing, so parallel workers never copy the same content twice
+        self.claimed: Dict[str, threading.Event] = {}
+        self.stats = {"listed": 0, "copied": 0, "deduplicated": 0, "deleted": 0, "failed": 0, "bytes": 0}
+
+    def _count(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.stats[name] += value
+
+    def migrate_object(self, source_key: str) -> Optional[str]:
+        response = self.s3_client.get_object(Bucket=self.bucket, Key=source_key)
+        body = response["Body"]
+        digest = hashlib.sha256()
+        header = b""
+        size = 0
+        while True:
+            chunk = body.read(CHUNK_BYTES)
+            if not chunk:
+                break
+            if len(header) < 32:
+                header += chunk[:32]
+            digest.update(chunk)
+            size += len(chunk)
+        self._count("bytes", size)
+
+        image_format = sniff_format(header)
+        extension = file_extension(image_format) if image_format else source_key.rsplit(".", 1)[-1]
+        target_key = archive_key(digest.hexdigest(), extension)
+
+        with self.lock:
+            claim = self.claimed.get(target_key)
+            if claim is None:
+                self.claimed[target_key] = threading.Event()
+        if claim is not None:
+            # Another worker holds the same content; its source may only go once the copy landed
+            claim.wait()
+            if not self.dry_run and not object_exists(self.s3_client, self.bucket, target_key):
+                raise RuntimeError(f"{target_key} was not archived by the worker copying it")
+            self._count("deduplicated")
+        else:
+            try:
+                if object_exists(self.s3_client, self.bucket, target_key):
+                    self._count("deduplicated")
+                else:
+                    if not self.dry_run:
+                        # Legacy objects were all stored as image/jpeg; the copy gets the sniffed type
+                        metadata = {"MetadataDirective": "COPY"} if image_format is None else {
+                            "MetadataDirective": "REPLACE",
+                            "ContentType": mime_type(image_format),
+                            "Metadata": response.get("Metadata", {})
+                        }
+                        self.s3_client.copy_object(
+                            Bucket=self.bucket,
+                            Key=target_key,
+                            CopySource={"Bucket": self.bucket, "Key": source_key},
+                            **metadata
+                        )
+                    self._count("copied")
+            finally:
+                self.claimed[target_key].set()
+
+        if self.delete_source and not self.dry_run:
+            self.s3_client.delete_object(Bucket=self.bucket, Key=source_key)
+            self._count("deleted")
+        return target_key
+
+    def run(self, prefix: str = "raw/", workers: int = 16, max_objects: Optional[int] = None,
+            report_every: float = 10.0) -> Dict:
+        started = last_report = time.monotonic()
+        in_flight = set()
+        # At most 2x workers keys are queued, so listing never runs far ahead of copying
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="migrate") as executor:
+            for entry in list_keys(self.s3_client, self.bucket, prefix):
+                if max_objects is not None and self.stats["listed"] >= max_objects:
+                    break
+                self._count("listed")
+                in_flight.add(executor.submit(self._migrate_logged, entry["Key"]))
+                if len(in_flight) >= workers * 2:
+                    _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                if time.monotonic() - last_report >= report_every:
+                    last_report = time.monotonic()
+                    self.report(last_report - started)
+            wait(in_flight)
+        self.stats["seconds"] = round(time.monotonic() - started, 2)
+        return self.stats
+
+    def _migrate_logged(self, source_key: str) -> None:
+        try:
+            self.migrate_object(source_key)
+        except Exception as e:
+            self._count("failed")
+            print(f"failed {source_key}: {e}", file=sys.stderr)
+
+    def report(self, elapsed: float) -> None:
+        done = self.stats["copied"] + self.stats["deduplicated"] + self.stats["failed"]
+        print(f"{done}/{self.stats['listed']} objects, {done / max(elapsed, 1e-9):.1f}/s, "
+              f"{self.stats['copied']} copied, {self.stats['deduplicated']} duplicates, "
+              f"{self.stats['failed']} failed")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bucket", default=os.environ.get("BUCKET_NAME"), required="BUCKET_NAME" not in os.environ)
+    parser.add_argument("--prefix", default="raw/")
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--max-objects", type=int)
+    parser.add_argument("--delete-source", action="store_true",
+                        help="delete each raw/ object once its content is archived")
+    parser.add_argument("--dry-run", action="store_true", help="hash and report without copying or deleting")
+    args = parser.parse_args()
+
+    import boto3
+    from botocore.config import Config
+    s3_client = boto3.client("s3", config=Config(max_pool_connections=args.workers + 4))
+
+    migration = ArchiveMigration(s3_client, args.bucket, delete_source=args.delete_source, dry_run=args.dry_run)
+    stats = migration.run(prefix=args.prefix, workers=args.workers, max_objects=args.max_objects)
+    migration.report(stats["seconds"])
+    print(f"hashed {stats['bytes'] / 1e6:.1f} MB in {stats['seconds']}s; {stats['deleted']} sources deleted")
+    if stats["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Re-scores every archived image with the current detection model, e.g.
+after NVIDIA ships a model update.
+
+The S3 listing is streamed page by page and objects are downloaded and
+analysed on a bounded worker pool, paced by a client-side rate limit.
+Results replace the verdict cache entries and are stored as analysis
+records. Rollup counters are left alone, because these images were
+counted when they were first analysed. Progress is saved to a checkpoint
+file: an interrupted run (Ctrl-C, crash, expired credentials) resumes
+after the last key below which every object is done. Failures are kept in
+the checkpoint and retried with --retry-failed.
+
+    python scripts/reanalyze_archive.py --bucket <image-bucket> --table <results-table> \\
+        --api-secret-arn <arn> --rate 2 --workers 8
+"""
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional
+import argparse
+import base64
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+
+from detection_client import DetectionClient  # noqa: E402
+from flow_control import DetectionGuard, TokenBucket  # noqa: E402
+from image_processing import normalize_image, scale_detection_result  # noqa: E402
+from secret_provider import SecretProvider, secrets_manager_fetcher  # noqa: E402
+from verdict_cache import content_hash  # noqa: E402
+
+
+def list_keys(s3_client, bucket: str, prefix: str, start_after: Optional[str] = None) -> Iterator[str]:
+    kwargs = {"Bucket": bucket, "Prefix": prefix, "MaxKeys": 1000}
+    if start_after:
+        kwargs["StartAfter"] = start_after
+    while True:
+        page = s3_client.list_objects_v2(**kwargs)
+        for entry in page.get("Contents", []):
+            yield entry["Key"]
+        if not page.get("IsTruncated"):
+            return
+        kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+
+class Checkpoint:
+    """
+    Progress of one run, saved as JSON. `after` is the last key below
+    which every listed object has finished; `failed` holds keys to retry.
+    """
+
+    def __init__(self, path: Optional[str], prefix: str):
+        self.path = path
+        self.prefix = prefix
+        self.after: Optional[str] = None
+        self.failed: List[str] = []
+        self.completed = 0
+        if path and os.path.exists(path):
+            with open(path) as f:
+                state = json.load(f)
+            if state.get("prefix") != prefix:
+                raise ValueError(f"{path} belongs to a run over {state.get('prefix')!r}, not {prefix!r}")
+            self.after = state.get("after")
+            self.failed = state.get("failed", [])
+            self.completed = state.get("completed", 0)
+
+    def save(self) -> None:
+        if not self.path:
+            return
+        # Written to a temporary file and renamed, so a crash never leaves half a checkpoint
+        temporary = f"{self.path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({"prefix": self.prefix, "after": self.after, "failed": self.failed,
+                       "completed": self.completed}, f)
+        os.replace(temporary, self.path)
+
+
+class Reanalysis:
+    """
+    One re-analysis run. Keys are handed to the pool in listing order;
+    `checkpoint.after` only advances over a contiguous run of finished
+    keys, so work completed out of order is never skipped on resume.
+    """
+
+    def __init__(self, s3_client, bucket: str, detection_client: DetectionClient,
+                 checkpoint: Checkpoint, recorder=None, verdict_cache=None,
+                 workers: int = 8, normalize_max_edge: int = 1536, jpeg_quality: int = 85,
+                 call_timeout: float = 60.0):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.detection_client = detection_client
+        self.checkpoint = checkpoint
+        self.recorder = recorder
+        self.verdict_cache = verdict_cache
+        self.workers = workers
+        self.normalize_max_edge = normalize_max_edge
+        self.jpeg_quality = jpeg_quality
+        self.call_timeout = call_timeout
+        self.lock = threading.Lock()
+        # Listed keys not yet covered by checkpoint.after, in listing order -> finished
+        self.pending: "OrderedDict[str, bool]" = OrderedDict()
+        self.stats = {"listed": 0, "analysed": 0, "failed": 0, "bytes": 0}
+        self.total: Optional[int] = None
+        self.stopping = threading.Event()
+
+    def analyse(self, key: str) -> Dict:
+        started = time.monotonic()
+        image_data = self.s3_client.get_object(Bucket=self.bucket, Key=key)["Body"].read()
+        normalized = normalize_image(image_data, max_edge=self.normalize_max_edge, jpeg_quality=self.jpeg_quality)
+        payload = {
+            "input": [f"data:{normalized.mime_type if normalized.format else 'image/png'};base64,"
+                      f"{base64.b64encode(normalized.data).decode()}"]
+        }
+        response = self.detection_client.detect(payload, deadline=time.monotonic() + self.call_timeout)
+        if not response.ok:
+            raise RuntimeError(f"Detection API returned {response.status_code}")
+        result = response.json()
+        result.pop("image", None)
+        scale_detection_result(result, normalized.scale)
+
+        digest = content_hash(image_data)
+        if self.verdict_cache is not None:
+            self.verdict_cache.put(digest, result)
+        if self.recorder is not None:
+            self.recorder.record(digest, result, latency_ms=(time.monotonic() - started) * 1000,
+                                 size_bytes=len(image_data), rollups=False)
+        with self.lock:
+            self.stats["bytes"] += len(image_data)
+        return result
+
+    def _run_one(self, key: str) -> None:
+        try:
+            self.analyse(key)
+            failed = False
+        except Exception as e:
+            failed = True
+            print(f"failed {key}: {e}", file=sys.stderr)
+        with self.lock:
+            self.stats["failed" if failed else "analysed"] += 1
+            if failed:
+                self.checkpoint.failed.append(key)
+            else:
+                self.checkpoint.completed += 1
+            if key in self.pending:
+                self.pending[key] = True
+                # Advance the resume point over every leading finished key
+                while self.pending and next(iter(self.pending.values())):
+                    self.checkpoint.after, _ = self.pending.popitem(last=False)
+
+    def _count_remaining(self, prefix: str, start_after: Optional[str]) -> None:
+        # A separate listing pass, so the ETA is known long before the main listing ends
+        count = 0
+        for _ in list_keys(self.s3_client, self.bucket, prefix, start_after):
+            if self.stopping.is_set():
+                return
+            count += 1
+        self.total = count
+
+    def run(self, prefix: str, max_objects: Optional[int] = None, retry_failed: bool = False,
+            report_every: float = 10.0, checkpoint_every: float = 5.0, count: bool = True) -> Dict:
+        started = last_report = last_save = time.monotonic()
+        retries = self.checkpoint.failed if retry_failed else []
+        if retry_failed:
+            self.checkpoint.failed = []
+        if count:
+            threading.Thread(target=self._count_remaining, args=(prefix, self.checkpoint.after), daemon=True).start()
+
+        in_flight = set()
+        submitted = 0
+        executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="reanalyze")
+        try:
+            # Earlier failures first, then the rest of the listing
+            for key in retries:
+                in_flight.add(executor.submit(self._run_one, key))
+                submitted += 1
+            for key in list_keys(self.s3_client, self.bucket, prefix, self.checkpoint.after):
+                if max_objects is not None and submitted >= max_objects:
+                    break
+                with self.lock:
+                    self.pending[key] = False
+                    self.stats["listed"] += 1
+                in_flight.add(executor.submit(self._run_one, key))
+                submitted += 1
+                # Listing stays at most two batches ahead of the workers
+                if len(in_flight) >= self.workers * 2:
+                    _, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                now = time.monotonic()
+                if now - last_save >= checkpoint_every:
+                    last_save = now
+                    self._save()
+                if now - last_report >= report_every:
+                    last_report = now
+                    self.report(now - started)
+            wait(in_flight)
+        except KeyboardInterrupt:
+            print("interrupted; finishing objects in flight", file=sys.stderr)
+            wait(in_flight)
+        finally:
+            self.stopping.set()
+            executor.shutdown(wait=True)
+            self._save()
+        self.stats["seconds"] = round(time.monotonic() - started, 2)
+        return self.stats
+
+    def _save(self) -> None:
+        with self.lock:
+            self.checkpoint.save()
+
+    def report(self, elapsed: float) -> None:
+        with self.lock:
+            done = self.stats["analysed"] + self.stats["failed"]
+        rate = done / max(elapsed, 1e-9)
+        if self.total is not None and rate > 0:
+            remaining = max(self.total - done, 0)
+            eta = f"ETA {remaining / rate / 60:.1f} min ({remaining} left)"
+        else:
+            eta = "ETA pending (still counting objects)"
+        print(f"{done} done, {self.stats['failed']} failed, {rate:.2f} images/s, "
+              f"{self.stats['bytes'] / 1e6 / max(elapsed, 1e-9):.1f} MB/s, {eta}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bucket", default=os.environ.get("BUCKET_NAME"), required="BUCKET_NAME" not in os.environ)
+    parser.add_argument("--prefix", default="archive/", help="archive/ by default; raw/ for legacy objects")
+    parser.add_argument("--table", default=os.environ.get("RESULTS_TABLE_NAME"),
+                        help="results table for verdicts and analysis records; omitted means results are not stored")
+    parser.add_argument("--api-secret-arn", default=os.environ.get("API_SECRET_ARN"))
+    parser.add_argument("--invoke-url", default=None, help="detection endpoint, e.g. a local stub")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=2.0, help="detection calls per second, 0 for unlimited")
+    parser.add_argument("--checkpoint", default="reanalysis.checkpoint.json")
+    parser.add_argument("--max-objects", type=int)
+    parser.add_argument("--retry-failed", action="store_true")
+    parser.add_argument("--normalize-max-edge", type=int, default=1536)
+    args = parser.parse_args()
+
+    import boto3
+    from botocore.config import Config
+    s3_client = boto3.client("s3", config=Config(max_pool_connections=args.workers + 4))
+
+    if os.environ.get("NVIDIA_API_KEY"):
+        api_key_provider = SecretProvider(lambda: os.environ["NVIDIA_API_KEY"])
+    elif args.api_secret_arn:
+        api_key_provider = SecretProvider(secrets_manager_fetcher(args.api_secret_arn))
+    else:
+        parser.error("set NVIDIA_API_KEY or --api-secret-arn")
+
+    guard = DetectionGuard(rate_limiter=TokenBucket(rate=args.rate, burst=max(args.rate, 1)) if args.rate > 0 else None)
+    client_options = {"invoke_url": args.invoke_url} if args.invoke_url else {}
+    detection = DetectionClient(api_key_provider, pool_maxsize=args.workers, guard=guard, **client_options)
+
+    recorder = verdict_cache = None
+    if args.table:
+        from analysis_records import AnalysisRecorder
+        from clients import LazyTable
+        from verdict_cache import VerdictCache
+        table = LazyTable(args.table)
+        recorder = AnalysisRecorder(table)
+        verdict_cache = VerdictCache(table=table, max_entries=0)
+
+    run = Reanalysis(s3_client, args.bucket, detection, Checkpoint(args.checkpoint, args.prefix),
+                     recorder=recorder, verdict_cache=verdict_cache, workers=args.workers,
+                     normalize_max_edge=args.normalize_max_edge)
+    stats = run.run(args.prefix, max_objects=args.max_objects, retry_failed=args.retry_failed)
+    run.report(stats["seconds"])
+    print(f"checkpoint saved to {args.checkpoint}; {len(run.checkpoint.failed)} keys to retry with --retry-failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,363 @@
+"""
+Serves the upload API (the same routes API Gateway sends to the upload
+Lambda) over plain HTTP, for sites that run the detection service on their
+own Linux hosts.
+
+Each connection gets its own thread, so many slow detection calls are in
+flight at once per process; --max-concurrency caps them and answers 503
+with Retry-After beyond that, before the request body is read. A client
+that sends nothing for --read-timeout seconds is disconnected. --processes pre-forks workers sharing one
+listening socket. Concurrent uploads of the same image are coalesced into
+one detection call. On SIGTERM or SIGINT the server stops accepting
+connections, /healthz starts answering 503, and requests in flight get
+--shutdown-timeout seconds to finish.
+
+Configuration is the upload Lambda's environment. BUCKET_NAME is required
+(the archive bucket); RESULTS_TABLE_NAME is optional; the NVIDIA key comes
+from NVIDIA_API_KEY or API_SECRET_ARN.
+
+    BUCKET_NAME=<image-bucket> NVIDIA_API_KEY=<key> python scripts/serve.py --port 8080 --processes 4
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+import argparse
+import base64
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "lambda"))
+
+# X-Ray has no daemon to send to outside Lambda
+os.environ.setdefault("POWERTOOLS_TRACE_DISABLED", "true")
+
+TEXT_CONTENT_TYPES = ("application/json", "text/", "application/x-www-form-urlencoded")
+
+
+class RequestContext:
+    """
+    The parts of the Lambda context the handler uses, with the request
+    timeout standing in for the function timeout
+    """
+    function_name = "deepfake-upload-server"
+    function_version = "$LATEST"
+    invoked_function_arn = "arn:aws:lambda:local:000000000000:function:deepfake-upload-server"
+    memory_limit_in_mb = 0
+
+    def __init__(self, request_id: str, timeout: float):
+        self.aws_request_id = request_id
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self) -> int:
+        return int(max(self._deadline - time.monotonic(), 0) * 1000)
+
+
+def build_event(method: str, target: str, headers: Dict[str, str], body: bytes,
+                source_ip: str, request_id: str) -> Dict:
+    """
+    Builds the API Gateway REST proxy event for one HTTP request
+    """
+    url = urlsplit(target)
+    query = parse_qs(url.query, keep_blank_values=True)
+    content_type = headers.get("Content-Type", "")
+    is_text = not body or content_type.startswith(TEXT_CONTENT_TYPES)
+    return {
+        "httpMethod": method,
+        "path": url.path,
+        "resource": url.path,
+        "headers": headers,
+        "multiValueHeaders": {name: [value] for name, value in headers.items()},
+        "queryStringParameters": {name: values[-1] for name, values in query.items()} or None,
+        "multiValueQueryStringParameters": query or None,
+        "pathParameters": None,
+        "requestContext": {
+            "requestId": request_id,
+            "stage": "local",
+            "httpMethod": method,
+            "path": url.path,
+            "identity": {"sourceIp": source_ip}
+        },
+        "body": (body.decode("utf-8") if is_text else base64.b64encode(body).decode()) if body else None,
+        "isBase64Encoded": not is_text
+    }
+
+
+# JSON bodies carry the image as base64, plus room for the other fields
+# or multipart form overhead
+BODY_OVERHEAD_BYTES = 64 * 1024
+
+
+def max_body_bytes(max_image_bytes: int) -> int:
+    """
+    Returns the largest request body that can hold an image of
+    `max_image_bytes`, base64 encoded in a JSON body
+    """
+    return 4 * -(-max_image_bytes // 3) + BODY_OVERHEAD_BYTES
+
+
+class UploadServer:
+    """
+    Runs the upload app behind a ThreadingHTTPServer in this process
+    """
+
+    def __init__(self, sock: socket.socket, max_concurrency: int = 64, request_timeout: float = 30.0,
+                 shutdown_timeout: float = 30.0, read_timeout: float = 10.0):
+        import upload
+        self.upload = upload
+        # Bodies are read into memory, so the limit is checked before reading
+        self.max_body_bytes = max_body_bytes(upload.preflight_limits.max_bytes)
+        self.handle = self._build_handler()
+        self.request_timeout = request_timeout
+        self.shutdown_timeout = shutdown_timeout
+        self.read_timeout = read_timeout
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+        self.draining = threading.Event()
+        self.in_flight = 0
+        self.idle = threading.Condition()
+        self.httpd = ThreadingHTTPServer(sock.getsockname()[:2], make_request_handler(self), bind_and_activate=False)
+        self.httpd.socket.close()
+        self.httpd.socket = sock
+        self.httpd.daemon_threads = True
+
+    def _build_handler(self):
+        upload = self.upload
+
+        from instrumentation import flush_metrics
+
+        # Same chain as upload.lambda_handler, but with per-thread log keys so
+        # concurrent requests never log each other's request ids, and a
+        # metrics flush that is safe while other requests add metrics
+        @upload.record_client_metrics
+        def resolve(event, context):
+            upload.logger.thread_safe_append_keys(request_id=context.aws_request_id,
+                                                  correlation_id=event["requestContext"]["requestId"])
+            try:
+                return upload.app.resolve(event, context)
+            finally:
+                upload.logger.thread_safe_clear_keys()
+
+        def handle(event, context):
+            try:
+                return resolve(event, context)
+            finally:
+                flush_metrics()
+        return handle
+
+    def admit(self) -> bool:
+        """
+        Takes a request slot, before the body is read so that only admitted
+        requests hold one in memory; False while draining or when every
+        slot is taken. An admitted request must call finish().
+        """
+        if self.draining.is_set() or not self.slots.acquire(blocking=False):
+            return False
+        with self.idle:
+            self.in_flight += 1
+        return True
+
+    def finish(self) -> None:
+        self.slots.release()
+        with self.idle:
+            self.in_flight -= 1
+            self.idle.notify_all()
+
+    def invoke(self, event: Dict) -> Dict:
+        """
+        Runs one admitted event through the app
+        """
+        context = RequestContext(event["requestContext"]["requestId"], self.request_timeout)
+        return self.handle(event, context)
+
+    def serve_forever(self) -> None:
+        self.httpd.serve_forever()
+
+    def shutdown(self) -> None:
+        """
+        Stops accepting connections and waits for requests in flight
+        """
+        self.draining.set()
+        threading.Thread(target=self.httpd.shutdown, daemon=True).start()
+        deadline = time.monotonic() + self.shutdown_timeout
+        with self.idle:
+            while self.in_flight and time.monotonic() < deadline:
+                self.idle.wait(deadline - time.monotonic())
+        if self.in_flight:
+            print(f"shutdown timeout reached with {self.in_flight} requests in flight", file=sys.stderr)
+        # Archive writes and analysis records still queued behind the responses
+        self.upload.archiver.shutdown()
+        if self.upload.analysis_recorder is not None:
+            self.upload.analysis_recorder.flush(timeout=self.shutdown_timeout)
+        self.httpd.server_close()
+
+
+def make_request_handler(server: UploadServer):
+    class UploadRequestHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        disable_nagle_algorithm = True
+        # Socket timeout for each read, so a stalled client cannot hold its
+        # thread (and slot) indefinitely; BaseHTTPRequestHandler closes the
+        # connection when it expires
+        timeout = server.read_timeout
+
+        def _handle(self):
+            if self.path == "/healthz":
+                self._send(503 if server.draining.is_set() else 200, {}, b"")
+                return
+            length = self._content_length()
+            if length is None:
+                return
+            if not server.admit():
+                # The body is left unread, so the connection cannot carry another request
+                self.close_connection = True
+                self._send(503, {"Retry-After": "1", "Content-Type": "application/json"},
+                           b'{"error": "Server is busy"}')
+                return
+            try:
+                body = self.rfile.read(length) if length else b""
+                if len(body) < length:
+                    # The client closed the connection mid-body
+                    self.close_connection = True
+                    return
+                request_id = self.headers.get("X-Request-Id") or str(uuid.uuid4())
+                event = build_event(self.command, self.path, dict(self.headers.items()), body,
+                                    self.client_address[0], request_id)
+                response = server.invoke(event)
+            finally:
+                server.finish()
+            payload = response.get("body") or ""
+            payload = base64.b64decode(payload) if response.get("isBase64Encoded") else payload.encode()
+            headers = dict(response.get("headers") or {})
+            for name, values in (response.get("multiValueHeaders") or {}).items():
+                headers[name] = ", ".join(values)
+            self._send(response["statusCode"], headers, payload)
+
+        def _content_length(self) -> Optional[int]:
+            """
+            Returns the body length, or None after answering a request whose
+            body must not be read; the connection is then closed, since the
+            unread body would be taken for the next request
+            """
+            value = self.headers.get("Content-Length")
+            if value is None:
+                if self.command in ("POST", "PUT") or self.headers.get("Transfer-Encoding"):
+                    self._reject(411, "Content-Length is required")
+                    return None
+                return 0
+            if not value.isdigit():
+                self._reject(400, "Invalid Content-Length")
+                return None
+            length = int(value)
+            if length > server.max_body_bytes:
+                self._reject(413, f"Request body is {length} bytes; the limit is {server.max_body_bytes}")
+                return None
+            return length
+
+        def _reject(self, status: int, message: str):
+            self.close_connection = True
+            self._send(status, {"Content-Type": "application/json"}, json.dumps({"error": message}).encode())
+
+        def _send(self, status: int, headers: Dict[str, str], payload: bytes):
+            self.send_response(status)
+            for name, value in headers.items():
+                if name.lower() != "content-length":
+                    self.send_header(name, value)
+            self.send_header("Content-Length", str(len(payload)))
+            if server.draining.is_set():
+                self.close_connection = True
+            if self.close_connection:
+                self.send_header("Connection", "close")
+            self.end_headers()
+            try:
+                self.wfile.write(payload)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up; nothing left to tell it
+                self.close_connection = True
+
+        do_GET = do_POST = do_PUT = do_DELETE = do_OPTIONS = _handle
+
+        def log_message(self, format, *args):
+            # The app logs every request as structured JSON already
+            pass
+
+    return UploadRequestHandler
+
+
+def listen(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(1024)
+    return sock
+
+
+def run_worker(sock: socket.socket, args) -> None:
+    # The detection guard and connection pool are sized for the requests this process admits
+    os.environ.setdefault("DETECTION_MAX_CONCURRENCY", str(args.max_concurrency))
+    server = UploadServer(sock, max_concurrency=args.max_concurrency, request_timeout=args.request_timeout,
+                          shutdown_timeout=args.shutdown_timeout, read_timeout=args.read_timeout)
+    stopping = threading.Event()
+
+    def stop(signum, frame):
+        stopping.set()
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    stopping.wait()
+    server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--processes", type=int, default=1, help="pre-forked worker processes")
+    parser.add_argument("--max-concurrency", type=int, default=64, help="requests in flight per process")
+    parser.add_argument("--request-timeout", type=float, default=30.0, help="seconds, like the Lambda timeout")
+    parser.add_argument("--read-timeout", type=float, default=10.0,
+                        help="seconds a client may go without sending before it is disconnected")
+    parser.add_argument("--shutdown-timeout", type=float, default=30.0,
+                        help="seconds requests in flight get to finish on SIGTERM")
+    args = parser.parse_args()
+
+    sock = listen(args.host, args.port)
+    print(f"serving on http://{args.host}:{args.port} with {args.processes} process(es)", file=sys.stderr)
+    if args.processes <= 1:
+        run_worker(sock, args)
+        return
+
+    children = []
+    for _ in range(args.processes):
+        pid = os.fork()
+        if pid == 0:
+            run_worker(sock, args)
+            os._exit(0)
+        children.append(pid)
+
+    def forward(signum, frame):
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for pid in children:
+        while True:
+            try:
+                os.waitpid(pid, 0)
+                break
+            except InterruptedError:
+                continue
+
+
+if __name__ == "__main__":
+    main()
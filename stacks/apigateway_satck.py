@@ -1,6 +1,7 @@
 from aws_cdk import (
     Stack,
     CfnOutput,
+    Duration,
     aws_apigateway as apigateway,
     aws_lambda as _lambda
 )
@@ -9,18 +10,35 @@ from constructs import Construct
 class ApiGatewayStack(Stack):
 
     def __init__(self, scope: Construct, construct_id: str, 
-                 upload_lambda: _lambda.Function,
+                 upload_lambda: _lambda.IFunction,
                  dashboard_lambda: _lambda.Function = None,
                  **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        # Opt-in stage cache for GET /results/{image_hash}, e.g.
+        # `cdk deploy -c results_cache_ttl_seconds=300`; the cache cluster is billed hourly
+        results_cache_ttl = int(self.node.try_get_context('results_cache_ttl_seconds') or 0)
+        results_method_options = {
+            "/results/{image_hash}/GET": apigateway.MethodDeploymentOptions(
+                caching_enabled=True,
+                cache_ttl=Duration.seconds(results_cache_ttl),
+                data_trace_enabled=True
+            )
+        } if results_cache_ttl else None
+
         self.api = apigateway.RestApi(
             self, "DeepFakeApi",
             rest_api_name="DeepFake API",
+            # Raw image and multipart uploads reach the Lambda base64 encoded
+            # instead of being mangled as UTF-8 text
+            binary_media_types=["image/*", "multipart/form-data"],
             deploy_options=apigateway.StageOptions(
                 stage_name="prod",
                 tracing_enabled=True,
                 data_trace_enabled=True,
+                cache_cluster_enabled=bool(results_cache_ttl) or None,
+                cache_cluster_size="0.5" if results_cache_ttl else None,
+                method_options=results_method_options,
             ),
             default_cors_preflight_options=apigateway.CorsOptions(
                 allow_origins=apigateway.Cors.ALL_ORIGINS,
@@ -30,7 +48,31 @@ class ApiGatewayStack(Stack):
         )
 
         upload_integration = apigateway.LambdaIntegration(upload_lambda)
-        self.api.root.add_resource("upload").add_method("POST", upload_integration)
+        upload_resource = self.api.root.add_resource("upload")
+        upload_resource.add_method("POST", upload_integration)
+        upload_resource.add_resource("batch").add_method("POST", upload_integration)
+        upload_resource.add_resource("presign").add_method("POST", upload_integration)
+        
+        jobs_resource = self.api.root.add_resource("jobs")
+        jobs_resource.add_method("POST", upload_integration)
+        jobs_resource.add_resource("{job_id}").add_method("GET", upload_integration)
+        
+        self.api.root.add_resource("stats").add_method("GET", upload_integration)
+        self.api.root.add_resource("history").add_method("GET", upload_integration)
+        
+        # Cached per hash and per If-None-Match, so a stored 304 is only
+        # replayed to clients that sent the same ETag
+        results_integration = apigateway.LambdaIntegration(
+            upload_lambda,
+            cache_key_parameters=["method.request.path.image_hash", "method.request.header.If-None-Match"]
+        )
+        self.api.root.add_resource("results").add_resource("{image_hash}").add_method(
+            "GET", results_integration,
+            request_parameters={
+                "method.request.path.image_hash": True,
+                "method.request.header.If-None-Match": False
+            }
+        )
         
         # Add dashboard endpoint if dashboard lambda is provided
         if dashboard_lambda:
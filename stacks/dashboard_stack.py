@@ -8,6 +8,22 @@ from aws_cdk import (
 )
 from constructs import Construct
 
+# Per-stage metrics the upload handler publishes as Embedded Metric Format
+STAGE_METRICS_NAMESPACE = "DeepFake"
+STAGE_METRICS_SERVICE = "ReceiptApp"
+
+# p99 alarm threshold for each stage's <Stage>Latency metric, in milliseconds
+STAGE_LATENCY_THRESHOLDS_MS = {
+    "Preflight": 50,
+    "Decode": 250,
+    "CacheLookup": 100,
+    "NearDuplicateLookup": 250,
+    "Normalize": 2000,
+    "SecretFetch": 1000,
+    "Detection": 15000,
+    "ArchiveWait": 1000,
+}
+
 
 class DashboardStack(Stack):
 
@@ -266,6 +282,107 @@ class DashboardStack(Stack):
             ),
         )
 
+        # Per-stage latency percentiles and alarms from the handler's EMF records
+        def stage_metric(metric_name: str, statistic: str, label: str) -> cloudwatch.Metric:
+            return cloudwatch.Metric(
+                namespace=STAGE_METRICS_NAMESPACE,
+                metric_name=metric_name,
+                dimensions_map={"service": STAGE_METRICS_SERVICE},
+                statistic=statistic,
+                period=Duration.minutes(5),
+                label=label
+            )
+
+        stage_widgets = []
+        stage_alarms = []
+        for stage, threshold in STAGE_LATENCY_THRESHOLDS_MS.items():
+            metric_name = f"{stage}Latency"
+            stage_widgets.append(cloudwatch.GraphWidget(
+                title=f"{stage} Latency (p50 / p90 / p99)",
+                left=[stage_metric(metric_name, percentile, f"{stage} {percentile}") for percentile in ("p50", "p90", "p99")],
+                width=8,
+                left_y_axis=cloudwatch.YAxisProps(label="Duration (ms)", show_units=False)
+            ))
+            stage_alarms.append(cloudwatch.Alarm(
+                self, f"{stage}LatencyAlarm",
+                alarm_name=f"DeepFake-{stage}-Latency-p99",
+                alarm_description=f"p99 {stage} latency above {threshold} ms",
+                metric=stage_metric(metric_name, "p99", f"{stage} p99"),
+                threshold=threshold,
+                evaluation_periods=3,
+                datapoints_to_alarm=2,
+                comparison_operator=cloudwatch.ComparisonOperator.GREATER_THAN_THRESHOLD,
+                treat_missing_data=cloudwatch.TreatMissingData.NOT_BREACHING
+            ))
+
+        dashboard.add_widgets(
+            cloudwatch.AlarmStatusWidget(
+                title="Upload Stage Latency Alarms",
+                alarms=stage_alarms,
+                width=24
+            ),
+            *stage_widgets,
+            cloudwatch.GraphWidget(
+                title="Verdict Cache and Near-Duplicate Hits",
+                left=[stage_metric(name, "Sum", name) for name in
+                      ("CacheMemoryHit", "CacheTableHit", "CacheMiss", "NearDuplicateHit")],
+                width=12
+            ),
+            cloudwatch.GraphWidget(
+                title="Detection API Attempts, Retries and Rejections",
+                left=[stage_metric(name, "Sum", name) for name in
+                      ("DetectionAttempts", "DetectionRetries", "DetectionRejected", "CircuitOpened", "DetectionThrottled",
+                       "ApiKeyRefreshes", "ApiKeyThrottles", "ApiKeyPoolExhausted")],
+                width=12
+            ),
+            cloudwatch.GraphWidget(
+                title="Detection Hedging (hedge rate and hedge win ratio)",
+                left=[stage_metric(name, "Sum", name) for name in
+                      ("DetectionRequests", "DetectionHedged", "HedgeWins")],
+                right=[
+                    cloudwatch.MathExpression(
+                        expression="100 * hedged / requests",
+                        using_metrics={
+                            "hedged": stage_metric("DetectionHedged", "Sum", "DetectionHedged"),
+                            "requests": stage_metric("DetectionRequests", "Sum", "DetectionRequests")
+                        },
+                        label="Hedge rate %"
+                    ),
+                    cloudwatch.MathExpression(
+                        expression="100 * wins / hedged",
+                        using_metrics={
+                            "wins": stage_metric("HedgeWins", "Sum", "HedgeWins"),
+                            "hedged": stage_metric("DetectionHedged", "Sum", "DetectionHedged")
+                        },
+                        label="Hedge win ratio %"
+                    )
+                ],
+                width=12,
+                right_y_axis=cloudwatch.YAxisProps(label="Percent", show_units=False, min=0, max=100)
+            ),
+            cloudwatch.GraphWidget(
+                title="Detection Calls and Throttles per API Key",
+                # Key names are only known at run time, so the series are found by search
+                left=[
+                    cloudwatch.MathExpression(
+                        expression=f"SEARCH('{{{STAGE_METRICS_NAMESPACE},ApiKey,service}} "
+                                   f"MetricName=\"{name}\"', 'Sum', 300)",
+                        label=f"{name} ${{PROP('Dim.ApiKey')}}",
+                        period=Duration.minutes(5)
+                    )
+                    for name in ("ApiKeyRequests", "ApiKeyThrottles")
+                ],
+                width=12
+            ),
+            cloudwatch.GraphWidget(
+                title="Image and Detection Payload Size (p50 / p99)",
+                left=[stage_metric(name, percentile, f"{name} {percentile}")
+                      for name in ("ImageBytes", "PayloadBytes") for percentile in ("p50", "p99")],
+                width=12,
+                left_y_axis=cloudwatch.YAxisProps(label="Bytes", show_units=False)
+            ),
+        )
+
         # Output dashboard URL
         dashboard_url = f"https://{self.region}.console.aws.amazon.com/cloudwatch/home?region={self.region}#dashboards:name={dashboard.dashboard_name}"
         
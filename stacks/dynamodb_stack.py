@@ -1,7 +1,7 @@
 from aws_cdk import (
-    # Duration,
     Stack,
-    # aws_sqs as sqs,
+    RemovalPolicy,
+    aws_dynamodb as dynamodb,
 )
 from constructs import Construct
 
@@ -10,10 +10,39 @@ class DynamoDBStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        # The code that defines your stack goes here
+        # Single table for analysis records, hourly/daily rollup counters and
+        # verdict cache entries. Items are keyed as pk/sk (e.g.
+        # pk="VERDICT#<sha256>", sk="VERDICT" or pk="ROLLUP#hour#<shard>",
+        # sk="2024-01-31T09") and expire through the expires_at TTL attribute.
+        self.results_table = dynamodb.Table(
+            self, "ResultsTable",
+            partition_key=dynamodb.Attribute(
+                name="pk",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="sk",
+                type=dynamodb.AttributeType.STRING
+            ),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            time_to_live_attribute="expires_at",
+            removal_policy=RemovalPolicy.RETAIN,
+        )
 
-        # example resource
-        # queue = sqs.Queue(
-        #     self, "DeepFakeQueue",
-        #     visibility_timeout=Duration.seconds(300),
-        # )
+        # Newest-first analysis history by verdict and confidence band
+        # (history_pk="HISTORY#<verdict>#<band>", history_sk="<ms>#<id>").
+        # Only the fields /history returns are projected, so queries never
+        # fetch from the base table.
+        self.results_table.add_global_secondary_index(
+            index_name="HistoryIndex",
+            partition_key=dynamodb.Attribute(
+                name="history_pk",
+                type=dynamodb.AttributeType.STRING
+            ),
+            sort_key=dynamodb.Attribute(
+                name="history_sk",
+                type=dynamodb.AttributeType.STRING
+            ),
+            projection_type=dynamodb.ProjectionType.INCLUDE,
+            non_key_attributes=["image_hash", "verdict", "confidence", "latency_ms", "bytes", "analyzed_at", "cache_hit"],
+        )
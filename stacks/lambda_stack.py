@@ -2,32 +2,90 @@ import os
 from aws_cdk import (
     Stack,
     RemovalPolicy,
+    aws_dynamodb as dynamodb,
     aws_lambda as _lambda,
     aws_logs as logs,
     aws_s3 as s3,
     aws_secretsmanager as secretsmanager,
+    aws_sqs as sqs,
+    aws_lambda_event_sources as lambda_event_sources,
+    aws_events as events,
+    aws_events_targets as events_targets,
     Duration
 )
 from constructs import Construct
 
+# Deploy profiles, chosen with `cdk deploy -c performance_profile=<name>`.
+# Memory also buys CPU: 1769 MB is one full vCPU, which image normalization
+# (Pillow resize and re-encode) uses. Reserved concurrency comes out of the
+# account's shared pool; provisioned concurrency is billed while idle.
+PERFORMANCE_PROFILES = {
+    "cost": {
+        "architecture": "arm64",
+        "memory_mb": 512,
+        "upload_timeout_seconds": 30,
+        "worker_timeout_seconds": 120,
+        "reserved_concurrency": None,
+        "provisioned_concurrency": 0,
+        "max_provisioned_concurrency": 0,
+    },
+    "balanced": {
+        "architecture": "arm64",
+        "memory_mb": 1024,
+        "upload_timeout_seconds": 30,
+        "worker_timeout_seconds": 60,
+        "reserved_concurrency": None,
+        "provisioned_concurrency": 0,
+        "max_provisioned_concurrency": 0,
+    },
+    "low-latency": {
+        "architecture": "arm64",
+        "memory_mb": 1769,
+        "upload_timeout_seconds": 29,
+        "worker_timeout_seconds": 60,
+        "reserved_concurrency": 100,
+        "provisioned_concurrency": 2,
+        "max_provisioned_concurrency": 20,
+    },
+}
+DEFAULT_PERFORMANCE_PROFILE = "balanced"
+PROVISIONED_UTILIZATION_TARGET = 0.7
+
+ARCHITECTURES = {
+    "arm64": _lambda.Architecture.ARM_64,
+    "x86_64": _lambda.Architecture.X86_64,
+}
+
+
 class LambdaStack(Stack):
 
     def __init__(self, scope: Construct, construct_id: str, 
                  image_bucket: s3.Bucket,
                  api_secret: secretsmanager.Secret,
+                 results_table: dynamodb.Table,
                  **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        profile_name = self.node.try_get_context('performance_profile') or DEFAULT_PERFORMANCE_PROFILE
+        if profile_name not in PERFORMANCE_PROFILES:
+            raise ValueError(f"Unknown performance_profile '{profile_name}'; expected one of {sorted(PERFORMANCE_PROFILES)}")
+        profile = PERFORMANCE_PROFILES[profile_name]
+        self.performance_profile = profile_name
+        # Layers hold compiled wheels (e.g. Pillow), so they must be built for this architecture
+        architecture = ARCHITECTURES[profile["architecture"]]
+
         layer = _lambda.LayerVersion(
             self, 'lambda_layer',
             code=_lambda.Code.from_asset('./layers/layer.zip'),
             compatible_runtimes=[_lambda.Runtime.PYTHON_3_12],  
+            compatible_architectures=[architecture],
         )
         
         request_layer = _lambda.LayerVersion(
             self, 'request_layer',
             code=_lambda.Code.from_asset('./layers/request.zip'),
             compatible_runtimes=[_lambda.Runtime.PYTHON_3_12],  
+            compatible_architectures=[architecture],
         )
         
         # Create Log Group for upload lambda with DESTROY removal policy
@@ -38,34 +96,194 @@ class LambdaStack(Stack):
             retention=logs.RetentionDays.ONE_WEEK
         )
         
-        # Lambda Insights Layer - for enhanced monitoring and cold start tracking
-        # Using version 21 which supports Python 3.12
-        # ARN format: arn:aws:lambda:<region>:580247275435:layer:LambdaInsightsExtension:<version>
-        lambda_insights_layer = _lambda.LayerVersion.from_layer_version_arn(
-            self, 'LambdaInsightsLayer',
-            layer_version_arn=f'arn:aws:lambda:{self.region}:580247275435:layer:LambdaInsightsExtension:21'
+        # Lambda Insights - for enhanced monitoring and cold start tracking; CDK
+        # picks the extension layer for the region and architecture and grants
+        # the functions its execution role policy
+        lambda_insights_version = _lambda.LambdaInsightsVersion.VERSION_1_0_404_0
+        
+        # Async jobs: the upload Lambda queues work, the worker Lambda drains it
+        job_dead_letter_queue = sqs.Queue(
+            self, 'job_dead_letter_queue',
+            retention_period=Duration.days(14)
         )
         
+        self.job_queue = sqs.Queue(
+            self, 'job_queue',
+            visibility_timeout=Duration.seconds(6 * profile["worker_timeout_seconds"]),  # 6x the worker timeout
+            dead_letter_queue=sqs.DeadLetterQueue(
+                max_receive_count=3,
+                queue=job_dead_letter_queue
+            )
+        )
+        
+        upload_environment = {
+            'BUCKET_NAME': image_bucket.bucket_name,
+            'API_SECRET_ARN': api_secret.secret_arn,
+            'API_KEY_TTL_SECONDS': '300',
+            'API_KEY_QUARANTINE_SECONDS': '5',
+            'RESULTS_TABLE_NAME': results_table.table_name,
+            'VERDICT_CACHE_TTL_SECONDS': '604800',
+            'VERDICT_CACHE_MAX_ENTRIES': '1024',
+            'NEAR_DUPLICATE_MODE': 'flag',
+            'NEAR_DUPLICATE_MAX_DISTANCE': '3',
+            'NEAR_DUPLICATE_MAX_ENTRIES': '10000',
+            'NEAR_DUPLICATE_MAX_BAND_READS': '100',
+            'ANALYSIS_RECORD_TTL_SECONDS': str(90 * 24 * 3600),
+            'ROLLUP_SHARDS': '10',
+            'ARCHIVE_MODE': 'durable',
+            # Inline, batch and queued uploads; presigned uploads skip the
+            # API payload limit and are capped by MAX_UPLOAD_BYTES instead
+            'PREFLIGHT_MAX_BYTES': str(8 * 1024 * 1024),
+            'PREFLIGHT_MAX_PIXELS': '50000000',
+            'PREFLIGHT_ALLOWED_FORMATS': 'jpeg,png,webp,gif,bmp',
+            'NORMALIZE_MAX_EDGE': '1536',
+            'NORMALIZE_JPEG_QUALITY': '85',
+            'BATCH_MAX_ITEMS': '100',
+            'BATCH_MAX_CONCURRENCY': '8',
+            # Per API key; the container's limit scales with the keys in the secret
+            'DETECTION_RATE_PER_SECOND': '2',
+            'DETECTION_RATE_BURST': '5',
+            'DETECTION_LATENCY_TARGET_SECONDS': '10',
+            'CIRCUIT_FAILURE_THRESHOLD': '5',
+            'CIRCUIT_COOLDOWN_SECONDS': '30',
+            # JSON list of alternate endpoints to hedge slow NVIDIA calls to, e.g.
+            # [{"name": "eu", "url": "https://...", "schema": "nvidia-hive", "auth": "nvidia"}]
+            'DETECTION_BACKENDS': self.node.try_get_context('detection_backends') or '',
+            'DETECTION_HEDGING': 'true',
+            'DETECTION_HEDGE_QUANTILE': '0.95',
+            'DETECTION_HEDGE_INITIAL_DELAY_SECONDS': '3',
+            'DETECTION_HEDGE_MIN_DELAY_SECONDS': '0.05',
+            'JOB_QUEUE_URL': self.job_queue.queue_url,
+            'JOB_MAX_RECEIVE_COUNT': '3',
+            'PRESIGN_EXPIRY_SECONDS': '300',
+            'RESULTS_MAX_AGE_SECONDS': '3600',
+            'MAX_UPLOAD_BYTES': str(20 * 1024 * 1024),
+            "POWERTOOLS_SERVICE_NAME": "DeepFakeApp",
+            "POWERTOOLS_METRICS_NAMESPACE": "DeepFake"
+        }
+        
         self.upload_lambda = _lambda.Function(
             self, 'upload_lambda',
             function_name="deepfake_upload_lambda_function",
             runtime=_lambda.Runtime.PYTHON_3_12,
             code=_lambda.Code.from_asset('lambda'),
             handler='upload.lambda_handler',
-            layers=[layer, request_layer, lambda_insights_layer],  # Add Lambda Insights layer
+            layers=[layer, request_layer],
+            insights_version=lambda_insights_version,
+            architecture=architecture,
+            memory_size=profile["memory_mb"],
             tracing=_lambda.Tracing.ACTIVE,
-            timeout=Duration.seconds(30),
+            timeout=Duration.seconds(profile["upload_timeout_seconds"]),
+            reserved_concurrent_executions=profile["reserved_concurrency"],
             log_group=upload_log_group,
-            environment={
-                'BUCKET_NAME': image_bucket.bucket_name,
-                'API_SECRET_ARN': api_secret.secret_arn,
-                "POWERTOOLS_SERVICE_NAME": "DeepFakeApp"
-            }
-            
+            environment=upload_environment
+        )
+        
+        # API Gateway invokes the published alias, so provisioned concurrency
+        # applies to every API call and keeps that many containers initialised
+        self.upload_alias = _lambda.Alias(
+            self, 'upload_lambda_alias',
+            alias_name='live',
+            version=self.upload_lambda.current_version,
+            provisioned_concurrent_executions=profile["provisioned_concurrency"] or None
         )
+        if profile["provisioned_concurrency"]:
+            self.upload_alias.add_auto_scaling(
+                min_capacity=profile["provisioned_concurrency"],
+                max_capacity=profile["max_provisioned_concurrency"]
+            ).scale_on_utilization(utilization_target=PROVISIONED_UTILIZATION_TARGET)
         
         api_secret.grant_read(self.upload_lambda)
-        image_bucket.grant_write(self.upload_lambda)
+        image_bucket.grant_read_write(self.upload_lambda)
+        results_table.grant_read_write_data(self.upload_lambda)
+        self.job_queue.grant_send_messages(self.upload_lambda)
+        
+        # Create Log Group for job worker lambda with DESTROY removal policy
+        worker_log_group = logs.LogGroup(
+            self, 'worker_lambda_log_group',
+            log_group_name=f'/aws/lambda/deepfake_worker_lambda_function',
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_WEEK
+        )
+        
+        # Job worker Lambda - runs queued analyses outside the API Gateway time limit
+        self.worker_lambda = _lambda.Function(
+            self, 'worker_lambda',
+            function_name="deepfake_worker_lambda_function",
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            code=_lambda.Code.from_asset('lambda'),
+            handler='worker.lambda_handler',
+            layers=[layer, request_layer],
+            insights_version=lambda_insights_version,
+            architecture=architecture,
+            memory_size=profile["memory_mb"],
+            tracing=_lambda.Tracing.ACTIVE,
+            timeout=Duration.seconds(profile["worker_timeout_seconds"]),
+            log_group=worker_log_group,
+            environment=upload_environment
+        )
+        
+        # max_concurrency caps how hard a burst of jobs can hit the detection API
+        self.worker_lambda.add_event_source(lambda_event_sources.SqsEventSource(
+            self.job_queue,
+            batch_size=5,
+            max_batching_window=Duration.seconds(1),
+            max_concurrency=10,
+            report_batch_item_failures=True
+        ))
+        
+        api_secret.grant_read(self.worker_lambda)
+        image_bucket.grant_read_write(self.worker_lambda)
+        image_bucket.grant_delete(self.worker_lambda)
+        results_table.grant_read_write_data(self.worker_lambda)
+        
+        # Create Log Group for S3 analysis lambda with DESTROY removal policy
+        s3_analysis_log_group = logs.LogGroup(
+            self, 's3_analysis_lambda_log_group',
+            log_group_name=f'/aws/lambda/deepfake_s3_analysis_lambda_function',
+            removal_policy=RemovalPolicy.DESTROY,
+            retention=logs.RetentionDays.ONE_WEEK
+        )
+        
+        # S3 analysis Lambda - analyses images uploaded through presigned URLs
+        self.s3_analysis_lambda = _lambda.Function(
+            self, 's3_analysis_lambda',
+            function_name="deepfake_s3_analysis_lambda_function",
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            code=_lambda.Code.from_asset('lambda'),
+            handler='s3_analysis.lambda_handler',
+            layers=[layer, request_layer],
+            insights_version=lambda_insights_version,
+            architecture=architecture,
+            memory_size=profile["memory_mb"],
+            tracing=_lambda.Tracing.ACTIVE,
+            timeout=Duration.seconds(profile["worker_timeout_seconds"]),
+            log_group=s3_analysis_log_group,
+            environment=upload_environment
+        )
+        
+        # Routed through EventBridge so the rule can live here without the
+        # bucket's stack depending back on this one
+        events.Rule(
+            self, 'incoming_upload_rule',
+            event_pattern=events.EventPattern(
+                source=["aws.s3"],
+                detail_type=["Object Created"],
+                detail={
+                    "bucket": {"name": [image_bucket.bucket_name]},
+                    "object": {"key": [{"prefix": "incoming/"}]}
+                }
+            ),
+            targets=[events_targets.LambdaFunction(
+                self.s3_analysis_lambda,
+                retry_attempts=0
+            )]
+        )
+        
+        api_secret.grant_read(self.s3_analysis_lambda)
+        image_bucket.grant_read_write(self.s3_analysis_lambda)
+        image_bucket.grant_delete(self.s3_analysis_lambda)
+        results_table.grant_read_write_data(self.s3_analysis_lambda)
         
         # Create Log Group for dashboard lambda with DESTROY removal policy
         dashboard_log_group = logs.LogGroup(
@@ -83,8 +301,10 @@ class LambdaStack(Stack):
             runtime=_lambda.Runtime.PYTHON_3_12,
             code=_lambda.Code.from_asset('lambda'),
             handler='dashboard.lambda_handler',
-            timeout=Duration.minutes(10),
-            memory_size=512,
+            # Only formats two URLs from its environment
+            architecture=architecture,
+            timeout=Duration.seconds(10),
+            memory_size=128,
             log_group=dashboard_log_group,
             environment={
                 "REGION": self.region,
@@ -1,5 +1,5 @@
 from aws_cdk import (
-    # Duration,
+    Duration,
     Stack,
     aws_s3 as s3,
     RemovalPolicy
@@ -14,12 +14,58 @@ class S3Stack(Stack):
         self.image_bucket = s3.Bucket(
             self, "ImageBucket",
             cors=[s3.CorsRule(
-                allowed_methods=[s3.HttpMethods.GET],
+                allowed_methods=[s3.HttpMethods.GET, s3.HttpMethods.PUT],
                 allowed_origins=["*"], 
                 allowed_headers=["*"],
             )],
             removal_policy=RemovalPolicy.RETAIN,
             versioned=True,
-
+            # Object Created events drive analysis of presigned uploads
+            event_bridge_enabled=True,
+            lifecycle_rules=[
+                # Images staged for async jobs are deleted by the worker;
+                # this sweeps up anything left behind by failed jobs
+                s3.LifecycleRule(
+                    id="ExpireStagedJobImages",
+                    prefix="jobs/",
+                    expiration=Duration.days(1),
+                    noncurrent_version_expiration=Duration.days(1),
+                ),
+                s3.LifecycleRule(
+                    id="ExpireIncomingUploads",
+                    prefix="incoming/",
+                    expiration=Duration.days(1),
+                    noncurrent_version_expiration=Duration.days(1),
+                ),
+                # Archived images are rarely read after analysis, so they
+                # move to cheaper storage as they age. They stop at Glacier
+                # Instant Retrieval: re-analysis reads the whole archive
+                # with GetObject, which Deep Archive would refuse until restored
+                s3.LifecycleRule(
+                    id="TierArchivedImages",
+                    prefix="archive/",
+                    transitions=[
+                        s3.Transition(
+                            storage_class=s3.StorageClass.INFREQUENT_ACCESS,
+                            transition_after=Duration.days(30),
+                        ),
+                        s3.Transition(
+                            storage_class=s3.StorageClass.GLACIER_INSTANT_RETRIEVAL,
+                            transition_after=Duration.days(90),
+                        ),
+                    ],
+                    # Small images cost more to transition than they save
+                    object_size_greater_than=128 * 1024,
+                    noncurrent_version_expiration=Duration.days(30),
+                    abort_incomplete_multipart_upload_after=Duration.days(7),
+                ),
+                # Legacy raw/<uuid> objects; once migrated to archive/ their
+                # deleted versions are cleaned up here
+                s3.LifecycleRule(
+                    id="ExpireMigratedRawVersions",
+                    prefix="raw/",
+                    noncurrent_version_expiration=Duration.days(30),
+                ),
+            ],
         )
 
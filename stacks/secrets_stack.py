@@ -4,6 +4,7 @@ from aws_cdk import (
     SecretValue
 )
 from constructs import Construct
+import json
 import os
 from dotenv import load_dotenv
 
@@ -14,13 +15,17 @@ class SecretsStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
-        api_key = os.getenv('api-key')
-        if not api_key:
+        # `api-keys` (comma-separated) stores a pool the upload Lambda spreads
+        # requests across, since the NVIDIA rate limit is per key
+        api_keys = [key.strip() for key in (os.getenv('api-keys') or os.getenv('api-key') or '').split(',') if key.strip()]
+        if not api_keys:
             raise ValueError("api-key not found in .env file")
 
         self.api_key_secret = secretsmanager.Secret(
             self, "ApiKeySecret",
             secret_name="deepfake/api-key",
             description="NVIDIA API Key for DeepFake application",
-            secret_string_value=SecretValue.unsafe_plain_text(api_key)
+            secret_string_value=SecretValue.unsafe_plain_text(
+                api_keys[0] if len(api_keys) == 1 else json.dumps(api_keys)
+            )
         )
\ No newline at end of file
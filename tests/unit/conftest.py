@@ -0,0 +1,10 @@
+import os
+import sys
+
+# Lambda sources are deployed as a flat asset directory, so their modules
+# import each other as top-level names.
+LAMBDA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "lambda")
+sys.path.insert(0, os.path.abspath(LAMBDA_DIR))
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+os.environ.setdefault("BUCKET_NAME", "test-image-bucket")
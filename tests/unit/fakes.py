@@ -0,0 +1,87 @@
+"""
+Stand-ins shared by the unit tests for the Lambda context, API Gateway
+events, S3 and the detection service
+"""
+import json
+import struct
+import zlib
+
+
+class Context:
+    function_name = "worker"
+    memory_limit_in_mb = 128
+    invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:worker"
+    aws_request_id = "request"
+
+    def get_remaining_time_in_millis(self):
+        return 60000
+
+
+def api_event(method, path, body=None):
+    return {
+        "httpMethod": method, "path": path, "resource": path,
+        "headers": {"Content-Type": "application/json"},
+        "requestContext": {"requestId": "id", "stage": "prod"},
+        "body": json.dumps(body) if body is not None else None,
+        "queryStringParameters": None, "pathParameters": None, "isBase64Encoded": False
+    }
+
+
+def tiny_png(value: int = 0) -> bytes:
+    def chunk(kind, data):
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    pixels = zlib.compress(b"\x00" + bytes([value, value, value]))
+    return (b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0))
+            + chunk(b"IDAT", pixels) + chunk(b"IEND", b""))
+
+
+class FakeS3:
+    def __init__(self):
+        self.objects = {}
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket, Key):
+        body = self.objects[Key]
+        return {"Body": type("Body", (), {"read": lambda self: body})()}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop(Key, None)
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+        return f"https://{Params['Bucket']}.s3.amazonaws.com/{Params['Key']}?X-Amz-Expires={ExpiresIn}"
+
+
+def detection(*scores):
+    return {"data": [{"bounding_boxes": [{"is_deepfake": score} for score in scores]}]}
+
+
+class FakeResponse:
+    """
+    A successful detection response with no faces
+    """
+    ok = True
+    status_code = 200
+
+    def json(self):
+        return detection()
+
+
+class FakeHttpResponse:
+    def __init__(self, status_code, headers=None):
+        self.status_code = status_code
+        self.headers = headers or {}
+
+
+class FakeSession:
+    def __init__(self, outcomes):
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    def post(self, url, headers, json, timeout):
+        self.calls.append({"headers": headers, "timeout": timeout})
+        outcome = self.outcomes.pop(0)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
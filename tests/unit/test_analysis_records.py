@@ -0,0 +1,182 @@
+import base64
+import json
+from datetime import datetime, timezone
+
+import pytest
+
+import upload
+from analysis_records import ROLLUP_COUNTERS, AnalysisRecorder, summarize_verdict
+from .fakes import Context, FakeResponse, FakeS3, api_event, detection, tiny_png
+
+
+def timestamp(value):
+    return datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp()
+
+
+class Clock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeTable:
+    name = "results"
+
+    def __init__(self):
+        self.items = {}
+        self.updates = 0
+        self.transactions = []
+        self.meta = type("Meta", (), {"client": self})()
+
+    def transact_write_items(self, TransactItems):
+        self.transactions.append(TransactItems)
+        for entry in TransactItems:
+            (action, request), = entry.items()
+            request = {key: value for key, value in request.items() if key != "TableName"}
+            getattr(self, {"Put": "put_item", "Update": "update_item"}[action])(**request)
+
+    def put_item(self, Item):
+        self.items[(Item["pk"], Item["sk"])] = dict(Item)
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        self.updates += 1
+        item = self.items.setdefault((Key["pk"], Key["sk"]), dict(Key))
+        add, _, assign = UpdateExpression[len("ADD "):].partition(" SET ")
+        for clause in add.split(", "):
+            name, value = clause.split(" ")
+            name = ExpressionAttributeNames.get(name, name)
+            item[name] = item.get(name, 0) + ExpressionAttributeValues[value]
+        if assign:
+            name, value = assign.split(" = ")
+            item[name] = ExpressionAttributeValues[value]
+
+    def rollup(self, granularity, bucket):
+        # Summed across shards, as /stats reads them
+        shards = [item for (pk, sk), item in self.items.items() if pk.startswith(f"ROLLUP#{granularity}") and sk == bucket]
+        total = {name: sum(item.get(name, 0) for item in shards) for name in ROLLUP_COUNTERS}
+        total["expires_at"] = {item.get("expires_at") for item in shards}
+        return total
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues):
+        values = ExpressionAttributeValues
+        items = [item for (pk, sk), item in sorted(self.items.items())
+                 if pk == values[":pk"] and values[":start"] <= sk <= values[":end"]]
+        return {"Items": items}
+
+
+def test_summarize_verdict_uses_the_most_suspicious_face():
+    assert summarize_verdict(detection(0.1, 0.9)) == ("deepfake", 0.9)
+    assert summarize_verdict(detection(0.2)) == ("authentic", 0.2)
+    assert summarize_verdict({"data": [{"bounding_boxes": []}]}) == ("no_face", None)
+
+
+def test_record_is_compact_and_updates_both_rollups():
+    table, clock = FakeTable(), Clock(timestamp("2024-01-31T09:15:00"))
+    recorder = AnalysisRecorder(table, clock=clock)
+    item = recorder.record("abc", detection(0.93), latency_ms=812.4, size_bytes=2048)
+
+    assert item["pk"] == "ANALYSIS#abc"
+    assert item["verdict"] == "deepfake"
+    assert float(item["confidence"]) == pytest.approx(0.93)
+    assert item["latency_ms"] == 812
+    assert table.updates == 2
+    # The record and both increments are one transaction
+    assert [list(entry) for entry in table.transactions[0]] == [["Put"], ["Update"], ["Update"]]
+
+    hour = table.rollup("hour", "2024-01-31T09")
+    day = table.rollup("day", "2024-01-31")
+    for rollup in (hour, day):
+        assert rollup["analyses"] == 1
+        assert rollup["verdict_deepfake"] == 1
+        assert rollup["latency_ms_sum"] == 812
+        assert rollup["bytes_sum"] == 2048
+    assert hour["expires_at"] == {timestamp("2024-01-31T09:00:00") + 35 * 24 * 3600}
+    assert day["expires_at"] == {None}
+
+
+def test_rollups_are_sharded_and_summed_by_stats(monkeypatch):
+    table, clock = FakeTable(), Clock(timestamp("2024-01-31T09:15:00"))
+    recorder = AnalysisRecorder(table, rollup_shards=4, clock=clock)
+    shards = iter([0, 1, 2, 3, 0, 1])
+    monkeypatch.setattr("analysis_records.random.randrange", lambda count: next(shards))
+    for i in range(6):
+        recorder.record(f"h{i}", detection(0.2), latency_ms=10, size_bytes=1)
+    # Counters written before sharding are still counted
+    table.update_item(Key={"pk": "ROLLUP#hour", "sk": "2024-01-31T09"}, UpdateExpression="ADD analyses :n",
+                      ExpressionAttributeNames={}, ExpressionAttributeValues={":n": 4})
+
+    partitions = {pk for pk, sk in table.items if pk.startswith("ROLLUP#hour")}
+    assert partitions == {"ROLLUP#hour", "ROLLUP#hour#0", "ROLLUP#hour#1", "ROLLUP#hour#2", "ROLLUP#hour#3"}
+    stats = recorder.stats("hour", periods=1)
+    assert stats["totals"]["analyses"] == 10
+    assert stats["totals"]["verdict_authentic"] == 6
+
+
+def test_stats_reads_buckets_and_fills_gaps():
+    table, clock = FakeTable(), Clock(timestamp("2024-01-31T07:59:00"))
+    recorder = AnalysisRecorder(table, clock=clock)
+    recorder.record("a", detection(0.9), latency_ms=100, size_bytes=10)
+    clock.now = timestamp("2024-01-31T09:05:00")
+    recorder.record("b", detection(0.1), latency_ms=300, size_bytes=20, cache_hit=True)
+    recorder.record("c", {}, latency_ms=200, size_bytes=30)
+
+    stats = recorder.stats("hour", periods=3)
+    assert [bucket["bucket"] for bucket in stats["buckets"]] == ["2024-01-31T07", "2024-01-31T08", "2024-01-31T09"]
+    assert stats["buckets"][1]["analyses"] == 0
+    assert stats["buckets"][2]["verdict_authentic"] == 1
+    assert stats["buckets"][2]["verdict_no_face"] == 1
+    assert stats["totals"]["analyses"] == 3
+    assert stats["totals"]["cache_hits"] == 1
+    assert stats["totals"]["avg_latency_ms"] == 200.0
+
+    assert recorder.stats("day", periods=1)["totals"]["bytes_sum"] == 60
+
+
+def test_upload_records_analysis_and_serves_stats(monkeypatch):
+    table = FakeTable()
+    monkeypatch.setattr(upload, "analysis_recorder", AnalysisRecorder(table))
+    monkeypatch.setattr(upload.verdict_cache, "get", lambda digest: (None, None))
+    monkeypatch.setattr(upload.verdict_cache, "put", lambda digest, verdict: None)
+    monkeypatch.setattr(upload.archiver, "s3_client", FakeS3())
+    monkeypatch.setattr(upload.detection_client, "detect", lambda payload, deadline=None: FakeResponse())
+
+    event = api_event("POST", "/upload", {"image": base64.b64encode(tiny_png(5)).decode()})
+    assert json.loads(upload.lambda_handler(event, Context())["body"])["statusCode"] == 200
+    # Written off the response path
+    upload.analysis_recorder.flush(timeout=5)
+    records = [item for (pk, _), item in table.items.items() if pk.startswith("ANALYSIS#")]
+    assert len(records) == 1
+    assert records[0]["verdict"] == "no_face"
+
+    event = api_event("GET", "/stats", None)
+    event["queryStringParameters"] = {"granularity": "day", "periods": "7"}
+    body = json.loads(upload.lambda_handler(event, Context())["body"])["body"]
+    assert len(body["buckets"]) == 7
+    assert body["totals"]["analyses"] == 1
+
+
+def test_stats_rejects_unknown_granularity(monkeypatch):
+    monkeypatch.setattr(upload, "analysis_recorder", AnalysisRecorder(FakeTable()))
+    event = api_event("GET", "/stats", None)
+    event["queryStringParameters"] = {"granularity": "minute"}
+    response = upload.lambda_handler(event, Context())
+    assert response["statusCode"] == 400
+    assert json.loads(response["body"])["statusCode"] == 400
+    event["queryStringParameters"] = {"periods": "soon"}
+    assert upload.lambda_handler(event, Context())["statusCode"] == 400
+
+    monkeypatch.setattr(upload, "analysis_recorder", None)
+    assert upload.lambda_handler(api_event("GET", "/stats", None), Context())["statusCode"] == 503
+
+
+def test_failed_background_record_is_counted_not_raised():
+    class BrokenTable(FakeTable):
+        def transact_write_items(self, TransactItems):
+            raise RuntimeError("TransactionCanceledException")
+
+    recorder = AnalysisRecorder(BrokenTable())
+    recorder.submit("abc", detection(0.4), latency_ms=5, size_bytes=1)
+    recorder.flush(timeout=5)
+    assert recorder.write_stats == {"records": 0, "failures": 1}
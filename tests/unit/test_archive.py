@@ -0,0 +1,88 @@
+import os
+import sys
+import threading
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+from archive import ImageArchiver, archive_key  # noqa: E402
+from aws_stubs import InMemoryS3  # noqa: E402
+from migrate_archive import ArchiveMigration  # noqa: E402
+from verdict_cache import content_hash  # noqa: E402
+from .fakes import tiny_png  # noqa: E402
+
+
+class PreconditionFailed(Exception):
+    response = {"Error": {"Code": "PreconditionFailed"}}
+
+
+class FakeS3:
+    def __init__(self, fail=False, gate=None):
+        self.fail = fail
+        self.gate = gate
+        self.objects = {}
+        self.puts = 0
+
+    def put_object(self, Bucket, Key, Body, ContentType, IfNoneMatch=None):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("S3 unavailable")
+        self.puts += 1
+        if IfNoneMatch == "*" and Key in self.objects:
+            raise PreconditionFailed()
+        self.objects[Key] = Body
+
+
+def test_durable_mode_waits_for_write():
+    s3 = FakeS3()
+    archiver = ImageArchiver(s3, "bucket")
+    key = archiver.wait(archiver.submit(b"image"))
+    assert s3.objects[key] == b"image"
+
+
+def test_failed_write_does_not_raise():
+    archiver = ImageArchiver(FakeS3(fail=True), "bucket")
+    assert archiver.wait(archiver.submit(b"image")) is None
+    assert archiver.stats["failures"] == 1
+
+
+def test_fire_and_forget_does_not_block():
+    gate = threading.Event()
+    s3 = FakeS3(gate=gate)
+    archiver = ImageArchiver(s3, "bucket", mode="fire-and-forget")
+    future = archiver.submit(b"image")
+    assert archiver.wait(future) is None
+    assert not future.done()
+    gate.set()
+    future.result(5)
+    assert len(s3.objects) == 1
+
+
+def test_identical_images_are_archived_once_under_their_hash():
+    s3 = FakeS3()
+    archiver = ImageArchiver(s3, "bucket")
+    first = archiver.wait(archiver.submit(b"image", extension="png"))
+    second = archiver.wait(archiver.submit(b"image", extension="png"))
+    digest = content_hash(b"image")
+    assert first == second == f"archive/{digest[:2]}/{digest[2:4]}/{digest}.png"
+    assert list(s3.objects) == [first]
+    assert archiver.stats == {"writes": 1, "deduplicated": 1, "failures": 0}
+
+
+def test_precomputed_digest_is_used_for_the_key():
+    s3 = FakeS3()
+    archiver = ImageArchiver(s3, "bucket")
+    assert archiver.wait(archiver.submit(b"image", digest="ab" * 32)) == archive_key("ab" * 32, "jpg")
+
+
+def test_migration_replaces_legacy_content_type():
+    s3 = InMemoryS3()
+    image = tiny_png()
+    s3.put_object(Bucket="bucket", Key="raw/legacy.jpg", Body=image, ContentType="image/jpeg")
+
+    target = ArchiveMigration(s3, "bucket").migrate_object("raw/legacy.jpg")
+
+    assert target == archive_key(content_hash(image), "png")
+    assert s3.head_object(Bucket="bucket", Key=target)["ContentType"] == "image/png"
@@ -0,0 +1,111 @@
+import base64
+import json
+import threading
+import time
+
+import pytest
+
+import upload
+from batch import run_batch, summarize_batch
+from .fakes import Context, api_event
+
+
+def load(item):
+    return base64.b64decode(item["image"])
+
+
+def encoded(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+def test_duplicates_are_analysed_once():
+    calls = []
+
+    def analyze(image_data):
+        calls.append(image_data)
+        return {"detection_result": {"size": len(image_data)}}
+
+    items = [{"id": "a", "image": encoded(b"one")},
+             {"id": "b", "image": encoded(b"two")},
+             {"id": "c", "image": encoded(b"one")}]
+    results = run_batch(items, load, analyze, max_concurrency=4)
+
+    assert sorted(calls) == [b"one", b"two"]
+    assert [r["id"] for r in results] == ["a", "b", "c"]
+    assert results[2]["deduplicated"] is True
+    assert summarize_batch(results)["deduplicated"] == 1
+
+
+def test_item_errors_do_not_fail_the_batch():
+    def analyze(image_data):
+        if image_data == b"bad":
+            raise RuntimeError("Detection API returned 500")
+        return {"detection_result": {}}
+
+    items = [{"id": "ok", "image": encoded(b"good")},
+             {"id": "broken", "image": encoded(b"bad")},
+             {"id": "missing"}]
+    results = run_batch(items, load, analyze, max_concurrency=2)
+
+    assert [r["status"] for r in results] == ["ok", "error", "error"]
+    assert results[1]["error"] == "Detection API returned 500"
+    assert summarize_batch(results)["failed"] == 2
+
+
+def test_concurrency_is_bounded():
+    lock = threading.Lock()
+    in_flight = [0]
+    peak = [0]
+
+    def analyze(image_data):
+        with lock:
+            in_flight[0] += 1
+            peak[0] = max(peak[0], in_flight[0])
+        time.sleep(0.01)
+        with lock:
+            in_flight[0] -= 1
+        return {}
+
+    items = [{"image": encoded(bytes([i]))} for i in range(20)]
+    run_batch(items, load, analyze, max_concurrency=3)
+    assert peak[0] <= 3
+
+
+def test_images_are_loaded_only_as_analysis_slots_free_up():
+    lock = threading.Lock()
+    resident = [0]
+    peak = [0]
+
+    def tracked_load(item):
+        with lock:
+            resident[0] += 1
+            peak[0] = max(peak[0], resident[0])
+        return load(item)
+
+    def analyze(image_data):
+        time.sleep(0.01)
+        with lock:
+            resident[0] -= 1
+        return {}
+
+    items = [{"image": encoded(bytes([i]))} for i in range(20)]
+    results = run_batch(items, tracked_load, analyze, max_concurrency=3)
+    assert [r["status"] for r in results] == ["ok"] * 20
+    assert peak[0] <= 3
+
+
+def test_items_past_deadline_are_reported():
+    items = [{"image": encoded(b"late")}]
+    results = run_batch(items, load, lambda data: {}, max_concurrency=1, deadline=time.monotonic() - 1)
+    assert results[0]["error"] == "Batch deadline exceeded"
+
+
+@pytest.mark.parametrize("body, error", [
+    ({}, "No images provided"),
+    ({"images": [{"image": "x"}], "concurrency": "many"}, "concurrency must be an integer"),
+    ({"images": [{"image": "x"}], "concurrency": 0}, "concurrency must be at least 1"),
+])
+def test_invalid_batch_requests_get_http_400(body, error):
+    response = upload.lambda_handler(api_event("POST", "/upload/batch", body), Context())
+    assert response["statusCode"] == 400
+    assert json.loads(response["body"])["body"]["error"] == error
@@ -0,0 +1,116 @@
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "benchmarks")))
+
+from detection_backends import (DetectionBackend, HedgedDetector, normalize_faces_v1,  # noqa: E402
+                                parse_backend_specs)
+from detection_client import DetectionClient  # noqa: E402
+from flow_control import DetectionUnavailableError  # noqa: E402
+from secret_provider import SecretProvider  # noqa: E402
+from stub_detection_server import StubConfig, StubDetectionServer  # noqa: E402
+
+
+class Response:
+    def __init__(self, status_code=200, body=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.body = body if body is not None else {"data": []}
+        self.closed = False
+
+    def json(self):
+        return self.body
+
+    def close(self):
+        self.closed = True
+
+
+class ScriptedClient:
+    """
+    Detection client whose calls take `delay` seconds and return `response`
+    """
+
+    def __init__(self, delay=0.0, response=None, error=None):
+        self.delay = delay
+        self.response = response or Response()
+        self.error = error
+        self.calls = 0
+        self.finished = threading.Event()
+
+    def detect(self, payload, deadline=None):
+        self.calls += 1
+        time.sleep(self.delay)
+        self.finished.set()
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+def detector(primary, secondary, **kwargs):
+    kwargs.setdefault("initial_hedge_delay", 0.05)
+    return HedgedDetector([DetectionBackend("primary", primary), DetectionBackend("secondary", secondary)], **kwargs)
+
+
+def test_fast_primary_is_never_hedged():
+    primary, secondary = ScriptedClient(), ScriptedClient()
+    hedged = detector(primary, secondary)
+    for _ in range(5):
+        assert hedged.detect({}).backend.name == "primary"
+    assert secondary.calls == 0
+    assert hedged.stats["hedged"] == 0
+
+
+def test_slow_primary_is_hedged_and_loser_discarded():
+    slow = Response()
+    primary, secondary = ScriptedClient(delay=0.5, response=slow), ScriptedClient(delay=0.01)
+    hedged = detector(primary, secondary)
+    started = time.monotonic()
+    response = hedged.detect({})
+    assert time.monotonic() - started < 0.3
+    assert response.backend.name == "secondary" and response.hedged
+    assert hedged.stats["hedge_wins"] == 1 and hedged.hedge_win_ratio() == 1.0
+    assert primary.finished.wait(1)
+    time.sleep(0.05)
+    assert slow.closed
+
+
+def test_failed_primary_is_hedged_immediately_and_errors_surface_when_all_fail():
+    primary = ScriptedClient(error=DetectionUnavailableError(5, "circuit open"))
+    hedged = detector(primary, ScriptedClient(), initial_hedge_delay=10)
+    assert hedged.detect({}).backend.name == "secondary"
+
+    hedged = detector(primary, ScriptedClient(response=Response(503)), initial_hedge_delay=10)
+    with pytest.raises(DetectionUnavailableError):
+        hedged.detect({})
+
+
+def test_hedge_delay_follows_primary_p95():
+    hedged = detector(ScriptedClient(), ScriptedClient(), min_samples=20, min_hedge_delay=0.01)
+    assert hedged.hedge_delay() == 0.05
+    for i in range(100):
+        hedged.primary.latency.add((i + 1) / 100)
+    assert hedged.hedge_delay() == pytest.approx(0.96)
+
+
+def test_alternate_schema_is_normalized_to_hive_shape():
+    with StubDetectionServer(StubConfig(schema="faces-v1")) as server:
+        client = DetectionClient(SecretProvider(lambda: ""), invoke_url=server.url, max_attempts=1)
+        response = HedgedDetector([DetectionBackend("local", client, schema="faces-v1")]).detect({"input": []})
+    box = response.json()["data"][0]["bounding_boxes"][0]
+    assert box["is_deepfake"] == 0.08
+    assert box["vertices"] == [{"x": 10, "y": 12}, {"x": 200, "y": 240}]
+    assert normalize_faces_v1({"faces": []})["data"][0]["bounding_boxes"] == []
+
+
+def test_backend_specs_are_validated():
+    assert parse_backend_specs('[{"name": "local", "url": "http://localhost:8599", "auth": "none"}]') == [
+        {"name": "local", "url": "http://localhost:8599", "schema": "nvidia-hive", "auth": "none"}]
+    assert parse_backend_specs("") == []
+    with pytest.raises(ValueError):
+        parse_backend_specs('[{"name": "x", "url": "http://x", "schema": "other"}]')
+    with pytest.raises(ValueError):
+        parse_backend_specs('{"name": "x"}')
@@ -0,0 +1,63 @@
+import time
+
+import pytest
+import requests
+
+import detection_client
+from detection_client import DetectionClient
+from secret_provider import SecretProvider
+from .fakes import FakeHttpResponse, FakeSession
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(detection_client.time, "sleep", sleeps.append)
+    return sleeps
+
+
+def make_client(outcomes, keys=("key",), **kwargs):
+    keys = iter(keys)
+    session = FakeSession(outcomes)
+    client = DetectionClient(SecretProvider(lambda: next(keys)), session=session, **kwargs)
+    return client, session
+
+
+def test_retries_throttling_and_honours_retry_after(no_sleep):
+    client, session = make_client([FakeHttpResponse(429, {"Retry-After": "2"}), FakeHttpResponse(200)])
+    assert client.detect({}, deadline=time.monotonic() + 30).status_code == 200
+    assert len(session.calls) == 2
+    assert no_sleep[0] >= 2
+
+
+def test_gives_up_when_backoff_would_pass_deadline(no_sleep):
+    client, session = make_client([FakeHttpResponse(503, {"Retry-After": "10"})])
+    assert client.detect({}, deadline=time.monotonic() + 5).status_code == 503
+    assert no_sleep == []
+
+
+def test_does_not_retry_client_errors():
+    client, session = make_client([FakeHttpResponse(400)])
+    assert client.detect({}).status_code == 400
+    assert len(session.calls) == 1
+
+
+def test_rejected_key_is_refreshed_once():
+    client, session = make_client([FakeHttpResponse(401), FakeHttpResponse(200)], keys=("old", "new"))
+    assert client.detect({}).status_code == 200
+    assert session.calls[1]["headers"]["Authorization"] == "Bearer new"
+
+
+def test_connection_errors_are_raised_after_max_attempts():
+    client, session = make_client([requests.ConnectionError()] * 2, max_attempts=2)
+    with pytest.raises(requests.ConnectionError):
+        client.detect({}, deadline=time.monotonic() + 30)
+    assert len(session.calls) == 2
+
+
+def test_timeouts_are_split_and_capped_by_deadline():
+    client, session = make_client([FakeHttpResponse(200)], connect_timeout=3, read_timeout=25)
+    client.detect({}, deadline=time.monotonic() + 10)
+    connect, read = session.calls[0]["timeout"]
+    assert connect == 3
+    assert read <= 10
@@ -0,0 +1,168 @@
+import base64
+import json
+import time
+
+import pytest
+
+import detection_client
+import upload
+from detection_client import DetectionClient
+from flow_control import (AdaptiveConcurrencyLimiter, BreakerStateStore, CircuitBreaker, DetectionGuard,
+                          DetectionUnavailableError, TokenBucket)
+from secret_provider import SecretProvider
+from .fakes import Context, FakeHttpResponse, FakeS3, FakeSession, api_event, tiny_png
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeTable:
+    def __init__(self):
+        self.items = {}
+        self.reads = 0
+
+    def get_item(self, Key):
+        self.reads += 1
+        item = self.items.get((Key["pk"], Key["sk"]))
+        return {"Item": item} if item else {}
+
+    def put_item(self, Item):
+        self.items[(Item["pk"], Item["sk"])] = Item
+
+
+@pytest.fixture(autouse=True)
+def no_sleep(monkeypatch):
+    monkeypatch.setattr(detection_client.time, "sleep", lambda seconds: None)
+
+
+def test_token_bucket_paces_after_burst():
+    clock, sleeps = Clock(), []
+    bucket = TokenBucket(rate=2, burst=2, clock=clock, sleep=sleeps.append)
+    bucket.acquire(deadline=clock.now + 10)
+    bucket.acquire(deadline=clock.now + 10)
+    assert sleeps == []
+    bucket.acquire(deadline=clock.now + 10)
+    assert sleeps == [0.5]
+
+
+def test_token_bucket_refuses_waits_past_deadline():
+    clock = Clock()
+    bucket = TokenBucket(rate=0.1, burst=1, clock=clock, sleep=lambda s: None)
+    bucket.acquire(deadline=clock.now + 1)
+    with pytest.raises(DetectionUnavailableError) as error:
+        bucket.acquire(deadline=clock.now + 1)
+    assert error.value.retry_after == pytest.approx(10)
+
+
+def test_limiter_increases_additively_and_halves_on_throttling():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=8, initial_limit=4)
+    for _ in range(4):
+        limiter.acquire(deadline=time.monotonic() + 1)
+        limiter.release(latency=0.1, overloaded=False)
+    assert limiter.limit == pytest.approx(5, abs=0.2)
+    limiter.acquire(deadline=time.monotonic() + 1)
+    limiter.release(latency=0.1, overloaded=True)
+    assert limiter.limit == pytest.approx(2.5, abs=0.1)
+    limiter.acquire(deadline=time.monotonic() + 1)
+    limiter.release(latency=30, overloaded=False)
+    assert limiter.limit == pytest.approx(1.25, abs=0.1)
+
+
+def test_limiter_rejects_when_full_past_deadline():
+    limiter = AdaptiveConcurrencyLimiter(max_limit=1)
+    limiter.acquire(deadline=time.monotonic() + 1)
+    with pytest.raises(DetectionUnavailableError):
+        limiter.acquire(deadline=time.monotonic() + 0.01)
+
+
+def test_breaker_opens_after_consecutive_failures_and_probes_after_cooldown():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=30, clock=clock)
+    for _ in range(3):
+        assert breaker.before_call() is False
+        breaker.record(failed=True)
+
+    with pytest.raises(DetectionUnavailableError) as error:
+        breaker.before_call()
+    assert error.value.retry_after == pytest.approx(30)
+
+    clock.now += 31
+    assert breaker.before_call() is True
+    with pytest.raises(DetectionUnavailableError):
+        breaker.before_call()
+    breaker.record(failed=False, probe=True)
+    assert breaker.before_call() is False
+
+
+def test_failed_probe_reopens_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, clock=clock)
+    breaker.record(failed=True)
+    clock.now += 11
+    assert breaker.before_call() is True
+    breaker.record(failed=True, probe=True)
+    with pytest.raises(DetectionUnavailableError):
+        breaker.before_call()
+
+
+def test_throttling_neither_trips_nor_resets_the_breaker():
+    clock = Clock()
+    breaker = CircuitBreaker(failure_threshold=2, cooldown=10, clock=clock)
+    guard = DetectionGuard(circuit_breaker=breaker)
+    for _ in range(5):
+        guard.release(0.1, 429)
+    breaker.before_call()
+    assert breaker.stats["throttled"] == 5
+
+    guard.release(0.1, 503)
+    guard.release(0.1, 429)
+    guard.release(0.1, 503)
+    with pytest.raises(DetectionUnavailableError):
+        breaker.before_call()
+
+
+def test_open_state_is_shared_between_containers():
+    clock, table = Clock(), FakeTable()
+    first = CircuitBreaker(failure_threshold=1, cooldown=30, clock=clock,
+                           store=BreakerStateStore(table, sync_interval=2, clock=clock))
+    second = CircuitBreaker(failure_threshold=1, cooldown=30, clock=clock,
+                            store=BreakerStateStore(table, sync_interval=2, clock=clock))
+    second.before_call()
+    first.record(failed=True)
+
+    # The second container's cached read is still fresh
+    second.before_call()
+    clock.now += 2
+    with pytest.raises(DetectionUnavailableError):
+        second.before_call()
+
+
+def test_client_stops_retrying_once_breaker_opens():
+    guard = DetectionGuard(circuit_breaker=CircuitBreaker(failure_threshold=2, cooldown=30))
+    session = FakeSession([FakeHttpResponse(503)] * 4)
+    client = DetectionClient(SecretProvider(lambda: "key"), session=session, guard=guard)
+    with pytest.raises(DetectionUnavailableError):
+        client.detect({}, deadline=time.monotonic() + 30)
+    assert len(session.calls) == 2
+    with pytest.raises(DetectionUnavailableError):
+        client.detect({}, deadline=time.monotonic() + 30)
+    assert len(session.calls) == 2
+
+
+def test_upload_returns_503_with_retry_after(monkeypatch):
+    def unavailable(payload, deadline=None):
+        raise DetectionUnavailableError(12.3, "circuit open")
+
+    monkeypatch.setattr(upload.detection_client, "detect", unavailable)
+    monkeypatch.setattr(upload.verdict_cache, "get", lambda digest: (None, None))
+    monkeypatch.setattr(upload.archiver, "s3_client", FakeS3())
+    event = api_event("POST", "/upload", {"image": base64.b64encode(tiny_png(7)).decode()})
+    response = upload.lambda_handler(event, Context())
+    assert response["statusCode"] == 503
+    assert response["multiValueHeaders"]["Retry-After"] == ["13"]
+    assert json.loads(response["body"])["body"]["error"] == "Detection service is temporarily unavailable"
@@ -0,0 +1,100 @@
+import json
+
+import pytest
+
+import upload
+from analysis_records import AnalysisRecorder
+from history import AnalysisHistory, HistoryQueryError, partitions_for
+from .fakes import Context, api_event, detection
+
+
+class FakeIndexTable:
+    def __init__(self):
+        self.items = []
+        self.queries = []
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+    def query(self, IndexName, KeyConditionExpression, ExpressionAttributeValues, ExpressionAttributeNames,
+              ProjectionExpression, ScanIndexForward, Limit, ExclusiveStartKey=None):
+        self.queries.append(ExpressionAttributeValues[":pk"])
+        values = ExpressionAttributeValues
+        matches = sorted((item for item in self.items if item["history_pk"] == values[":pk"]
+                          and values[":lower"] <= item["history_sk"] <= values[":upper"]),
+                         key=lambda item: item["history_sk"], reverse=not ScanIndexForward)
+        if ExclusiveStartKey is not None:
+            matches = [item for item in matches if item["history_sk"] < ExclusiveStartKey["history_sk"]]
+        projected = [ExpressionAttributeNames[name] for name in ProjectionExpression.split(", ")]
+        page = {"Items": [{key: item[key] for key in projected if key in item} for item in matches[:Limit]]}
+        if len(matches) > Limit:
+            page["LastEvaluatedKey"] = {"history_sk": matches[Limit - 1]["history_sk"]}
+        return page
+
+
+def seeded(scores):
+    table = FakeIndexTable()
+    recorder = AnalysisRecorder(table)
+    for i, score in enumerate(scores):
+        result = detection(score) if score is not None else {}
+        table.put_item(recorder.build_record(f"hash{i}", result, latency_ms=100, size_bytes=10,
+                                             cache_hit=False, now=1_700_000_000 + i))
+    return table
+
+
+def test_keyset_pages_cover_every_record_once_newest_first():
+    table = seeded([0.1, 0.95, None, 0.7, 0.3, 0.55, 0.2, 0.99])
+    history = AnalysisHistory(table)
+    hashes, cursor = [], None
+    while True:
+        page = history.query(limit=3, cursor=cursor, fields=["image_hash"])
+        hashes += [item["image_hash"] for item in page["items"]]
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+    assert hashes == [f"hash{i}" for i in reversed(range(8))]
+
+
+def test_filters_read_only_matching_partitions():
+    assert partitions_for("deepfake", 0.9, None) == ["HISTORY#deepfake#9"]
+    assert len(partitions_for(None, None, None)) == 12
+
+    table = seeded([0.91, 0.89, 0.97, 0.2])
+    page = AnalysisHistory(table).query(verdict="deepfake", min_confidence=0.95)
+    assert [item["image_hash"] for item in page["items"]] == ["hash2"]
+    assert set(table.queries) == {"HISTORY#deepfake#9"}
+
+
+def test_time_range_and_projection():
+    table = seeded([0.1] * 5)
+    page = AnalysisHistory(table).query(start_ms=1_700_000_001_000, end_ms=1_700_000_003_000,
+                                        fields=["image_hash", "verdict"])
+    assert [item["image_hash"] for item in page["items"]] == ["hash3", "hash2", "hash1"]
+    assert all(set(item) == {"image_hash", "verdict"} for item in page["items"])
+
+
+def test_rejects_unknown_fields_and_bad_cursor():
+    history = AnalysisHistory(FakeIndexTable())
+    with pytest.raises(HistoryQueryError):
+        history.query(fields=["pk"])
+    with pytest.raises(HistoryQueryError):
+        history.query(cursor="not-a-cursor")
+
+
+def test_history_route(monkeypatch):
+    monkeypatch.setattr(upload, "analysis_history", AnalysisHistory(seeded([0.8, 0.1])))
+    event = api_event("GET", "/history", None)
+    event["queryStringParameters"] = {"verdict": "deepfake", "fields": "image_hash,confidence"}
+    body = json.loads(upload.lambda_handler(event, Context())["body"])
+    assert body["statusCode"] == 200
+    assert body["body"]["items"] == [{"image_hash": "hash0", "confidence": 0.8}]
+    assert body["body"]["next_cursor"] is None
+
+    for params in ({"verdict": "maybe"}, {"cursor": "not-a-cursor"}, {"limit": "ten"}, {"limit": "0"}):
+        event["queryStringParameters"] = params
+        response = upload.lambda_handler(event, Context())
+        assert response["statusCode"] == 400
+        assert json.loads(response["body"])["statusCode"] == 400
+
+    monkeypatch.setattr(upload, "analysis_history", None)
+    assert upload.lambda_handler(api_event("GET", "/history", None), Context())["statusCode"] == 503
@@ -0,0 +1,50 @@
+import io
+
+import pytest
+
+from image_processing import normalize_image, scale_detection_result, sniff_format
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def encode(width, height, image_format):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 30, 30)).save(output, format=image_format)
+    return output.getvalue()
+
+
+@pytest.mark.parametrize("image_format, expected", [
+    ("JPEG", "jpeg"), ("PNG", "png"), ("GIF", "gif"), ("WEBP", "webp"), ("BMP", "bmp"), ("TIFF", "tiff"),
+])
+def test_sniff_format_from_magic_bytes(image_format, expected):
+    assert sniff_format(encode(8, 8, image_format)) == expected
+
+
+def test_sniff_format_rejects_non_images():
+    assert sniff_format(b"<html></html>") is None
+
+
+def test_small_supported_images_pass_through():
+    data = encode(640, 480, "PNG")
+    normalized = normalize_image(data, max_edge=1024)
+    assert normalized.data is data
+    assert normalized.scale == (1.0, 1.0)
+
+
+def test_large_images_are_downscaled_to_jpeg():
+    normalized = normalize_image(encode(4000, 3000, "PNG"), max_edge=1000)
+    assert normalized.format == "jpeg"
+    assert normalized.size == (1000, 750)
+    assert normalized.scale == (4.0, 4.0)
+
+
+def test_unsupported_formats_are_reencoded():
+    normalized = normalize_image(encode(64, 64, "BMP"), max_edge=1000)
+    assert normalized.format == "jpeg"
+    assert normalized.mime_type == "image/jpeg"
+
+
+def test_bounding_boxes_mapped_to_original_coordinates():
+    result = {"data": [{"bounding_boxes": [{"vertices": [{"x": 10, "y": 20}, {"x": 100, "y": 75}]}]}]}
+    scale_detection_result(result, (4.0, 4.0))
+    assert result["data"][0]["bounding_boxes"][0]["vertices"] == [{"x": 40, "y": 80}, {"x": 400, "y": 300}]
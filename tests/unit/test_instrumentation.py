@@ -0,0 +1,79 @@
+import base64
+import json
+
+import pytest
+
+import upload
+from instrumentation import metrics
+from .fakes import Context, FakeResponse, FakeS3, api_event, tiny_png
+
+
+def emf_records(output):
+    return [json.loads(line) for line in output.splitlines() if line.startswith("{") and '"_aws"' in line]
+
+
+@pytest.fixture
+def stubbed(monkeypatch):
+    # Drop anything buffered by tests that call analyze_image outside a handler
+    metrics.clear_metrics()
+    monkeypatch.setattr(upload.verdict_cache, "get", lambda digest: (None, None))
+    monkeypatch.setattr(upload.verdict_cache, "put", lambda digest, verdict: None)
+    monkeypatch.setattr(upload.archiver, "s3_client", FakeS3())
+
+    def detect(payload, deadline=None):
+        upload.detection_client.stats["attempts"] += 2
+        upload.detection_client.stats["retries"] += 1
+        return FakeResponse()
+
+    monkeypatch.setattr(upload.detection_client, "detect", detect)
+
+
+def test_upload_emits_one_emf_record_with_stage_timings(stubbed, capsys):
+    event = api_event("POST", "/upload", {"image": base64.b64encode(tiny_png(3)).decode()})
+    upload.lambda_handler(event, Context())
+
+    records = emf_records(capsys.readouterr().out)
+    assert len(records) == 1
+    record = records[0]
+    declared = {metric["Name"]: metric["Unit"] for metric in record["_aws"]["CloudWatchMetrics"][0]["Metrics"]}
+    for name in ("PreflightLatency", "DecodeLatency", "CacheLookupLatency", "NormalizeLatency",
+                 "DetectionLatency", "ArchiveWaitLatency"):
+        assert declared[name] == "Milliseconds"
+        assert len(record[name]) == 1 and record[name][0] >= 0
+    assert declared["ImageBytes"] == "Bytes"
+    assert record["ImageBytes"] == [len(tiny_png(3))]
+    assert record["CacheMiss"] == [1]
+    assert record["DetectionAttempts"] == [2]
+    assert record["DetectionRetries"] == [1]
+    assert record["service"] == "ReceiptApp"
+
+
+def test_batch_records_every_item_in_the_same_line(stubbed, capsys):
+    images = [{"id": str(i), "image": base64.b64encode(tiny_png(i)).decode()} for i in range(3)]
+    upload.lambda_handler(api_event("POST", "/upload/batch", {"images": images}), Context())
+
+    records = emf_records(capsys.readouterr().out)
+    assert len(records) == 1
+    assert len(records[0]["DetectionLatency"]) == 3
+    # CloudWatch aggregates every value in the list
+    assert sum(records[0]["CacheMiss"]) == 3
+
+
+def test_per_key_counters_get_their_own_line_with_the_key_name(stubbed, monkeypatch, capsys):
+    counters = {"key-a": {"requests": 4, "throttles": 1}, "key-b": {"requests": 2, "throttles": 0}}
+    monkeypatch.setattr(upload, "api_key_pool", type("Pool", (), {"stats": {}, "key_stats": lambda self: {
+        name: dict(values) for name, values in counters.items()}})())
+
+    def detect(payload, deadline=None):
+        counters["key-a"]["requests"] += 2
+        counters["key-a"]["throttles"] += 1
+        return FakeResponse()
+
+    monkeypatch.setattr(upload.detection_client, "detect", detect)
+    upload.lambda_handler(api_event("POST", "/upload", {"image": base64.b64encode(tiny_png(7)).decode()}), Context())
+
+    per_key = [record for record in emf_records(capsys.readouterr().out) if "ApiKey" in record]
+    assert len(per_key) == 1
+    assert per_key[0]["ApiKey"] == "key-a"
+    assert per_key[0]["_aws"]["CloudWatchMetrics"][0]["Dimensions"] == [["ApiKey", "service"]]
+    assert per_key[0]["ApiKeyRequests"] == [2] and per_key[0]["ApiKeyThrottles"] == [1]
@@ -0,0 +1,210 @@
+import base64
+import json
+import uuid
+
+import pytest
+from aws_lambda_powertools.utilities.batch.exceptions import BatchProcessingError
+
+import s3_analysis
+import upload
+import worker
+from jobs import JobQueue, JobStore
+from .fakes import Context, FakeS3, api_event, tiny_png
+
+
+class FakeTable:
+    def __init__(self):
+        self.items = {}
+
+    def put_item(self, Item):
+        self.items[(Item["pk"], Item["sk"])] = dict(Item)
+
+    def get_item(self, Key):
+        item = self.items.get((Key["pk"], Key["sk"]))
+        return {"Item": dict(item)} if item else {}
+
+    def update_item(self, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        item = self.items.setdefault((Key["pk"], Key["sk"]), dict(Key))
+        for assignment in UpdateExpression[len("SET "):].split(", "):
+            name, value = assignment.split(" = ")
+            item[ExpressionAttributeNames.get(name, name)] = ExpressionAttributeValues[value]
+
+
+class InMemoryQueue:
+    """
+    Stands in for SQS: collects sent messages and delivers them to the
+    worker as SQS events, redelivering records reported as failed
+    """
+
+    def __init__(self):
+        self.messages = []
+
+    def send_message(self, QueueUrl, MessageBody):
+        self.messages.append({"messageId": str(uuid.uuid4()), "body": MessageBody, "receive_count": 0})
+
+    def deliver(self, handler, max_rounds=5):
+        dead_letters = []
+        for _ in range(max_rounds):
+            if not self.messages:
+                break
+            batch, self.messages = self.messages, []
+            records = []
+            for message in batch:
+                message["receive_count"] += 1
+                records.append({
+                    "messageId": message["messageId"],
+                    "body": message["body"],
+                    "eventSource": "aws:sqs",
+                    "attributes": {"ApproximateReceiveCount": str(message["receive_count"])}
+                })
+            try:
+                response = handler({"Records": records}, None)
+                failed = {f["itemIdentifier"] for f in response["batchItemFailures"]}
+            except BatchProcessingError:
+                # Raised when every record failed; SQS redelivers the whole batch
+                failed = {message["messageId"] for message in batch}
+            for message in batch:
+                if message["messageId"] in failed:
+                    target = dead_letters if message["receive_count"] >= worker.MAX_RECEIVE_COUNT else self.messages
+                    target.append(message)
+        return dead_letters
+
+
+@pytest.fixture
+def harness(monkeypatch):
+    table, s3, queue = FakeTable(), FakeS3(), InMemoryQueue()
+    store = JobStore(table)
+    for module in (upload, worker, s3_analysis):
+        monkeypatch.setattr(module, "job_store", store)
+        monkeypatch.setattr(module, "s3", s3)
+    monkeypatch.setattr(upload, "job_queue", JobQueue(queue, "queue-url"))
+    monkeypatch.setattr(upload.verdict_cache, "get", lambda digest: (None, None))
+    return store, s3, queue
+
+
+def call_api(method, path, body=None):
+    response = upload.lambda_handler(api_event(method, path, body), Context())
+    return json.loads(response["body"])["body"]
+
+
+def submit(image: bytes):
+    return call_api("POST", "/jobs", {"image": base64.b64encode(image).decode()})["job_id"]
+
+
+def test_job_runs_through_queue_and_worker(harness, monkeypatch):
+    store, s3, queue = harness
+    monkeypatch.setattr(worker, "analyze_image", lambda data, deadline: {"detection_result": {"size": len(data)}})
+
+    image = tiny_png()
+    job_id = submit(image)
+    assert call_api("GET", f"/jobs/{job_id}")["status"] == "queued"
+
+    queue.deliver(lambda event, context: worker.lambda_handler(event, Context()))
+
+    job = call_api("GET", f"/jobs/{job_id}")
+    assert job["status"] == "succeeded"
+    assert job["result"] == {"detection_result": {"size": len(image)}}
+    assert s3.objects == {}
+
+
+def test_throttled_job_is_retried_then_failed(harness, monkeypatch):
+    store, s3, queue = harness
+
+    def throttled(data, deadline):
+        raise upload.DetectionError(429, {})
+
+    monkeypatch.setattr(worker, "analyze_image", throttled)
+    job_id = submit(tiny_png())
+    dead_letters = queue.deliver(lambda event, context: worker.lambda_handler(event, Context()))
+
+    assert dead_letters == []
+    job = call_api("GET", f"/jobs/{job_id}")
+    assert job["status"] == "failed"
+    assert job["error"] == "Detection API returned 429"
+
+
+def test_unknown_job_is_not_found(harness):
+    assert call_api("GET", "/jobs/missing") == {"error": "Job not found"}
+
+
+def test_job_endpoints_send_real_http_statuses(harness, monkeypatch):
+    submitted = upload.lambda_handler(api_event("POST", "/jobs", {"image": base64.b64encode(tiny_png()).decode()}), Context())
+    assert submitted["statusCode"] == 202
+    assert json.loads(submitted["body"])["body"]["message"] == "Analysis queued"
+    assert upload.lambda_handler(api_event("GET", "/jobs/missing"), Context())["statusCode"] == 404
+
+    monkeypatch.setattr(upload, "job_store", None)
+    assert upload.lambda_handler(api_event("POST", "/jobs", {"image": "x"}), Context())["statusCode"] == 503
+    assert upload.lambda_handler(api_event("GET", "/jobs/any"), Context())["statusCode"] == 503
+
+
+def object_created(s3_key, size):
+    return {"detail-type": "Object Created", "detail": {"object": {"key": s3_key, "size": size}}}
+
+
+def test_presigned_upload_is_analysed_on_object_created(harness, monkeypatch):
+    store, s3, queue = harness
+    monkeypatch.setattr(worker, "analyze_image", lambda data, deadline: {"detection_result": {"size": len(data)}})
+
+    presign = call_api("POST", "/upload/presign", {"content_type": "image/png"})
+    s3_key = f"incoming/{presign['job_id']}"
+    assert s3_key in presign["upload_url"]
+    assert presign["headers"] == {"Content-Type": "image/png"}
+
+    s3.objects[s3_key] = tiny_png()
+    s3_analysis.lambda_handler(object_created(s3_key, len(tiny_png())), Context())
+
+    job = call_api("GET", f"/jobs/{presign['job_id']}")
+    assert job["status"] == "succeeded"
+    assert s3_key not in s3.objects
+
+
+def test_presign_rejects_non_images(harness, monkeypatch):
+    assert call_api("POST", "/upload/presign", {"content_type": "text/html"}) == {"error": "Only image uploads are supported"}
+    response = upload.lambda_handler(api_event("POST", "/upload/presign", {"content_type": "text/html"}), Context())
+    assert response["statusCode"] == 400
+
+    monkeypatch.setattr(upload, "job_store", None)
+    assert upload.lambda_handler(api_event("POST", "/upload/presign", {}), Context())["statusCode"] == 503
+
+
+def test_oversized_presigned_upload_fails_job(harness, monkeypatch):
+    store, s3, queue = harness
+    job_id = call_api("POST", "/upload/presign", {})["job_id"]
+    s3.objects[f"incoming/{job_id}"] = b"x"
+    s3_analysis.lambda_handler(object_created(f"incoming/{job_id}", upload.staged_preflight_limits.max_bytes + 1), Context())
+
+    assert call_api("GET", f"/jobs/{job_id}")["status"] == "failed"
+    assert s3.objects == {}
+
+
+def test_presigned_upload_over_the_inline_limit_is_analysed(harness, monkeypatch):
+    store, s3, queue = harness
+    monkeypatch.setattr(upload.preflight_limits, "max_bytes", 10)
+    monkeypatch.setattr(worker, "analyze_image", lambda data, deadline: {"data": []})
+    job_id = call_api("POST", "/upload/presign", {"content_type": "image/png"})["job_id"]
+    s3.objects[f"incoming/{job_id}"] = tiny_png()
+    s3_analysis.lambda_handler(object_created(f"incoming/{job_id}", len(tiny_png())), Context())
+
+    assert call_api("GET", f"/jobs/{job_id}")["status"] == "succeeded"
+
+
+def test_presigned_non_image_fails_job_without_detection(harness, monkeypatch):
+    store, s3, queue = harness
+    monkeypatch.setattr(worker, "analyze_image", lambda data, deadline: pytest.fail("preflight must reject first"))
+    job_id = call_api("POST", "/upload/presign", {"content_type": "image/png"})["job_id"]
+    s3.objects[f"incoming/{job_id}"] = b"<html>not an image</html>"
+    s3_analysis.lambda_handler(object_created(f"incoming/{job_id}", 25), Context())
+
+    job = call_api("GET", f"/jobs/{job_id}")
+    assert job["status"] == "failed"
+    assert job["error"] == "Not a recognised image format"
+    assert s3.objects == {}
+
+
+def test_preflight_rejects_before_any_io(harness):
+    store, s3, queue = harness
+    response = upload.lambda_handler(api_event("POST", "/jobs", {"image": base64.b64encode(b"not an image").decode()}), Context())
+    assert response["statusCode"] == 415
+    assert json.loads(response["body"])["body"]["error"] == "Not a recognised image format"
+    assert s3.objects == {} and queue.messages == []
@@ -0,0 +1,121 @@
+import json
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "benchmarks")))
+
+from detection_client import DetectionClient  # noqa: E402
+from flow_control import DetectionUnavailableError  # noqa: E402
+from key_pool import ApiKeyPool, parse_key_pool  # noqa: E402
+from secret_provider import SecretProvider  # noqa: E402
+from stub_detection_server import StubConfig, StubDetectionServer  # noqa: E402
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+def make_pool(secret, **kwargs):
+    clock = Clock()
+    secrets = {"value": secret}
+    pool = ApiKeyPool(SecretProvider(lambda: secrets["value"]), clock=clock, sleep=clock.sleep, **kwargs)
+    return pool, clock, secrets
+
+
+def test_parse_key_pool_formats():
+    assert parse_key_pool("single-key") == [("key-0", "single-key")]
+    assert parse_key_pool('["a", "b"]') == [("key-0", "a"), ("key-1", "b")]
+    assert parse_key_pool('{"keys": [{"name": "team", "key": "a"}, "b"]}') == [("team", "a"), ("key-1", "b")]
+    with pytest.raises(ValueError):
+        parse_key_pool("[]")
+
+
+def test_spreads_requests_and_skips_quarantined_keys():
+    pool, clock, _ = make_pool('["a", "b", "c"]', quarantine_seconds=5)
+    leases = [pool.acquire(deadline=clock.now + 1) for _ in range(3)]
+    assert sorted(lease.key for lease in leases) == ["a", "b", "c"]
+    for lease in leases:
+        pool.release(lease, 429 if lease.key == "a" else 200)
+
+    assert {pool.acquire(deadline=clock.now + 1).key for _ in range(4)} == {"b", "c"}
+    stats = pool.key_stats()
+    assert stats["key-0"]["throttles"] == 1 and stats["key-0"]["quarantined_for"] == 5
+    assert pool.stats["throttles"] == 1
+
+
+def test_prefers_least_recently_throttled_key():
+    pool, clock, _ = make_pool('["a", "b"]', quarantine_seconds=1, throttle_memory=60)
+    pool.release(pool.acquire(deadline=clock.now + 1), 429)
+    clock.now += 0.5
+    pool.release(pool.acquire(deadline=clock.now + 1), 429)
+    clock.now += 2
+    # Both are out of quarantine; "a" was throttled longer ago
+    assert pool.acquire(deadline=clock.now + 1).key == "a"
+
+
+def test_waits_for_quarantine_within_deadline_and_fails_fast_past_it():
+    pool, clock, _ = make_pool("only-key")
+    pool.release(pool.acquire(deadline=clock.now + 1), 429, retry_after=2.0)
+    assert pool.acquire(deadline=clock.now + 10).key == "only-key"
+    assert clock.sleeps == [2.0]
+
+    pool.release(pool.acquire(deadline=clock.now + 1), 429, retry_after=30.0)
+    with pytest.raises(DetectionUnavailableError):
+        pool.acquire(deadline=clock.now + 10)
+    assert pool.stats["exhausted"] == 1
+
+
+def test_rotated_secret_keeps_state_of_unchanged_keys():
+    pool, clock, secrets = make_pool(json.dumps([{"name": "a", "key": "1"}, {"name": "b", "key": "2"}]))
+    lease = pool.acquire(deadline=clock.now + 1)
+    pool.release(lease, 429)
+    secrets["value"] = json.dumps([{"name": "a", "key": "1"}, {"name": "c", "key": "3"}])
+    pool.refresh()
+    assert pool.key_stats()["a"]["throttles"] == 1
+    assert set(pool.key_stats()) == {"a", "c"}
+
+
+def pooled_client(server, keys):
+    pool = ApiKeyPool(SecretProvider(lambda: json.dumps(keys)))
+    return pool, DetectionClient(SecretProvider(lambda: ""), invoke_url=server.url, key_pool=pool)
+
+
+def test_pool_stays_under_per_key_limits_of_stub():
+    config = StubConfig(key_rate=1.0, key_burst=2.0)
+    with StubDetectionServer(config) as server:
+        pool, client = pooled_client(server, ["a", "b", "c"])
+        statuses = [client.detect({"input": []}, deadline=time.monotonic() + 5).status_code for _ in range(6)]
+    assert statuses == [200] * 6
+    assert config.requests_by_key == {"Bearer a": 2, "Bearer b": 2, "Bearer c": 2}
+    assert config.throttled_by_key == {}
+    assert pool.stats["throttles"] == 0
+
+
+def test_throttled_key_is_retried_on_another_key_without_waiting():
+    config = StubConfig(key_rate=0.2, key_burst=1.0)
+    # Another client has used up key "a", which the pool picks first
+    config.take_key_token("Bearer a")
+    with StubDetectionServer(config) as server:
+        pool, client = pooled_client(server, ["a", "b"])
+        started = time.monotonic()
+        response = client.detect({"input": []}, deadline=time.monotonic() + 10)
+        elapsed = time.monotonic() - started
+    assert response.status_code == 200
+    # Key "a" answered 429 with Retry-After ~5s; "b" was used without waiting
+    assert elapsed < 1.0
+    assert config.requests_by_key == {"Bearer a": 2, "Bearer b": 1}
+    stats = pool.key_stats()
+    assert stats["key-0"]["throttles"] == 1 and stats["key-0"]["quarantined_for"] > 3
+    assert stats["key-1"] == {"requests": 1, "throttles": 0, "in_flight": 0, "quarantined_for": 0}
@@ -0,0 +1,118 @@
+import os
+import shutil
+import sys
+import zipfile
+
+import aws_cdk as core
+import aws_cdk.assertions as assertions
+import pytest
+from aws_cdk import aws_dynamodb as dynamodb, aws_lambda as _lambda, aws_s3 as s3, aws_secretsmanager as secretsmanager
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, ROOT)
+
+from stacks.lambda_stack import PERFORMANCE_PROFILES, PROVISIONED_UTILIZATION_TARGET, LambdaStack  # noqa: E402
+
+Match = assertions.Match
+
+
+@pytest.fixture(autouse=True)
+def assets(tmp_path, monkeypatch):
+    """
+    Resolves the stack's relative asset paths against a directory holding
+    the Lambda sources and placeholder layer zips, since the real layers are
+    built outside the repo. (The CDK's node process keeps the working
+    directory it started in, so chdir would not reach it.)
+    """
+    shutil.copytree(os.path.join(ROOT, "lambda"), tmp_path / "lambda",
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    (tmp_path / "layers").mkdir()
+    for name in ("layer.zip", "request.zip"):
+        with zipfile.ZipFile(tmp_path / "layers" / name, "w") as layer:
+            layer.writestr("python/placeholder.py", "")
+    from_asset = _lambda.Code.from_asset
+    monkeypatch.setattr(_lambda.Code, "from_asset",
+                        staticmethod(lambda path, **kwargs: from_asset(str(tmp_path / path), **kwargs)))
+
+
+def synth(profile=None):
+    app = core.App(context={"performance_profile": profile} if profile else None)
+    dependencies = core.Stack(app, "Dependencies")
+    stack = LambdaStack(
+        app, "LambdaStack",
+        image_bucket=s3.Bucket(dependencies, "Images"),
+        api_secret=secretsmanager.Secret(dependencies, "ApiKey"),
+        results_table=dynamodb.Table(dependencies, "Results", partition_key=dynamodb.Attribute(
+            name="pk", type=dynamodb.AttributeType.STRING))
+    )
+    return stack, assertions.Template.from_stack(stack)
+
+
+@pytest.mark.parametrize("name", sorted(PERFORMANCE_PROFILES))
+def test_profile_sets_function_settings(name):
+    profile = PERFORMANCE_PROFILES[name]
+    _, template = synth(name)
+
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "deepfake_upload_lambda_function",
+        "Architectures": [profile["architecture"]],
+        "MemorySize": profile["memory_mb"],
+        "Timeout": profile["upload_timeout_seconds"],
+        "ReservedConcurrentExecutions": profile["reserved_concurrency"] or Match.absent()
+    })
+    for function_name in ("deepfake_worker_lambda_function", "deepfake_s3_analysis_lambda_function"):
+        template.has_resource_properties("AWS::Lambda::Function", {
+            "FunctionName": function_name,
+            "Architectures": [profile["architecture"]],
+            "MemorySize": profile["memory_mb"],
+            "Timeout": profile["worker_timeout_seconds"]
+        })
+    template.has_resource_properties("AWS::SQS::Queue", {
+        "VisibilityTimeout": 6 * profile["worker_timeout_seconds"]
+    })
+
+
+@pytest.mark.parametrize("name", sorted(PERFORMANCE_PROFILES))
+def test_profile_sets_provisioned_concurrency_on_alias(name):
+    profile = PERFORMANCE_PROFILES[name]
+    _, template = synth(name)
+
+    if not profile["provisioned_concurrency"]:
+        template.has_resource_properties("AWS::Lambda::Alias", {
+            "Name": "live",
+            "ProvisionedConcurrencyConfig": Match.absent()
+        })
+        template.resource_count_is("AWS::ApplicationAutoScaling::ScalableTarget", 0)
+        return
+    template.has_resource_properties("AWS::Lambda::Alias", {
+        "Name": "live",
+        "ProvisionedConcurrencyConfig": {
+            "ProvisionedConcurrentExecutions": profile["provisioned_concurrency"]
+        }
+    })
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalableTarget", {
+        "MinCapacity": profile["provisioned_concurrency"],
+        "MaxCapacity": profile["max_provisioned_concurrency"],
+        "ScalableDimension": "lambda:function:ProvisionedConcurrency"
+    })
+    template.has_resource_properties("AWS::ApplicationAutoScaling::ScalingPolicy", {
+        "TargetTrackingScalingPolicyConfiguration": Match.object_like({
+            "TargetValue": PROVISIONED_UTILIZATION_TARGET
+        })
+    })
+
+
+def test_dashboard_lambda_is_small_and_short_lived():
+    _, template = synth()
+    template.has_resource_properties("AWS::Lambda::Function", {
+        "FunctionName": "deepfake_dashboard_lambda_function",
+        "MemorySize": 128,
+        "Timeout": 10
+    })
+
+
+def test_defaults_to_balanced_and_rejects_unknown_profiles():
+    stack, _ = synth()
+    assert stack.performance_profile == "balanced"
+    with pytest.raises(ValueError):
+        synth("turbo")
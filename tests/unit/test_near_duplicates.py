@@ -0,0 +1,195 @@
+import io
+import random
+
+import pytest
+
+import upload
+from archive import ImageArchiver
+from image_processing import difference_hash
+from near_duplicates import NearDuplicateIndex, band_widths, hamming_distance, split_bands
+from verdict_cache import VerdictCache
+from .fakes import FakeResponse, FakeS3
+
+
+class FakeTable:
+    def __init__(self):
+        self.items = {}
+        self.queries = 0
+
+    def put_item(self, Item):
+        self.items[(Item["pk"], Item["sk"])] = Item
+
+    def get_item(self, Key):
+        item = self.items.get((Key["pk"], Key["sk"]))
+        return {"Item": item} if item else {}
+
+    def query(self, KeyConditionExpression, ExpressionAttributeValues, Limit=None, ExclusiveStartKey=None):
+        self.queries += 1
+        pk = ExpressionAttributeValues[":pk"]
+        items = sorted((sk, item) for (item_pk, sk), item in self.items.items()
+                       if item_pk == pk and (ExclusiveStartKey is None or sk > ExclusiveStartKey["sk"]))
+        page = {"Items": [item for _, item in items[:Limit]]}
+        if Limit is not None and len(items) > Limit:
+            page["LastEvaluatedKey"] = {"pk": pk, "sk": items[Limit - 1][0]}
+        return page
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def photo(width=800, height=600, seed=0):
+    Image = pytest.importorskip("PIL.Image")
+    ImageDraw = pytest.importorskip("PIL.ImageDraw")
+    rng = random.Random(seed)
+    image = Image.new("RGB", (width, height), (90, 120, 150))
+    draw = ImageDraw.Draw(image)
+    for _ in range(12):
+        x, y, r = rng.randrange(width), rng.randrange(height), rng.randrange(40, 200)
+        draw.ellipse((x - r, y - r, x + r, y + r), fill=tuple(rng.randrange(256) for _ in range(3)))
+    return image
+
+
+def encode(image, image_format="JPEG", **kwargs):
+    output = io.BytesIO()
+    image.save(output, format=image_format, **kwargs)
+    return output.getvalue()
+
+
+def test_bands_cover_all_bits():
+    assert band_widths(4) == [16, 16, 16, 16]
+    assert band_widths(5) == [13, 13, 13, 13, 12]
+    value = random.Random(1).getrandbits(64)
+    widths = band_widths(5)
+    rebuilt, shift = 0, 0
+    for band, width in zip(split_bands(value, widths), widths):
+        rebuilt |= band << shift
+        shift += width
+    assert rebuilt == value
+
+
+def test_lookup_finds_hashes_within_max_distance():
+    rng = random.Random(7)
+    index = NearDuplicateIndex(max_distance=3)
+    stored = rng.getrandbits(64)
+    index.add(stored, "digest", (800, 600))
+    for distance in range(4):
+        match = index.lookup(flip_bits(stored, distance, rng))
+        assert match.digest == "digest" and match.distance == distance
+    assert index.lookup(flip_bits(stored, 4, rng)) is None
+
+
+def test_lookup_returns_closest_match():
+    index = NearDuplicateIndex(max_distance=3)
+    index.add(0b1111, "far", (10, 10))
+    index.add(0b0001, "near", (10, 10))
+    assert index.lookup(0b0011).digest == "near"
+
+
+def test_memory_tier_is_bounded():
+    index = NearDuplicateIndex(max_entries=2)
+    a, b, c = 0xFFFF << 48, 0xFFFF << 16, 0xFFFF
+    for digest, value in (("a", a), ("b", b), ("c", c)):
+        index.add(value, digest, (10, 10))
+    assert len(index) == 2
+    assert index.lookup(a) is None
+    assert index.lookup(c).digest == "c"
+
+
+def test_table_tier_shared_between_containers():
+    table = FakeTable()
+    NearDuplicateIndex(table=table).add(0xDEADBEEF, "digest", (800, 600))
+    other = NearDuplicateIndex(table=table)
+    match = other.lookup(0xDEADBEEF ^ 0b101)
+    assert (match.digest, match.distance, match.size) == ("digest", 2, (800, 600))
+    assert other.stats["table_hits"] == 1
+    # Promoted to memory, so the next lookup skips the table
+    queries = table.queries
+    assert other.lookup(0xDEADBEEF).digest == "digest"
+    assert table.queries == queries
+
+
+def test_table_reads_per_band_are_capped():
+    table = FakeTable()
+    writer = NearDuplicateIndex(table=table)
+    # Distant hashes whose middle two bands are zero, like flat image regions
+    for i in range(1, 51):
+        writer.add(0xFFFF << 48 | i, f"crowd-{i}", (10, 10))
+    reader = NearDuplicateIndex(table=table, max_entries=0, max_band_reads=20)
+    assert reader.lookup(0) is None
+    assert reader.stats["truncated_bands"] == 2
+    # One query per band; the crowded bands stop at the cap instead of paging on
+    assert table.queries == 4
+
+
+def test_hash_survives_recompression_and_resizing():
+    image = photo()
+    original, _ = difference_hash(encode(image, quality=95))
+    recompressed, _ = difference_hash(encode(image, quality=40))
+    resized, size = difference_hash(encode(image.resize((400, 300)), "PNG"))
+    assert size == (400, 300)
+    assert hamming_distance(original, recompressed) <= 3
+    assert hamming_distance(original, resized) <= 3
+
+    different, _ = difference_hash(encode(photo(seed=1)))
+    assert hamming_distance(original, different) > 10
+
+
+def test_flat_and_tiny_images_are_not_hashed():
+    Image = pytest.importorskip("PIL.Image")
+    assert difference_hash(encode(Image.new("RGB", (200, 200), (10, 10, 10)))) is None
+    assert difference_hash(encode(photo(16, 16))) is None
+    assert difference_hash(b"not an image") is None
+
+
+def test_resized_copy_reuses_verdict_with_scaled_boxes(monkeypatch):
+    cache, index = VerdictCache(), NearDuplicateIndex()
+    monkeypatch.setattr(upload, "verdict_cache", cache)
+    monkeypatch.setattr(upload, "near_duplicate_index", index)
+    monkeypatch.setattr(upload, "NEAR_DUPLICATE_MODE", "reuse")
+
+    image = photo()
+    value, size = difference_hash(encode(image))
+    cache.put("original", {"data": [{"bounding_boxes": [{"vertices": [{"x": 100, "y": 60}]}]}]})
+    index.add(value, "original", size)
+
+    def no_detection(*args, **kwargs):
+        raise AssertionError("near-duplicates must not call the detection API")
+
+    monkeypatch.setattr(upload.detection_client, "detect", no_detection)
+    result = upload.analyze_image(encode(image.resize((400, 300)), quality=70), deadline=0)
+
+    assert result["cache_hit"] is True
+    assert result["near_duplicate"]["image_hash"] == "original"
+    assert result["detection_result"]["data"][0]["bounding_boxes"][0]["vertices"] == [{"x": 50, "y": 30}]
+    # The stored verdict keeps its own coordinates
+    assert cache.get("original")[0]["data"][0]["bounding_boxes"][0]["vertices"] == [{"x": 100, "y": 60}]
+
+
+def test_edited_copy_is_flagged_but_never_reuses_verdict(monkeypatch):
+    cache, index = VerdictCache(), NearDuplicateIndex()
+    monkeypatch.setattr(upload, "verdict_cache", cache)
+    monkeypatch.setattr(upload, "near_duplicate_index", index)
+    monkeypatch.setattr(upload, "NEAR_DUPLICATE_MODE", "reuse")
+    monkeypatch.setattr(upload, "archiver", ImageArchiver(FakeS3(), "bucket"))
+
+    image = photo()
+    value, size = difference_hash(encode(image))
+    cache.put("original", {"data": [{"bounding_boxes": [{"is_deepfake": 0.01}]}]})
+    # An edited face region moves the hash a couple of bits
+    index.add(value ^ 0b101, "original", size)
+    calls = []
+    monkeypatch.setattr(upload.detector, "detect", lambda payload, deadline: calls.append(payload) or FakeResponse())
+
+    result = upload.analyze_image(encode(image), deadline=0)
+
+    assert len(calls) == 1
+    assert result["cache_hit"] is False
+    assert result["near_duplicate"] == {"image_hash": "original", "distance": 2}
+    assert result["detection_result"] == FakeResponse().json()
+
+
+def test_flag_is_the_default_mode():
+    assert upload.NEAR_DUPLICATE_MODE == "flag"
@@ -0,0 +1,81 @@
+import base64
+import io
+
+import pytest
+
+from preflight import PreflightError, PreflightLimits, base64_decoded_size, preflight_base64, preflight_bytes
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def encode(width, height, image_format, **save_options):
+    output = io.BytesIO()
+    Image.new("RGB", (width, height), (10, 120, 200)).save(output, format=image_format, **save_options)
+    return output.getvalue()
+
+
+def b64(data: bytes) -> str:
+    return base64.b64encode(data).decode()
+
+
+@pytest.mark.parametrize("image_format", ["JPEG", "PNG", "GIF", "WEBP", "BMP"])
+def test_reads_dimensions_from_header(image_format):
+    header = preflight_base64(b64(encode(321, 123, image_format)), PreflightLimits())
+    assert (header.width, header.height) == (321, 123)
+
+
+def test_lossless_webp_dimensions():
+    header = preflight_bytes(encode(300, 200, "WEBP", lossless=True), PreflightLimits())
+    assert (header.width, header.height) == (300, 200)
+
+
+def test_jpeg_frame_header_after_large_metadata():
+    exif = b"Exif\x00\x00" + b"\x00" * 30000
+    data = encode(64, 48, "JPEG", exif=exif)
+    assert preflight_bytes(data, PreflightLimits()).width == 64
+
+
+def test_decoded_size_without_decoding():
+    for length in range(1, 10):
+        assert base64_decoded_size(b64(b"x" * length)) == length
+    assert base64_decoded_size(base64.encodebytes(b"x" * 100).decode()) == 100
+
+
+def test_accepts_line_wrapped_base64():
+    data = encode(64, 48, "PNG")
+    for encoded in (base64.encodebytes(data).decode(), " " + b64(data).replace("A", "A\r\n", 3) + "\n"):
+        assert preflight_base64(encoded, PreflightLimits()).byte_size == len(data)
+
+
+@pytest.mark.parametrize("trailer", [
+    b"\x00" * 100,
+    # Camera trailers follow the end marker with their own data
+    b"SEFH" + bytes(range(256)) * 8,
+])
+def test_accepts_data_after_the_end_marker(trailer):
+    for image_format in ("JPEG", "PNG"):
+        data = encode(64, 48, image_format) + trailer
+        assert preflight_bytes(data, PreflightLimits()).width == 64
+        assert preflight_base64(b64(data), PreflightLimits()).width == 64
+
+
+@pytest.mark.parametrize("payload, status", [
+    (b64(b"<html>not an image</html>"), 415),
+    ("not base64!", 400),
+    (b64(encode(64, 64, "PNG")[:-20]), 400),
+    (b64(encode(64, 64, "TIFF")), 415),
+])
+def test_rejects_bad_payloads(payload, status):
+    with pytest.raises(PreflightError) as error:
+        preflight_base64(payload, PreflightLimits())
+    assert error.value.status_code == status
+
+
+def test_enforces_byte_and_pixel_limits():
+    data = b64(encode(2000, 2000, "PNG"))
+    with pytest.raises(PreflightError) as error:
+        preflight_base64(data, PreflightLimits(max_pixels=1_000_000))
+    assert error.value.status_code == 413
+    with pytest.raises(PreflightError) as error:
+        preflight_base64(data, PreflightLimits(max_bytes=100))
+    assert error.value.status_code == 413
@@ -0,0 +1,90 @@
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), "..", "..")
+sys.path.insert(0, os.path.abspath(os.path.join(ROOT, "scripts")))
+sys.path.insert(0, os.path.abspath(os.path.join(ROOT, "benchmarks")))
+
+from analysis_records import AnalysisRecorder  # noqa: E402
+from aws_stubs import InMemoryS3, InMemoryTable  # noqa: E402
+from detection_client import DetectionClient  # noqa: E402
+from flow_control import DetectionGuard, TokenBucket  # noqa: E402
+from reanalyze_archive import Checkpoint, Reanalysis  # noqa: E402
+from secret_provider import SecretProvider  # noqa: E402
+from stub_detection_server import StubConfig, StubDetectionServer  # noqa: E402
+from verdict_cache import VerdictCache, content_hash  # noqa: E402
+from .fakes import tiny_png  # noqa: E402
+
+
+@pytest.fixture
+def stub_api():
+    with StubDetectionServer(StubConfig()) as server:
+        yield server
+
+
+@pytest.fixture
+def archive():
+    s3 = InMemoryS3()
+    for value in range(12):
+        s3.put_object(Bucket="bucket", Key=f"archive/{value:02d}.png", Body=tiny_png(value), ContentType="image/png")
+    return s3
+
+
+def make_run(s3, server, checkpoint, table=None, **kwargs):
+    client = DetectionClient(SecretProvider(lambda: "key"), invoke_url=server.url, max_attempts=1, **kwargs)
+    table = table or InMemoryTable()
+    return Reanalysis(s3, "bucket", client, checkpoint, recorder=AnalysisRecorder(table),
+                      verdict_cache=VerdictCache(table=table, max_entries=0), workers=4), table
+
+
+def test_interrupted_run_resumes_after_checkpoint(tmp_path, stub_api, archive):
+    path = str(tmp_path / "checkpoint.json")
+    run, table = make_run(archive, stub_api, Checkpoint(path, "archive/"))
+    stats = run.run("archive/", max_objects=5, count=False)
+    assert stats["analysed"] == 5
+    assert json.load(open(path))["after"] == "archive/04.png"
+
+    run, _ = make_run(archive, stub_api, Checkpoint(path, "archive/"), table=table)
+    stats = run.run("archive/", count=False)
+    assert stats["analysed"] == 7
+    assert stub_api.config.requests == 12
+    assert Checkpoint(path, "archive/").completed == 12
+
+    records = [item for (pk, _), item in table.items.items() if pk.startswith("ANALYSIS#")]
+    assert len(records) == 12
+    # Re-scored images replace the cached verdict but are not counted again
+    assert ("VERDICT#" + content_hash(tiny_png(3)), "VERDICT") in table.items
+    assert not any(pk.startswith("ROLLUP#") for pk, _ in table.items)
+
+
+def test_failures_are_kept_and_retried(tmp_path, stub_api, archive):
+    path = str(tmp_path / "checkpoint.json")
+    stub_api.config.error_rate = 1.0
+    run, _ = make_run(archive, stub_api, Checkpoint(path, "archive/"))
+    assert run.run("archive/", max_objects=3, count=False)["failed"] == 3
+    assert len(Checkpoint(path, "archive/").failed) == 3
+
+    stub_api.config.error_rate = 0.0
+    run, _ = make_run(archive, stub_api, Checkpoint(path, "archive/"))
+    stats = run.run("archive/", retry_failed=True, count=False)
+    assert stats["analysed"] == 12
+    assert Checkpoint(path, "archive/").failed == []
+
+
+def test_rate_limit_paces_detection_calls(tmp_path, stub_api, archive):
+    guard = DetectionGuard(rate_limiter=TokenBucket(rate=20, burst=1))
+    run, _ = make_run(archive, stub_api, Checkpoint(None, "archive/"), guard=guard)
+    stats = run.run("archive/", count=False)
+    assert stats["analysed"] == 12
+    # 11 calls after the first token, at 20 per second
+    assert stats["seconds"] >= 0.5
+
+
+def test_checkpoint_rejects_other_prefix(tmp_path):
+    path = str(tmp_path / "checkpoint.json")
+    Checkpoint(path, "archive/").save()
+    with pytest.raises(ValueError):
+        Checkpoint(path, "raw/")
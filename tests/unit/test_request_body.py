@@ -0,0 +1,92 @@
+import base64
+import json
+
+import pytest
+
+import upload
+from archive import ImageArchiver
+from request_body import multipart_file, parse_content_type
+from .fakes import Context, FakeResponse, FakeS3, api_event, tiny_png
+
+BOUNDARY = "----form7MA4YWxkTrZu0gW"
+
+
+def multipart(*parts):
+    body = b""
+    for name, filename, data in parts:
+        disposition = f'form-data; name="{name}"' + (f'; filename="{filename}"' if filename else "")
+        body += (f"--{BOUNDARY}\r\nContent-Disposition: {disposition}\r\n"
+                 f"Content-Type: image/png\r\n\r\n").encode() + data + b"\r\n"
+    return body + f"--{BOUNDARY}--\r\n".encode()
+
+
+def binary_event(content_type, body: bytes, encoded=True):
+    event = api_event("POST", "/upload")
+    event["headers"] = {"content-type": content_type}
+    event["body"] = base64.b64encode(body).decode() if encoded else body.decode("latin-1")
+    event["isBase64Encoded"] = encoded
+    return event
+
+
+@pytest.fixture
+def payloads(monkeypatch):
+    sent = []
+
+    def detect(payload, deadline=None):
+        sent.append(payload)
+        return FakeResponse()
+
+    monkeypatch.setattr(upload.detection_client, "detect", detect)
+    monkeypatch.setattr(upload.verdict_cache, "get", lambda digest: (None, None))
+    monkeypatch.setattr(upload.verdict_cache, "put", lambda digest, verdict: None)
+    monkeypatch.setattr(upload, "NEAR_DUPLICATE_MODE", "off")
+    monkeypatch.setattr(upload, "analysis_recorder", None)
+    monkeypatch.setattr(upload, "archiver", ImageArchiver(FakeS3(), "bucket"))
+    return sent
+
+
+def call(event):
+    response = upload.lambda_handler(event, Context())
+    return response["statusCode"], json.loads(response["body"])
+
+
+def test_parse_content_type():
+    assert parse_content_type('multipart/form-data; boundary="abc"') == ("multipart/form-data", {"boundary": "abc"})
+    assert parse_content_type("IMAGE/PNG") == ("image/png", {})
+    assert parse_content_type(None) == ("", {})
+
+
+def test_multipart_prefers_image_field_then_first_file():
+    body = multipart(("note", None, b"hello"), ("other", "a.png", b"first"), ("image", "b.png", b"second"))
+    part = multipart_file(body, BOUNDARY)
+    assert (part.name, part.filename, part.data) == ("image", "b.png", b"second")
+    assert multipart_file(multipart(("file", "a.png", b"\r\n--x\r\n")), BOUNDARY).data == b"\r\n--x\r\n"
+    assert multipart_file(multipart(("note", None, b"hello")), BOUNDARY) is None
+    with pytest.raises(ValueError):
+        multipart_file(body[:40], BOUNDARY)
+
+
+def test_raw_image_body_reuses_the_request_base64(payloads):
+    status, body = call(binary_event("image/png", tiny_png(4)))
+    assert status == 200 and body["statusCode"] == 200
+    assert json.loads(payloads[0])["input"][0] == "data:image/png;base64," + base64.b64encode(tiny_png(4)).decode()
+
+
+def test_multipart_body_is_analysed(payloads):
+    event = binary_event(f"multipart/form-data; boundary={BOUNDARY}", multipart(("image", "x.png", tiny_png(5))))
+    status, body = call(event)
+    assert status == 200 and body["statusCode"] == 200
+    assert body["body"]["image_hash"] == upload.content_hash(tiny_png(5))
+
+
+def test_binary_body_without_base64_encoding_is_rejected(payloads):
+    status, body = call(binary_event("image/png", b"not-really-png", encoded=False))
+    assert status == 415
+    assert payloads == []
+
+
+def test_line_wrapped_json_base64_is_accepted(payloads):
+    wrapped = base64.encodebytes(tiny_png(6) * 2).decode()
+    status, body = call(api_event("POST", "/upload", {"image": wrapped}))
+    assert status == 200 and body["statusCode"] == 200
+    assert json.loads(payloads[0])["input"][0] == "data:image/png;base64," + "".join(wrapped.split())
@@ -0,0 +1,60 @@
+import json
+
+import pytest
+
+import upload
+from verdict_cache import VerdictCache, content_hash
+from .fakes import Context, api_event
+
+DIGEST = content_hash(b"image-bytes")
+VERDICT = {"data": [{"bounding_boxes": [{"is_deepfake": 0.9}]}]}
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = VerdictCache()
+    monkeypatch.setattr(upload, "verdict_cache", cache)
+    return cache
+
+
+def lookup(digest, if_none_match=None):
+    event = api_event("GET", f"/results/{digest}")
+    if if_none_match:
+        event["headers"]["If-None-Match"] = if_none_match
+    response = upload.lambda_handler(event, Context())
+    response["headers"] = {name: values[0] for name, values in response["multiValueHeaders"].items()}
+    return response
+
+
+def test_miss_is_404_and_not_cacheable(cache):
+    response = lookup(DIGEST)
+    assert response["statusCode"] == 404
+    assert response["headers"]["Cache-Control"] == "no-store"
+
+
+def test_hit_returns_verdict_with_etag_and_cache_control(cache):
+    cache.put(DIGEST, VERDICT)
+    response = lookup(DIGEST.upper())
+    body = json.loads(response["body"])["body"]
+    assert response["statusCode"] == 200
+    assert body == {"detection_result": VERDICT, "cache_hit": True, "image_hash": DIGEST}
+    assert response["headers"]["Cache-Control"] == f"public, max-age={upload.RESULTS_MAX_AGE_SECONDS}"
+    assert response["headers"]["ETag"].startswith('"')
+
+
+def test_matching_if_none_match_is_304_until_verdict_changes(cache):
+    cache.put(DIGEST, VERDICT)
+    etag = lookup(DIGEST)["headers"]["ETag"]
+    response = lookup(DIGEST, if_none_match=f'"other", {etag}')
+    assert response["statusCode"] == 304
+    assert response["body"] == ""
+    assert response["headers"]["ETag"] == etag
+
+    cache.put(DIGEST, {"data": []})
+    response = lookup(DIGEST, if_none_match=etag)
+    assert response["statusCode"] == 200
+    assert response["headers"]["ETag"] != etag
+
+
+def test_rejects_malformed_hash(cache):
+    assert lookup("not-a-digest")["statusCode"] == 400
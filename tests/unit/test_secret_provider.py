@@ -0,0 +1,36 @@
+from secret_provider import SecretProvider, secrets_manager_fetcher
+
+
+class FakeSecretsClient:
+    def __init__(self, values):
+        self.values = list(values)
+        self.calls = 0
+
+    def get_secret_value(self, SecretId):
+        self.calls += 1
+        return {"SecretString": self.values[min(self.calls, len(self.values)) - 1]}
+
+
+def test_secret_fetched_once_within_ttl():
+    client = FakeSecretsClient(["key-1"])
+    provider = SecretProvider(secrets_manager_fetcher("arn:secret", client=client), ttl_seconds=60)
+    assert provider.get() == "key-1"
+    assert provider.get() == "key-1"
+    assert client.calls == 1
+
+
+def test_secret_refetched_after_ttl():
+    now = [0.0]
+    client = FakeSecretsClient(["key-1", "key-2"])
+    provider = SecretProvider(secrets_manager_fetcher("arn:secret", client=client), ttl_seconds=60, clock=lambda: now[0])
+    assert provider.get() == "key-1"
+    now[0] = 61
+    assert provider.get() == "key-2"
+
+
+def test_force_refresh_picks_up_rotated_key():
+    client = FakeSecretsClient(["old-key", "rotated-key"])
+    provider = SecretProvider(secrets_manager_fetcher("arn:secret", client=client), ttl_seconds=3600)
+    assert provider.get() == "old-key"
+    assert provider.get(force_refresh=True) == "rotated-key"
+    assert provider.fetch_count == 2
@@ -0,0 +1,143 @@
+import base64
+import http.client
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "scripts")))
+
+import upload  # noqa: E402
+from archive import ImageArchiver  # noqa: E402
+from serve import UploadServer, build_event, listen  # noqa: E402
+from single_flight import SingleFlight  # noqa: E402
+from .fakes import FakeResponse, FakeS3, tiny_png  # noqa: E402
+
+
+@pytest.fixture
+def server(monkeypatch):
+    calls = []
+
+    def detect(payload, deadline=None):
+        calls.append(payload)
+        time.sleep(0.3)
+        return FakeResponse()
+
+    monkeypatch.setattr(upload.detection_client, "detect", detect)
+    monkeypatch.setattr(upload.verdict_cache, "get", lambda digest: (None, None))
+    monkeypatch.setattr(upload.verdict_cache, "put", lambda digest, verdict: None)
+    monkeypatch.setattr(upload, "NEAR_DUPLICATE_MODE", "off")
+    monkeypatch.setattr(upload, "analysis_recorder", None)
+    monkeypatch.setattr(upload, "archiver", ImageArchiver(FakeS3(), "bucket"))
+    monkeypatch.setattr(upload, "analysis_flights", SingleFlight())
+
+    instance = UploadServer(listen("127.0.0.1", 0), max_concurrency=16, shutdown_timeout=5)
+    threading.Thread(target=instance.serve_forever, daemon=True).start()
+    instance.detect_calls = calls
+    yield instance
+    if not instance.draining.is_set():
+        instance.shutdown()
+
+
+def post_upload(server, image: bytes):
+    host, port = server.httpd.server_address[:2]
+    connection = http.client.HTTPConnection(host, port, timeout=10)
+    connection.request("POST", "/upload", json.dumps({"image": base64.b64encode(image).decode()}),
+                       {"Content-Type": "application/json"})
+    response = connection.getresponse()
+    body = json.loads(response.read())
+    connection.close()
+    return response.status, body
+
+
+def test_identical_concurrent_uploads_share_one_detection_call(server):
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: post_upload(server, tiny_png(1)), range(8)))
+    assert all(status == 200 and body["statusCode"] == 200 for status, body in results)
+    assert len(server.detect_calls) == 1
+    assert sum(not body["body"]["cache_hit"] for _, body in results) == 1
+
+
+def test_distinct_uploads_run_concurrently(server):
+    started = time.monotonic()
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda value: post_upload(server, tiny_png(value)), range(8)))
+    assert all(body["statusCode"] == 200 for _, body in results)
+    assert len(server.detect_calls) == 8
+    # Eight 0.3s detection calls overlap instead of queueing
+    assert time.monotonic() - started < 1.5
+
+
+def test_shutdown_waits_for_requests_in_flight(server):
+    with ThreadPoolExecutor(1) as pool:
+        pending = pool.submit(post_upload, server, tiny_png(2))
+        time.sleep(0.1)
+        server.shutdown()
+        assert server.in_flight == 0
+        status, body = pending.result()
+    assert status == 200 and body["statusCode"] == 200
+
+
+def test_build_event_encodes_binary_bodies():
+    event = build_event("POST", "/upload?x=1&x=2", {"Content-Type": "image/png"}, b"\x89PNG", "127.0.0.1", "id")
+    assert event["isBase64Encoded"] and base64.b64decode(event["body"]) == b"\x89PNG"
+    assert event["queryStringParameters"] == {"x": "2"}
+    assert event["multiValueQueryStringParameters"] == {"x": ["1", "2"]}
+
+
+def raw_request(server, head: bytes) -> bytes:
+    host, port = server.httpd.server_address[:2]
+    with socket.create_connection((host, port), timeout=10) as sock:
+        sock.sendall(head)
+        response = b""
+        while chunk := sock.recv(65536):
+            response += chunk
+    return response
+
+
+def test_bodies_over_the_limit_are_rejected_before_reading(server):
+    length = server.max_body_bytes + 1
+    # Only the headers are sent; the server must answer without waiting for the body
+    response = raw_request(server, f"POST /upload HTTP/1.1\r\nHost: x\r\nContent-Type: image/png\r\n"
+                                   f"Content-Length: {length}\r\n\r\n".encode())
+    assert response.startswith(b"HTTP/1.1 413")
+    assert b"Connection: close" in response
+    assert server.detect_calls == []
+
+
+@pytest.mark.parametrize("header, status", [("", b"411"), ("Content-Length: -5\r\n", b"400"),
+                                            ("Content-Length: ten\r\n", b"400")])
+def test_missing_or_invalid_length_is_rejected(server, header, status):
+    response = raw_request(server, f"POST /upload HTTP/1.1\r\nHost: x\r\n{header}\r\n".encode())
+    assert response.split(b" ")[1] == status
+
+
+def test_saturated_server_answers_503_before_reading_the_body(server):
+    while server.admit():
+        pass
+    try:
+        # Headers only: a busy server must answer without waiting for the body
+        response = raw_request(server, b"POST /upload HTTP/1.1\r\nHost: x\r\nContent-Type: image/png\r\n"
+                                       b"Content-Length: 1000\r\n\r\n")
+    finally:
+        for _ in range(16):
+            server.finish()
+    assert response.startswith(b"HTTP/1.1 503")
+    assert b"Retry-After: 1" in response and b"Connection: close" in response
+    assert server.in_flight == 0
+
+
+def test_stalled_client_is_disconnected_and_frees_its_slot(server):
+    server.httpd.RequestHandlerClass.timeout = 0.3
+    started = time.monotonic()
+    response = raw_request(server, b"POST /upload HTTP/1.1\r\nHost: x\r\nContent-Type: image/png\r\n"
+                                   b"Content-Length: 1000\r\n\r\n\x89PNG")
+    assert response == b""
+    assert time.monotonic() - started < 5
+    assert server.in_flight == 0
+    assert server.detect_calls == []
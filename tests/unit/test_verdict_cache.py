@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+import upload
+from archive import ImageArchiver
+from verdict_cache import VerdictCache, content_hash, verdict_etag
+from .fakes import FakeResponse, FakeS3, tiny_png
+
+
+class FakeTable:
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, Key):
+        item = self.items.get((Key["pk"], Key["sk"]))
+        return {"Item": item} if item else {}
+
+    def put_item(self, Item):
+        self.items[(Item["pk"], Item["sk"])] = Item
+
+
+class FailingTable:
+    def get_item(self, Key):
+        raise RuntimeError("ProvisionedThroughputExceededException")
+
+    def put_item(self, Item):
+        raise RuntimeError("ProvisionedThroughputExceededException")
+
+
+def test_memory_tier_hit_after_put():
+    cache = VerdictCache()
+    digest = content_hash(b"image-bytes")
+    assert cache.get(digest) == (None, None)
+    cache.put(digest, {"data": [{"is_deepfake": 0.9}]})
+    assert cache.get(digest) == ({"data": [{"is_deepfake": 0.9}]}, "memory")
+    assert cache.stats == {"memory_hits": 1, "table_hits": 0, "misses": 1}
+
+
+def test_lru_evicts_least_recently_used():
+    cache = VerdictCache(max_entries=2)
+    cache.put("a", {"v": 1})
+    cache.put("b", {"v": 2})
+    cache.get("a")
+    cache.put("c", {"v": 3})
+    assert cache.get("b") == (None, None)
+    assert cache.get("a")[1] == "memory"
+
+
+def test_table_tier_shared_between_containers():
+    table = FakeTable()
+    VerdictCache(table=table).put("abc", {"v": 1.5})
+    other_container = VerdictCache(table=table)
+    assert other_container.get("abc") == ({"v": 1.5}, "table")
+    assert other_container.get("abc") == ({"v": 1.5}, "memory")
+
+
+def test_expired_table_items_are_misses():
+    table = FakeTable()
+    table.put_item({"pk": "VERDICT#abc", "sk": "VERDICT", "verdict": "{}", "expires_at": int(time.time()) - 1})
+    assert VerdictCache(table=table).get("abc") == (None, None)
+
+
+def test_etag_follows_verdict_content_not_key_order():
+    assert verdict_etag({"a": 1, "b": [0.5]}) == verdict_etag({"b": [0.5], "a": 1})
+    assert verdict_etag({"a": 1}) != verdict_etag({"a": 2})
+    assert verdict_etag({"a": 1}).startswith('"')
+
+
+def test_failed_table_read_is_a_miss_and_failed_write_keeps_memory_tier():
+    cache = VerdictCache(table=FailingTable())
+    assert cache.get("abc") == (None, None)
+    with pytest.raises(RuntimeError):
+        cache.put("abc", {"v": 1})
+    assert cache.get("abc") == ({"v": 1}, "memory")
+
+
+def test_failed_cache_write_still_returns_the_paid_for_verdict(monkeypatch):
+    monkeypatch.setattr(upload, "verdict_cache", VerdictCache(table=FailingTable()))
+    monkeypatch.setattr(upload, "NEAR_DUPLICATE_MODE", "off")
+    monkeypatch.setattr(upload, "archiver", ImageArchiver(FakeS3(), "bucket"))
+    monkeypatch.setattr(upload.detector, "detect", lambda payload, deadline: FakeResponse())
+
+    result = upload.run_analysis(tiny_png(), deadline=0)
+
+    assert result["cache_hit"] is False
+    assert result["detection_result"] == FakeResponse().json()